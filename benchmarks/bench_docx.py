@@ -0,0 +1,85 @@
+"""Extraction time of Word documents with the previous and the single-pass extractor.
+
+Generates documents of increasing size, alternating paragraphs with a small table every
+``--table-every`` paragraphs, and times the lookup-based extraction the parser used before
+against ``TextFileParser.extract_word_content`` without and with a character budget.
+
+Usage:
+    python benchmarks/bench_docx.py --paragraphs 500 2000 8000 --max-chars 10000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import docx
+from docx.oxml.table import CT_Tbl
+from docx.oxml.text.paragraph import CT_P
+
+from telegram_llm_chatbot.core.files import TextFileParser
+
+
+def generate(path: str, paragraphs: int, table_every: int) -> None:
+    """Write a document with the given number of paragraphs and a table every few of them."""
+    document = docx.Document()
+    for i in range(paragraphs):
+        document.add_paragraph(f"Paragraph {i}: " + "lorem ipsum dolor sit amet " * 8)
+        if table_every and i % table_every == table_every - 1:
+            table = document.add_table(rows=3, cols=3)
+            for row_index, row in enumerate(table.rows):
+                for col_index, cell in enumerate(row.cells):
+                    cell.text = f"r{row_index}c{col_index}"
+    document.save(path)
+
+
+def extract_by_lookup(file_path: str) -> str:
+    """The previous extractor, which looks every body element up in doc.paragraphs or doc.tables."""
+    doc = docx.Document(file_path)
+    content = []
+    for element in doc.element.body:
+        if isinstance(element, CT_P):
+            for para in doc.paragraphs:
+                if para._element == element:
+                    paragraph_text = para.text.strip()
+                    if paragraph_text:
+                        content.append(paragraph_text)
+                    break
+        elif isinstance(element, CT_Tbl):
+            for table in doc.tables:
+                if table._element == element:
+                    for row in table.rows:
+                        content.append("\t".join(cell.text.strip() for cell in row.cells))
+                    content.append("")
+                    break
+    return "\n".join(content)
+
+
+def timed(fn, *args, **kwargs) -> tuple[float, str]:
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paragraphs", type=int, nargs="+", default=[500, 2000, 8000], help="Document sizes")
+    parser.add_argument("--table-every", type=int, default=20, help="Paragraphs between two tables")
+    parser.add_argument("--max-chars", type=int, default=10000, help="Character budget of the budgeted run")
+    args = parser.parse_args()
+
+    text_parser = TextFileParser(max_file_size_mb=100, allowed_file_types={"docx"})
+    print(f"{'paragraphs':>10}{'lookup ms':>12}{'single ms':>12}{'budget ms':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        for paragraphs in args.paragraphs:
+            path = os.path.join(directory, f"bench_{paragraphs}.docx")
+            generate(path, paragraphs, args.table_every)
+            lookup_ms, expected = timed(extract_by_lookup, path)
+            single_ms, text = timed(text_parser.extract_word_content, path)
+            budget_ms, budgeted = timed(text_parser.extract_word_content, path, max_chars=args.max_chars)
+            assert text == expected and budgeted == expected[: args.max_chars]
+            print(f"{paragraphs:>10}{lookup_ms:>12.1f}{single_ms:>12.1f}{budget_ms:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Time to first token with a single provider, with failover and with hedged requests.
+
+Starts two local stand-ins for OpenAI-compatible streaming endpoints. The primary answers
+after ``--primary-ms`` but stalls for ``--stall-ms`` on a share ``--stall-rate`` of the
+requests; the fallback always answers after ``--fallback-ms``. The same prompts are sent
+through ``LLM.run`` three times: without fallbacks, failing over after
+``--first-token-timeout`` seconds, and hedging once the wait exceeds the primary's p90 time
+to first token.
+
+Usage:
+    python benchmarks/bench_failover.py --requests 200 --stall-rate 0.1
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telegram_llm_chatbot.api.schemas import ModelConfig
+from telegram_llm_chatbot.core.failover import provider_stats
+from telegram_llm_chatbot.core.llm import LLM
+from telegram_llm_chatbot.db.rows import ChatMessageRow
+
+
+def make_handler(delay_ms: float, stall_ms: float, stall_rate: float, seed: int):
+    """Build a streaming chat completions handler with the given latency profile."""
+    rnd = random.Random(seed)
+    lock = threading.Lock()
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):  # noqa: D102
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with lock:
+                stalled = rnd.random() < stall_rate
+            time.sleep((stall_ms if stalled else delay_ms) / 1000)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for content in ("hello", " from", " the", " stub"):
+                chunk = {
+                    "id": "chatcmpl-bench",
+                    "object": "chat.completion.chunk",
+                    "created": 0,
+                    "model": "bench",
+                    "choices": [{"index": 0, "delta": {"role": "assistant", "content": content}, "finish_reason": None}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+
+        def log_message(self, *args):  # noqa: D102
+            pass
+
+    return StubHandler
+
+
+def start_stub(handler) -> str:
+    """Serve a handler in the background and return its base URL."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def measure(llm: LLM, requests: int) -> list[float]:
+    """Return the time to first token in ms of each request."""
+    history = [ChatMessageRow("user", "ping")]
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        stream = iter(llm.run(history))
+        next(stream)
+        samples.append((time.perf_counter() - start) * 1000)
+        for _ in stream:
+            pass
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per variant")
+    parser.add_argument("--primary-ms", type=float, default=50, help="Usual first-token delay of the primary")
+    parser.add_argument("--stall-ms", type=float, default=2000, help="First-token delay of a stalled request")
+    parser.add_argument("--stall-rate", type=float, default=0.1, help="Share of stalled primary requests")
+    parser.add_argument("--fallback-ms", type=float, default=120, help="First-token delay of the fallback")
+    parser.add_argument("--first-token-timeout", type=float, default=0.5, help="Failover deadline in seconds")
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    primary = start_stub(make_handler(args.primary_ms, args.stall_ms, args.stall_rate, seed=1))
+    fallback = start_stub(make_handler(args.fallback_ms, args.fallback_ms, 0.0, seed=2))
+
+    def config(base_url: str, **kwargs) -> ModelConfig:
+        return ModelConfig(provider="openai", model_name="bench", max_tokens=16, base_url=base_url, **kwargs)
+
+    variants = {
+        "single": LLM(config(primary)),
+        "failover": LLM(config(primary, first_token_timeout=args.first_token_timeout), fallbacks=[config(fallback)]),
+        "hedged": LLM(config(primary, hedge_percentile=0.9), fallbacks=[config(fallback)]),
+    }
+
+    print(f"{'variant':<10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, llm in variants.items():
+        # Every variant starts from empty statistics, hedging needs a few samples first
+        provider_stats.clear()
+        samples = sorted(measure(llm, args.requests))
+        quantiles = statistics.quantiles(samples, n=100)
+        print(f"{name:<10}{quantiles[49]:>10.1f}{quantiles[94]:>10.1f}{quantiles[98]:>10.1f}{samples[-1]:>10.1f}")
+        print(f"{'':<10}{provider_stats.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Latency of building a provider client per message versus reusing a cached one.
+
+Starts a local stand-in for an OpenAI-compatible endpoint and sends the same request
+through ``ChatOpenAI`` objects, once constructing a new client per call (the previous
+behaviour of ``LLM.run``) and once through ``LLM.get_client``. The server counts the TCP
+connections it accepted, which shows whether keep-alive connections are reused (recent
+langchain-openai releases share a default HTTP client between instances, older ones open a
+new pool per client). Against a real provider every new connection also pays a TLS
+handshake, which this plain HTTP stand-in does not simulate, so the measured gap is a
+lower bound.
+
+Usage:
+    python benchmarks/bench_llm_clients.py --calls 200
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.messages import HumanMessage
+from langchain_openai import ChatOpenAI
+
+from telegram_llm_chatbot.api.schemas import ModelConfig
+from telegram_llm_chatbot.core.llm import LLM
+
+COMPLETION = {
+    "id": "chatcmpl-bench",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "bench",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "pong"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}
+
+
+class StubServer(ThreadingHTTPServer):
+    """OpenAI-compatible stand-in that counts accepted connections."""
+
+    daemon_threads = True
+    connections = 0
+
+    def get_request(self):  # noqa: D102
+        self.connections += 1
+        connection, address = super().get_request()
+        # Headers and body are written separately, avoid the delayed-ACK stall
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return connection, address
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep connections alive
+
+    def do_POST(self):  # noqa: D102
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps(COMPLETION).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # noqa: D102
+        pass
+
+
+def measure(server: StubServer, calls: int, get_client) -> tuple[float, float, int]:
+    """Return the median and p95 latency in ms and the connections opened for ``calls`` requests."""
+    messages = [HumanMessage(content="ping")]
+    connections_before = server.connections
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        get_client().invoke(messages)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(0.95 * (len(samples) - 1))], server.connections - connections_before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200, help="Requests per variant")
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    server = StubServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    config = ModelConfig(
+        provider="openai",
+        model_name="bench",
+        max_tokens=16,
+        temperature=0.0,
+        stream=False,
+        base_url=f"http://127.0.0.1:{server.server_address[1]}/v1",
+    )
+    llm = LLM(config)
+
+    def new_client():
+        return ChatOpenAI(
+            model_name=config.model_name,
+            max_tokens=config.max_tokens,
+            temperature=config.temperature,
+            base_url=config.base_url,
+        )
+
+    results = {
+        "new per call": measure(server, args.calls, new_client),
+        "cached": measure(server, args.calls, lambda: llm.get_client(config)),
+    }
+    server.shutdown()
+
+    print(f"{'client':<14}{'median ms':>12}{'p95 ms':>10}{'connections':>14}")
+    for name, (median, p95, connections) in results.items():
+        print(f"{name:<14}{median:>12.2f}{p95:>10.2f}{connections:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Extraction time of PDFs with whole-document concatenation and with page-streaming extraction.
+
+Generates text PDFs of increasing length and times the previous extraction, which
+concatenated every page, against ``TextFileParser.extract_pdf_content`` with the character
+budget of a chat message, without a budget, and without a budget on ``--workers`` processes.
+
+Usage:
+    python benchmarks/bench_pdf.py --pages 50 500 --max-chars 10000 --workers 4
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from PyPDF2 import PdfReader
+
+from telegram_llm_chatbot.core.files import TextFileParser
+
+LINE = "The quick brown fox jumps over the lazy dog while the bot reads page {page} line {line}."
+
+
+def generate(path: str, pages: int, lines: int = 40) -> None:
+    """Write a PDF with the given number of pages of Helvetica text."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page in range(pages):
+        text = "".join(f"({LINE.format(page=page, line=line)}) Tj T* " for line in range(lines))
+        stream = f"BT /F1 10 Tf 12 TL 40 800 Td {text}ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> "
+            b"/Contents %d 0 R >>" % len(objects)
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode()
+
+    with open(path, "wb") as file:
+        file.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(file.tell())
+            file.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        xref = file.tell()
+        file.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            file.write(b"%010d 00000 n \n" % offset)
+        file.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+
+def extract_concatenated(file_path: str) -> str:
+    """The previous extractor, which concatenated the text of every page."""
+    content = ""
+    for page in PdfReader(file_path).pages:
+        content += page.extract_text()
+    return content
+
+
+def timed(fn, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[50, 500], help="Document lengths")
+    parser.add_argument("--max-chars", type=int, default=10000, help="Character budget of the budgeted run")
+    parser.add_argument("--workers", type=int, default=4, help="Processes of the parallel run")
+    args = parser.parse_args()
+
+    sequential = TextFileParser(max_file_size_mb=100, allowed_file_types={"pdf"})
+    parallel = TextFileParser(
+        max_file_size_mb=100, allowed_file_types={"pdf"}, pdf_workers=args.workers, pdf_parallel_min_pages=1
+    )
+    print(f"{'pages':>6}{'concat ms':>12}{'budget ms':>12}{'full ms':>12}{'parallel ms':>13}")
+    with tempfile.TemporaryDirectory() as directory:
+        for pages in args.pages:
+            path = os.path.join(directory, f"bench_{pages}.pdf")
+            generate(path, pages)
+            concat_ms = timed(extract_concatenated, path)
+            budget_ms = timed(sequential.extract_pdf_content, path, max_chars=args.max_chars)
+            full_ms = timed(sequential.extract_pdf_content, path)
+            parallel_ms = timed(parallel.extract_pdf_content, path)
+            print(f"{pages:>6}{concat_ms:>12.1f}{budget_ms:>12.1f}{full_ms:>12.1f}{parallel_ms:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
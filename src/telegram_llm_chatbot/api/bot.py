@@ -7,9 +7,13 @@ from omegaconf import OmegaConf
 from telebot import custom_filters
 from telebot.states.sync.middleware import StateMiddleware
 
+from telegram_llm_chatbot.api.common import chat_summarizer
 from telegram_llm_chatbot.api.handlers import account, admin, chats, image_gen, llm, subscription, welcome
 from telegram_llm_chatbot.api.middlewares.antiflood import AntifloodMiddleware
+from telegram_llm_chatbot.api.middlewares.session import DatabaseSessionMiddleware
 from telegram_llm_chatbot.api.middlewares.user import UserCallbackMiddleware, UserMessageMiddleware
+from telegram_llm_chatbot.db.log_writer import log_writer
+from telegram_llm_chatbot.db.subscription_sweeper import subscription_sweeper
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -41,13 +45,26 @@ def start_bot():
 
     # Middleware
     bot.setup_middleware(AntifloodMiddleware(bot, 2))
-    bot.setup_middleware(UserMessageMiddleware())
-    bot.setup_middleware(UserCallbackMiddleware())
-    bot.setup_middleware(StateMiddleware(bot))
+    sessions = DatabaseSessionMiddleware()
+    bot.setup_middleware(sessions)
+    # Guarded, so that the update's session is closed if they raise in pre_process
+    bot.setup_middleware(sessions.guard(UserMessageMiddleware()))
+    bot.setup_middleware(sessions.guard(UserCallbackMiddleware()))
+    bot.setup_middleware(sessions.guard(StateMiddleware(bot)))
 
     # Add custom filters
     bot.add_custom_filter(custom_filters.StateFilter(bot))
 
+    # Background workers
+    log_writer.start()
+    subscription_sweeper.start()
+    chat_summarizer.start()
+
     logger.info(f"Bot `{str(bot.get_me().username)}` has started")
-    bot.infinity_polling(timeout=190)
-    #bot.polling(timeout=90)
+    try:
+        bot.infinity_polling(timeout=190)
+        #bot.polling(timeout=90)
+    finally:
+        chat_summarizer.stop()
+        subscription_sweeper.stop()
+        log_writer.close()
@@ -1,12 +1,79 @@
 import logging
 import os
+from typing import Optional
 
+from omegaconf import OmegaConf
+from sqlalchemy.orm import Session
+
+from telegram_llm_chatbot.core.content_cache import ContentCache
+from telegram_llm_chatbot.core.entitlements import EntitlementCache
+from telegram_llm_chatbot.core.failover import provider_stats
+from telegram_llm_chatbot.core.images import ImagePreparer
+from telegram_llm_chatbot.core.llm import LLMHolder
+from telegram_llm_chatbot.core.metrics import register_metrics
+from telegram_llm_chatbot.core.response_cache import ResponseCache
+from telegram_llm_chatbot.core.scheduler import LLMScheduler
+from telegram_llm_chatbot.core.summarizer import ChatSummarizer
+from telegram_llm_chatbot.core.user_registry import UserRegistry
 from telegram_llm_chatbot.db import crud
-from telegram_llm_chatbot.db.models import User
+from telegram_llm_chatbot.db.rows import UserRecord
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+config = OmegaConf.load("./src/telegram_llm_chatbot/conf/config.yaml")
+
+# Shared answer to "does this user have an active subscription"
+entitlements = EntitlementCache(maxsize=config.entitlements.maxsize, ttl=config.entitlements.ttl)
+register_metrics("entitlements", entitlements.stats)
+
+# Known users, so that updates of repeat users need no user-table queries
+user_registry = UserRegistry(maxsize=config.user_registry.maxsize, ttl=config.user_registry.ttl)
+register_metrics("user_registry", user_registry.stats)
+
+# Responses to identical prompts, used by models with response_cache enabled in llm.yaml
+response_cache = ResponseCache(
+    maxsize=config.response_cache.maxsize,
+    ttl=config.response_cache.ttl,
+    max_bytes=config.response_cache.max_bytes,
+)
+register_metrics("response_cache", response_cache.stats)
+
+# The language model in use, reloaded when llm.yaml changes
+llm_holder = LLMHolder("./src/telegram_llm_chatbot/conf/llm.yaml", response_cache=response_cache)
+register_metrics("llm_providers", provider_stats.stats)
+
+# Concurrency and tokens-per-minute limits of the providers, excess calls wait by plan priority
+llm_scheduler = LLMScheduler(
+    providers=OmegaConf.to_container(config.scheduler.providers),
+    models=OmegaConf.to_container(config.scheduler.models),
+    max_queue_size=config.scheduler.max_queue_size,
+    position_interval=config.scheduler.position_interval,
+)
+register_metrics("llm_scheduler", llm_scheduler.stats)
+
+# Images are downscaled and re-encoded in memory before they are sent to the model
+image_preparer = ImagePreparer(
+    max_edge=config.images.max_edge, image_format=config.images.format, quality=config.images.quality
+)
+register_metrics("images", image_preparer.stats)
+
+# Extracted text and prepared images of files seen before, keyed by Telegram's file_unique_id
+content_cache = ContentCache(config.content_cache.directory, max_bytes=config.content_cache.max_bytes)
+register_metrics("content_cache", content_cache.stats)
+
+# Rolling summaries of the messages that fell out of the history window
+chat_summarizer = ChatSummarizer(
+    llm_holder.get,
+    enabled=config.summarizer.enabled,
+    min_messages=config.summarizer.min_messages,
+    batch_size=config.summarizer.batch_size,
+    max_chars=config.summarizer.max_chars,
+    scheduler=llm_scheduler,
+    priority=config.summarizer.priority,
+)
+register_metrics("chat_summarizer", chat_summarizer.stats)
+
 def download_file(bot, file_id: str, file_path: str) -> None:
     """
     Downloads a file from Telegram servers and saves it to the specified path.
@@ -25,25 +92,43 @@ def download_file(bot, file_id: str, file_path: str) -> None:
     logger.info(msg="OS event", extra={"file_id": file_id, "file_path": file_path, "event": "download_file"})
 
 
-def user_sign_in(user_id: int, message) -> User:
+def download_file_bytes(bot, file_id: str) -> bytes:
+    """
+    Downloads a file from Telegram servers into memory.
+
+    Args:
+        bot: The Telegram bot instance.
+        file_id: The unique identifier for the file to be downloaded.
+
+    Returns:
+        bytes: The content of the file.
+    """
+    file_info = bot.get_file(file_id)
+    logger.info(msg="OS event", extra={"file_id": file_id, "event": "download_file_bytes"})
+    return bot.download_file(file_info.file_path)
+
+
+def user_sign_in(user_id: int, message, db: Optional[Session] = None) -> UserRecord:
     """
     Signs in a user by adding them to the database if they are not already present.
 
     Args:
         user_id: The unique identifier for the user.
         message: The message object containing user information.
+        db: An open session to run in, otherwise a new one is used.
 
     Returns:
-        User: The user object.
+        UserRecord: The user record.
     """
     logger.info("User event", extra={"user_id": user_id, "user_message": message.text})
-    user = crud.get_user(user_id)
+    user = user_registry.get(user_id, db=db)
     if user is None:
         logger.info(f"DB user {message.chat.username} added to database.")
-        user = crud.upsert_user(user_id, message.chat.username)
+        user = user_registry.sync(user_id, message.chat.username, db=db)
 
         # Add trial subscription to user
-        crud.create_subscription(user_id, 1, "active")
+        crud.create_subscription(user_id, 1, "active", db=db)
+        entitlements.invalidate(user_id)
 
     return user
 
@@ -1,31 +1,145 @@
+import csv
+import gzip
 import logging
+import os
 from datetime import datetime
 from typing import Optional
 
 import pandas as pd
 from dotenv import find_dotenv, load_dotenv
-from telegram_llm_chatbot.db.database import get_enginge
+from sqlalchemy import BigInteger, Boolean, DateTime, Integer, Numeric, Select, Table, select
+
+from telegram_llm_chatbot.db.database import get_engine
+from telegram_llm_chatbot.db.models import Base
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+EXPORT_CHUNK_SIZE = 10000
+EXPORT_FORMATS = {"csv": "csv.gz", "parquet": "parquet"}
+
+# pyarrow is an optional dependency (extra ``export``) and is imported only when
+# a Parquet file is written, so CSV and Excel exports work without it
+
+
+def filters_by_period(table_name: str) -> bool:
+    """Return whether exports of a table are limited to a period, which needs a ``timestamp`` column."""
+    table = Base.metadata.tables.get(table_name)
+    return table is not None and "timestamp" in table.c
+
+
+def _build_query(table_name: str, start_date: Optional[datetime] = None) -> tuple[Table, Select]:
+    """Build the export query with the start date as a bound parameter.
+
+    Tables without a ``timestamp`` column are exported in full.
 
-# Function to export table data to CSV
+    Raises:
+        ValueError: The table is not part of the schema.
+    """
+    table = Base.metadata.tables.get(table_name)
+    if table is None:
+        raise ValueError(f"Unknown table: {table_name}")
+
+    query = select(table)
+    if start_date and "timestamp" in table.c:
+        query = query.where(table.c.timestamp >= start_date)
+    return table, query
+
+
+# Function to export table data to a DataFrame
 def export_table_to_df(table_name: str, start_date: Optional[datetime] = None) -> pd.DataFrame:
     load_dotenv(find_dotenv(usecwd=True))
 
-    # Establish a connection to the PostgreSQL database using the get_enginge function
-    engine = get_enginge()
+    # Establish a connection to the PostgreSQL database using the shared engine
+    engine = get_engine()
 
     df = pd.DataFrame()
-    query = f"SELECT * FROM {table_name}"
-    if start_date:
-        query += f" WHERE timestamp >= '{start_date}'"
-
     try:
+        _, query = _build_query(table_name, start_date)
         df = pd.read_sql_query(query, engine)
     except Exception as e:
         logger.warning(f"Error exporting data from table {table_name}: {e}")
         df = pd.DataFrame()
 
     return df
+
+
+def _arrow_schema(table: Table):
+    """Map the column types of a table to a fixed Arrow schema."""
+    import pyarrow as pa  # noqa: PLC0415
+
+    fields = []
+    for column in table.columns:
+        if isinstance(column.type, (Integer, BigInteger)):
+            arrow_type = pa.int64()
+        elif isinstance(column.type, Numeric):
+            arrow_type = pa.decimal128(column.type.precision or 38, column.type.scale or 0)
+        elif isinstance(column.type, DateTime):
+            arrow_type = pa.timestamp("us")
+        elif isinstance(column.type, Boolean):
+            arrow_type = pa.bool_()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+
+def export_table_to_file(
+    table_name: str,
+    directory: str,
+    start_date: Optional[datetime] = None,
+    file_format: str = "csv",
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> str:
+    """
+    Stream a table into a compressed CSV or Parquet file with bounded memory.
+
+    Rows are read through a server-side cursor and written chunk by chunk, so neither
+    the full result set nor a DataFrame of it is ever held in memory.
+
+    Args:
+        table_name (str): The name of the table to export.
+        directory (str): The directory to write the file to.
+        start_date (Optional[datetime]): Only export rows with a timestamp on or after this date.
+        file_format (str): Either ``csv`` (gzip-compressed) or ``parquet`` (zstd-compressed, needs pyarrow).
+        chunk_size (int): Number of rows fetched and written at a time.
+
+    Returns:
+        str: The path of the written file.
+
+    Raises:
+        ValueError: The table or the file format is not supported.
+    """
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {file_format}")
+    table, query = _build_query(table_name, start_date)
+
+    os.makedirs(directory, exist_ok=True)
+    filename = f"{table_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{EXPORT_FORMATS[file_format]}"
+    file_path = os.path.join(directory, filename)
+
+    rows_written = 0
+    with get_engine().connect() as connection:
+        result = connection.execution_options(stream_results=True, max_row_buffer=chunk_size).execute(query)
+        columns = list(result.keys())
+
+        if file_format == "csv":
+            with gzip.open(file_path, "wt", newline="", encoding="utf-8") as file:
+                writer = csv.writer(file)
+                writer.writerow(columns)
+                for chunk in result.partitions(chunk_size):
+                    writer.writerows(chunk)
+                    rows_written += len(chunk)
+        else:
+            import pyarrow as pa  # noqa: PLC0415
+            import pyarrow.parquet as pq  # noqa: PLC0415
+
+            schema = _arrow_schema(table)
+            with pq.ParquetWriter(file_path, schema, compression="zstd") as writer:
+                for chunk in result.partitions(chunk_size):
+                    data = {name: [row[i] for row in chunk] for i, name in enumerate(columns)}
+                    writer.write_batch(pa.RecordBatch.from_pydict(data, schema=schema))
+                    rows_written += len(chunk)
+
+    logger.info(f"Exported {rows_written} rows from table {table_name} to {file_path}")
+    return file_path
@@ -1,4 +1,4 @@
-from telegram_llm_chatbot.api.handlers.admin import about, config, db, menu, subscription
+from telegram_llm_chatbot.api.handlers.admin import about, config, db, menu, stats, subscription
 
 
 def register_handlers(bot):
@@ -6,4 +6,5 @@ def register_handlers(bot):
     menu.register_handlers(bot)
     config.register_handlers(bot)
     about.register_handlers(bot)
-    subscription.register_handlers(bot)
\ No newline at end of file
+    subscription.register_handlers(bot)
+    stats.register_handlers(bot)
\ No newline at end of file
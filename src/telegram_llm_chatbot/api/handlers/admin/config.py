@@ -4,6 +4,8 @@ import logging.config
 import yaml
 from omegaconf import OmegaConf
 
+from telegram_llm_chatbot.api.common import llm_holder
+
 config = OmegaConf.load("./src/telegram_llm_chatbot/conf/config.yaml")
 strings = OmegaConf.load("./src/telegram_llm_chatbot/conf/strings.yaml")
 
@@ -40,6 +42,9 @@ def register_handlers(bot):
             with open("./src/telegram_llm_chatbot/conf/llm.yaml", "w") as file:
                 yaml.safe_dump(llm_config, file)
 
+            # Swap the model in use right away instead of waiting for the file check
+            llm_holder.reload()
+
             bot.send_message(user_id, strings.admin_menu.config_update_success)
         except Exception as e:
             logger.error(f"Failed to update configuration: {e}")
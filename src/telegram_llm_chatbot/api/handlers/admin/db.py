@@ -6,7 +6,7 @@ import os
 from omegaconf import OmegaConf
 from telebot.types import InlineKeyboardButton, InlineKeyboardMarkup
 
-from telegram_llm_chatbot.api.db.export import export_table_to_df
+from telegram_llm_chatbot.api.db.export import export_table_to_df, export_table_to_file, filters_by_period
 
 config = OmegaConf.load("./src/telegram_llm_chatbot/conf/config.yaml")
 strings = OmegaConf.load("./src/telegram_llm_chatbot/conf/strings.yaml")
@@ -14,6 +14,9 @@ strings = OmegaConf.load("./src/telegram_llm_chatbot/conf/strings.yaml")
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+EXPORT_DIRECTORY = "temp"
+EXPORT_TABLES = ["chats", "messages", "users", "subscriptions", "subscription_plans", "logs"]
+
 
 def create_period_selection_markup(strings):
     """Create the period selection markup."""
@@ -28,6 +31,44 @@ def create_period_selection_markup(strings):
     return period_markup
 
 
+def create_format_selection_markup(strings, period: str):
+    """Create the file format selection markup for the selected period."""
+    format_markup = InlineKeyboardMarkup(row_width=1)
+    format_markup.add(
+        InlineKeyboardButton(strings.admin_menu.format_xlsx, callback_data=f"_format_xlsx_{period}"),
+        InlineKeyboardButton(strings.admin_menu.format_csv, callback_data=f"_format_csv_{period}"),
+        InlineKeyboardButton(strings.admin_menu.format_parquet, callback_data=f"_format_parquet_{period}"),
+    )
+    return format_markup
+
+
+def get_start_date(period: str):
+    """Return the first date of the selected period, or None for all data."""
+    today = datetime.datetime.now().date()
+    if period == "today":
+        return today
+    elif period == "week":
+        return today - datetime.timedelta(days=7)
+    elif period == "two_weeks":
+        return today - datetime.timedelta(days=14)
+    elif period == "month":
+        return today - datetime.timedelta(days=30)
+    return None
+
+
+def export_table(table: str, start_date, file_format: str) -> str:
+    """Export one table to a file in the export directory and return its path."""
+    if file_format != "xlsx":
+        return export_table_to_file(table, EXPORT_DIRECTORY, start_date=start_date, file_format=file_format)
+
+    # Excel files are built in memory, which is fine for small periods only
+    df = export_table_to_df(table, start_date=start_date)
+    os.makedirs(EXPORT_DIRECTORY, exist_ok=True)
+    filename = f"{EXPORT_DIRECTORY}/{table}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    df.to_excel(filename, index=False)
+    return filename
+
+
 # react to any text if not command
 def register_handlers(bot):
     """Register handlers for the bot."""
@@ -44,76 +85,33 @@ def register_handlers(bot):
     @bot.callback_query_handler(func=lambda call: call.data.startswith("_period_"))
     def period_selection_handler(call):
         user_id = call.from_user.id
-
         period = call.data.split("_period_")[1]
-        start_date = None
-
-        if period == "today":
-            start_date = datetime.datetime.now().date()
-        elif period == "week":
-            start_date = datetime.datetime.now().date() - datetime.timedelta(days=7)
-        elif period == "month":
-            start_date = datetime.datetime.now().date() - datetime.timedelta(days=30)
-        elif period == "two_weeks":
-            start_date = datetime.datetime.now().date() - datetime.timedelta(days=14)
-        else:
-            start_date = None
-
-        # Export data
-        tables = ["chats", "messages", "users", "subscriptions", "subscription_plans"]
-        for table in tables:
-            df = export_table_to_df(table, start_date=start_date)
-
-            # create a temp folder if it does not exist
-            if not os.path.exists("temp"):
-                os.makedirs("temp")
-
-            # save as excel in temp folder and send to a user
-            filename = f"temp/{table}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-            df.to_excel(filename, index=False)
-            bot.send_document(user_id, open(filename, "rb"))
-            # remove the file
-            os.remove(filename)
 
-    @bot.callback_query_handler(func=lambda call: call.data == "_export_data")
-    def export_data_handler(call):
-        user_id = call.from_user.id
-
-        # Send period selection menu
+        # Send format selection menu
         bot.send_message(
-            user_id, strings.admin_menu.select_period, reply_markup=create_period_selection_markup(strings)
+            user_id, strings.admin_menu.select_format, reply_markup=create_format_selection_markup(strings, period)
         )
 
-    @bot.callback_query_handler(func=lambda call: call.data.startswith("_period_"))
-    def period_selection_handler(call):
+    @bot.callback_query_handler(func=lambda call: call.data.startswith("_format_"))
+    def format_selection_handler(call):
         user_id = call.from_user.id
-
-        period = call.data.split("_period_")[1]
-        start_date = None
-
-        if period == "today":
-            start_date = datetime.datetime.now().date()
-        elif period == "week":
-            start_date = datetime.datetime.now().date() - datetime.timedelta(days=7)
-        elif period == "month":
-            start_date = datetime.datetime.now().date() - datetime.timedelta(days=30)
-        elif period == "two_weeks":
-            start_date = datetime.datetime.now().date() - datetime.timedelta(days=14)
-        else:
-            start_date = None
-
-        # Export data
-        tables = ["chats", "messages", "users"]
-        for table in tables:
-            df = export_table_to_df(table, start_date=start_date)
-
-            # create a temp folder if it does not exist
-            if not os.path.exists("temp"):
-                os.makedirs("temp")
-
-            # save as excel in temp folder and send to a user
-            filename = f"temp/{table}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-            df.to_excel(filename, index=False)
-            bot.send_document(user_id, open(filename, "rb"))
-            # remove the file
-            os.remove(filename)
+        file_format, _, period = call.data.split("_format_")[1].partition("_")
+        start_date = get_start_date(period)
+
+        # Export data, one file per table, sent and removed one at a time
+        for table in EXPORT_TABLES:
+            try:
+                filename = export_table(table, start_date, file_format)
+            except Exception as e:
+                logger.error(f"Error exporting table {table}: {e}")
+                continue
+            # Tables without timestamps cannot be limited to the period, say so instead of failing silently
+            caption = None
+            if start_date and not filters_by_period(table):
+                caption = strings.admin_menu.export_full_table.format(table=table)
+            try:
+                with open(filename, "rb") as file:
+                    bot.send_document(user_id, file, caption=caption)
+            finally:
+                # remove the file
+                os.remove(filename)
@@ -23,6 +23,7 @@ def create_admin_menu_markup(options) -> InlineKeyboardMarkup:
         InlineKeyboardButton(options.configure_language_model, callback_data="_configure_language_model"),
         InlineKeyboardButton(options.configure_image_model, callback_data="_configure_image_model"),
         InlineKeyboardButton(options.export_data, callback_data="_export_data"),
+        InlineKeyboardButton(options.stats, callback_data="_stats"),
         InlineKeyboardButton(options.about, callback_data="_about")
     )
     return menu_markup
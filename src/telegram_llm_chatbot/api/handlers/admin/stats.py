@@ -0,0 +1,30 @@
+import logging
+import logging.config
+
+import yaml
+from omegaconf import OmegaConf
+
+from telegram_llm_chatbot.core.metrics import collect_metrics
+from telegram_llm_chatbot.db import crud
+
+strings = OmegaConf.load("./src/telegram_llm_chatbot/conf/strings.yaml")
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def register_handlers(bot):
+    """Register handlers for the bot."""
+
+    @bot.callback_query_handler(func=lambda call: call.data == "_stats")
+    def stats_handler(call):
+        user_id = call.from_user.id
+        user = crud.get_user(user_id)
+        if user.role != "admin":
+            bot.send_message(user_id, strings.no_rights.format(username=user.name))
+            return
+
+        stats_str = yaml.safe_dump(collect_metrics(), sort_keys=False)
+
+        # Send runtime statistics
+        bot.send_message(user_id, f"```yaml\n{stats_str}\n```", parse_mode="Markdown")
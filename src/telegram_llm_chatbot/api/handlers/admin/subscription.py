@@ -7,6 +7,7 @@ import yaml
 from omegaconf import OmegaConf
 from telebot.types import InlineKeyboardButton, InlineKeyboardMarkup
 
+from telegram_llm_chatbot.api.common import entitlements
 from telegram_llm_chatbot.api.db.export import export_table_to_df
 from telegram_llm_chatbot.db import crud
 
@@ -54,6 +55,7 @@ def register_handlers(bot):
             return
 
         if plan:
+            entitlements.clear()
             bot.send_message(
                 user_id,
                 strings.subscription_plan_created.format(
@@ -102,6 +104,7 @@ def register_handlers(bot):
         if plans:
             for plan in plans:
                 crud.delete_subscription_plan(plan.id)
+            entitlements.clear()
             bot.send_message(user_id, strings.subscription_plan_removed.format(plan=plan_name))
         else:
             bot.send_message(user_id, strings.subscription_plan_not_found)
@@ -3,7 +3,7 @@ import logging.config
 from omegaconf import OmegaConf
 from telebot import types
 
-from telegram_llm_chatbot.api.common import parse_callback_data, user_sign_in
+from telegram_llm_chatbot.api.common import parse_callback_data, user_registry, user_sign_in
 from telegram_llm_chatbot.db import crud
 
 # Set up logging
@@ -18,10 +18,10 @@ def register_handlers(bot):
     """Register handlers for the bot."""
 
     @bot.message_handler(commands=["add_chat"])
-    def add_chat(message):
+    def add_chat(message, db):
         """Handle the /add_chat command."""
         user_id = int(message.chat.id)
-        user_sign_in(user_id, message)
+        user_sign_in(user_id, message, db=db)
         bot.reply_to(message, strings.add_chat_ask_name)
         bot.register_next_step_handler(message, _add_chat)
 
@@ -32,7 +32,7 @@ def register_handlers(bot):
 
         try:
             new_chat = crud.create_chat(user_id, chat_name)
-            crud.update_user_last_chat_id(user_id, new_chat.id)
+            user_registry.set_current_chat(user_id, new_chat.id)
             bot.reply_to(message, strings.add_chat_success.format(chat_name=chat_name))
             bot.reply_to(message, strings.current_chat.format(chat_name=chat_name))
         except Exception as e:
@@ -40,15 +40,15 @@ def register_handlers(bot):
             bot.reply_to(message, strings.add_chat_error)
 
     @bot.message_handler(commands=["current_chat"])
-    def current_chat(message):
+    def current_chat(message, db):
         """Handle the /current_chat command."""
         user_id = int(message.chat.id)
-        user_sign_in(user_id, message)
-        chat_id = crud.get_last_chat_id(user_id)
+        user_sign_in(user_id, message, db=db)
+        chat_id = user_registry.current_chat_id(user_id, db=db)
 
         if chat_id:
             try:
-                chat_name = crud.get_chat_name(user_id, chat_id)
+                chat_name = crud.get_chat_name(user_id, chat_id, db=db)
                 bot.reply_to(message, strings.current_chat.format(chat_name=chat_name))
             except IndexError:
                 bot.reply_to(message, strings.current_chat_no_chat)
@@ -56,21 +56,21 @@ def register_handlers(bot):
             bot.reply_to(message, strings.current_chat_no_chat)
 
     @bot.message_handler(commands=["get_chats"])
-    def get_chats(message):
+    def get_chats(message, db):
         """Handle the /get_chats command."""
         user_id = int(message.chat.id)
-        user_sign_in(user_id, message)
-        chats = crud.get_user_chats(user_id)
+        user_sign_in(user_id, message, db=db)
+        chats = crud.get_user_chats(user_id, db=db)
         send_chats_list(bot, message.chat.id, chats, strings.get_chats, strings.get_chats_empty)
 
     @bot.callback_query_handler(func=lambda call: "select_chat_" in call.data)
-    def select_chat_callback_query(call):
+    def select_chat_callback_query(call, db):
         """Handle the callback query for selecting a chat."""
         chat_id, chat_name = parse_callback_data(call.data)
         user_id = call.from_user.id
 
         try:
-            crud.upsert_user(user_id, call.from_user.username, last_chat_id=chat_id)
+            user_registry.sync(user_id, call.from_user.username, last_chat_id=chat_id, db=db)
             logger.info(f"User with id {user_id} updated successfully with chat_id {chat_id}.")
             bot.send_message(
                 chat_id=call.message.chat.id, text=strings.handle_callback_query_success.format(chat_name=chat_name)
@@ -80,11 +80,11 @@ def register_handlers(bot):
             bot.send_message(chat_id=call.message.chat.id, text="An error occurred. Please try again later.")
 
     @bot.message_handler(commands=["delete_chat"])
-    def delete_chat(message):
+    def delete_chat(message, db):
         """Handle the /delete_chat command."""
         user_id = int(message.chat.id)
-        user_sign_in(user_id, message)
-        chats = crud.get_user_chats(user_id)
+        user_sign_in(user_id, message, db=db)
+        chats = crud.get_user_chats(user_id, db=db)
 
         if not chats:
             bot.send_message(chat_id=message.chat.id, text=strings.get_chats_empty)
@@ -94,15 +94,15 @@ def register_handlers(bot):
             )
 
     @bot.callback_query_handler(func=lambda call: "delete_chat_" in call.data)
-    def delete_chat_callback_query(call):
+    def delete_chat_callback_query(call, db):
         """Handle the callback query for deleting a chat."""
         user_id = int(call.from_user.id)
         chat_id, chat_name = parse_callback_data(call.data)
 
         try:
-            crud.delete_chat(user_id, chat_id)
+            crud.delete_chat(user_id, chat_id, db=db)
             bot.send_message(chat_id=user_id, text=strings.delete_chat_success.format(chat_name=chat_name))
-            chats = crud.get_user_chats(user_id)
+            chats = crud.get_user_chats(user_id, db=db)
             send_chats_list(bot, call.message.chat.id, chats, strings.get_chats, strings.get_chats_empty)
         except Exception as e:
             logger.error(f"Error deleting chat with id {chat_id} for user {user_id}: {e}")
@@ -3,13 +3,14 @@ import logging.config
 import requests
 from hydra.utils import instantiate
 from omegaconf import OmegaConf
+from sqlalchemy.orm import Session
 from telebot import TeleBot
 from telebot.states import State, StatesGroup
 from telebot.states.sync.context import StateContext
 from telebot.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message
 
+from telegram_llm_chatbot.api.common import entitlements
 from telegram_llm_chatbot.core.image_gen import Dalle3OpenAI
-from telegram_llm_chatbot.db import crud
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -33,13 +34,11 @@ def register_handlers(bot: TeleBot):
         state.delete()
 
     @bot.message_handler(commands=["generate"])
-    def invoke_chatbot(message: Message, state: StateContext):
+    def invoke_chatbot(message: Message, state: StateContext, db: Session):
         user_id = int(message.chat.id)
 
         # Check active subscriptions
-        crud.update_subscription_statuses(user_id)
-        subscriptions = crud.get_active_subscriptions_by_user_id(user_id)
-        if not subscriptions:
+        if not entitlements.is_entitled(user_id, db=db):
             purcharse_button = InlineKeyboardMarkup(row_width=1)
             purcharse_button.add(
                 InlineKeyboardButton(strings.purcharse_subscription, callback_data="_purchase"),
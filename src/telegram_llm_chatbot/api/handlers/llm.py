@@ -1,21 +1,32 @@
-from ast import parse
-import io
 import logging
 import os
 from datetime import datetime
+from typing import Callable, Optional
 
-from hydra.utils import instantiate
 from omegaconf import OmegaConf
-from PIL import Image
 from telebot import TeleBot
 from telebot.states import State, StatesGroup
 from telebot.states.sync.context import StateContext
-from telebot.types import InlineKeyboardButton, InlineKeyboardMarkup, Message
+from sqlalchemy.orm import Session
+from telebot.types import InlineKeyboardButton, InlineKeyboardMarkup, Message, PhotoSize
 
-from telegram_llm_chatbot.api.common import download_file, is_command
+from telegram_llm_chatbot.api.common import (
+    chat_summarizer,
+    content_cache,
+    download_file_bytes,
+    entitlements,
+    image_preparer,
+    is_command,
+    llm_holder,
+    llm_scheduler,
+    user_registry,
+)
 from telegram_llm_chatbot.api.handlers.image_gen import ImageGenStates
+from telegram_llm_chatbot.api.streaming import StreamRenderer
+from telegram_llm_chatbot.core.exceptions import FileTooLargeException, LLMQueueFullException
 from telegram_llm_chatbot.core.files import TextFileParser
-from telegram_llm_chatbot.core.llm import LLM
+from telegram_llm_chatbot.core.images import PreparedImage
+from telegram_llm_chatbot.core.tokens import count_tokens
 from telegram_llm_chatbot.db import crud
 
 # Set up logging
@@ -28,12 +39,30 @@ ALLOWED_IMAGE_EXTENSIONS = {"jpg", "jpeg", "png", "gif"}
 ALLOWED_TEXT_EXTENSIONS = {"pdf", "doc", "docx", "txt"}
 MAX_FILE_SIZE_MB = 10
 MAX_FILE_SIZE = MAX_FILE_SIZE_MB * 1024 * 1024  # 10 MB
+# Messages, including the text extracted from files, are truncated to this length
+MAX_MESSAGE_CHARS = 10000
 
 # Load configurations
+config = OmegaConf.load("./src/telegram_llm_chatbot/conf/config.yaml")
 strings = OmegaConf.load("./src/telegram_llm_chatbot/conf/strings.yaml")
 
 # Initialize file parser
-text_file_parser = TextFileParser(max_file_size_mb=MAX_FILE_SIZE_MB, allowed_file_types=ALLOWED_TEXT_EXTENSIONS)
+text_file_parser = TextFileParser(
+    max_file_size_mb=MAX_FILE_SIZE_MB,
+    allowed_file_types=ALLOWED_TEXT_EXTENSIONS,
+    max_pdf_pages=config.pdf.max_pages,
+    pdf_workers=config.pdf.workers,
+    pdf_parallel_min_pages=config.pdf.parallel_min_pages,
+    pdf_timeout=config.pdf.timeout,
+)
+
+def select_photo_size(photo_sizes: list[PhotoSize], max_edge: int) -> PhotoSize:
+    """Pick the smallest size of a photo that still covers the model's maximum edge."""
+    for photo_size in sorted(photo_sizes, key=lambda size: size.width * size.height):
+        if max(photo_size.width, photo_size.height) >= max_edge:
+            return photo_size
+    return max(photo_sizes, key=lambda size: size.width * size.height)
+
 
 class LLMStates(StatesGroup):
     default = State()
@@ -46,13 +75,11 @@ def register_handlers(bot: TeleBot):
         func=lambda message: not is_command(message),
         content_types=["text", "photo", "document"]
     )
-    def invoke_chatbot(message: Message, state: StateContext):
+    def invoke_chatbot(message: Message, state: StateContext, db: Session):
         user_id = int(message.chat.id)
 
         # Check active subscriptions
-        crud.update_subscription_statuses(user_id)
-        subscriptions = crud.get_active_subscriptions_by_user_id(user_id)
-        if not subscriptions:
+        if not entitlements.is_entitled(user_id, db=db):
             purcharse_button = InlineKeyboardMarkup(row_width=1)
             purcharse_button.add(
                 InlineKeyboardButton(strings.purcharse_subscription, callback_data="_purchase"),
@@ -60,122 +87,189 @@ def register_handlers(bot: TeleBot):
             bot.send_message(user_id, strings.account.no_subscription, reply_markup=purcharse_button)
             return
 
-        last_chat_id = crud.get_last_chat_id(user_id)
+        last_chat_id = user_registry.current_chat_id(user_id, db=db)
         if last_chat_id is None:
             # Pick the first chat if no chat is selected
-            chats = crud.get_user_chats(user_id)
+            chats = crud.get_user_chats(user_id, db=db)
             if chats:
                 last_chat_id = chats[0].id
                 bot.send_message(user_id, strings.current_chat.format(chat_name=chats[0].name))
             else:
                 # Create a new chat
-                chat = crud.create_chat(user_id, strings.default_chat_name)
+                chat = crud.create_chat(user_id, strings.default_chat_name, db=db)
                 last_chat_id = chat.id
                 bot.send_message(user_id, strings.current_chat_no_chat)
-            crud.update_user_last_chat_id(user_id, last_chat_id)
+            user_registry.set_current_chat(user_id, last_chat_id, db=db)
 
         if message.content_type in ["photo", "document"]:
             state.set(LLMStates.awaiting_file)
-            handle_file(message, state, last_chat_id)
+            handle_file(message, state, last_chat_id, db)
         elif message.content_type == "text":
             state.set(LLMStates.awaiting_text)
-            handle_text(message, state, last_chat_id)
+            handle_text(message, state, last_chat_id, db)
         else:
             bot.reply_to(message, "Unsupported content type.")
 
-    def handle_file(message: Message, state: StateContext, last_chat_id: int):
+    def handle_file(message: Message, state: StateContext, last_chat_id: int, db: Session):
         user_id = int(message.chat.id)
         user_message = message.caption if message.caption else ""
         image = None
 
         # Extract file information
         if message.content_type == "photo":
-            file_info = message.photo[-1]
+            file_info = select_photo_size(message.photo, image_preparer.max_edge)
+            filename = f"photo_{file_info.file_unique_id}.jpg"
         else:  # "document"
             file_info = message.document
-
-        file_id = file_info.file_id
-        filename = getattr(file_info, "file_name", f"file_{file_id}")
-        user_input_file_path = os.path.join(TEMP_DIR, str(user_id), filename)
+            filename = getattr(file_info, "file_name", None) or f"file_{file_info.file_id}"
 
         logger.info("User event", extra={"user_id": user_id, "user_message": user_message})
 
-        # Ensure the directory exists
-        os.makedirs(os.path.dirname(user_input_file_path), exist_ok=True)
-        download_file(bot, file_id, user_input_file_path)
+        file_extension = filename.rsplit(".", 1)[-1].lower()
+        if file_extension not in ALLOWED_IMAGE_EXTENSIONS | ALLOWED_TEXT_EXTENSIONS:
+            bot.reply_to(message, f"Unsupported file type: {file_extension}")
+            return
 
-        # Validate file size before processing
-        if os.path.getsize(user_input_file_path) > MAX_FILE_SIZE:
+        # Validate file size before downloading
+        if file_info.file_size and file_info.file_size > MAX_FILE_SIZE:
             bot.reply_to(message, f"File size exceeds the maximum allowed size of {MAX_FILE_SIZE_MB} MB.")
             return
 
-        file_extension = filename.rsplit(".", 1)[-1].lower()
+        # End the transaction of the checks before downloading and parsing
+        db.commit()
+
+        user_input_file_path = os.path.join(TEMP_DIR, str(user_id), filename)
+
+        def extract_text(data: bytes) -> bytes:
+            # The parser reads from a path
+            os.makedirs(os.path.dirname(user_input_file_path), exist_ok=True)
+            with open(user_input_file_path, "wb") as file:
+                file.write(data)
+            try:
+                return text_file_parser.extract_content(user_input_file_path, max_chars=MAX_MESSAGE_CHARS).encode()
+            finally:
+                # Clean up temporary file
+                os.remove(user_input_file_path)
 
         try:
             if file_extension in ALLOWED_IMAGE_EXTENSIONS:
-                with open(user_input_file_path, "rb") as file_obj:
-                    image_bytes = file_obj.read()
-                    image = Image.open(io.BytesIO(image_bytes))
-            elif file_extension in ALLOWED_TEXT_EXTENSIONS:
-                text_content = text_file_parser.extract_content(user_input_file_path)
-                user_message += f"\n{text_content}"
+                # Images never touch the disk, apart from the content cache
+                content = load_file_content(
+                    file_info, image_preparer.cache_kind, lambda data: image_preparer.prepare(data).to_bytes()
+                )
+                image = PreparedImage.from_bytes(content)
             else:
-                bot.reply_to(message, f"Unsupported file type: {file_extension}")
-                return
+                # The extracted text depends on the budgets
+                cache_kind = f"text:{MAX_MESSAGE_CHARS}:{config.pdf.max_pages}"
+                text_content = load_file_content(file_info, cache_kind, extract_text).decode()
+                user_message += f"\n{text_content}"
         except Exception as e:
             logger.error(f"Error processing file: {e}")
             bot.reply_to(message, "An error occurred while processing your file.")
             return
-        finally:
-            # Clean up temporary file
-            if os.path.exists(user_input_file_path):
-                os.remove(user_input_file_path)
 
-        process_message(user_id, last_chat_id, user_message, image)
+        process_message(user_id, last_chat_id, user_message, image, db=db)
 
-    def handle_text(message: Message, state: StateContext, last_chat_id: int):
+    def load_file_content(file_info, kind: str, extract: Callable[[bytes], bytes]) -> bytes:
+        """Return the extracted content of a file, skipping download and extraction if the file was seen before."""
+        key = content_cache.key(kind, file_info.file_unique_id) if file_info.file_unique_id else None
+        content = content_cache.get(key) if key else None
+        if content is not None:
+            return content
+
+        data = download_file_bytes(bot, file_info.file_id)
+        if len(data) > MAX_FILE_SIZE:
+            raise FileTooLargeException(MAX_FILE_SIZE_MB)
+        if key is None:
+            key = content_cache.key(kind, data=data)
+            content = content_cache.get(key)
+            if content is not None:
+                return content
+
+        content = extract(data)
+        content_cache.set(key, content)
+        return content
+
+    def handle_text(message: Message, state: StateContext, last_chat_id: int, db: Session):
         user_id = int(message.chat.id)
         user_message = message.text
-        process_message(user_id, last_chat_id, user_message)
+        process_message(user_id, last_chat_id, user_message, db=db)
 
-    def process_message(user_id: int, last_chat_id: int, user_message: str, image=None):
+    def process_message(
+        user_id: int,
+        last_chat_id: int,
+        user_message: str,
+        image: Optional[PreparedImage] = None,
+        db: Session = None,
+    ):
         # Truncate and add the message to the chat history
-        user_message = user_message[:10000]
-        crud.create_message(last_chat_id, "user", content=user_message, timestamp=datetime.now())
+        user_message = user_message[:MAX_MESSAGE_CHARS]
+        crud.create_message(last_chat_id, "user", content=user_message, timestamp=datetime.now(), db=db)
+
+        # The shared model, reloaded by the holder when llm.yaml changes
+        llm = llm_holder.get()
+        model_config = llm.config
 
-        # Retrieve chat history
-        chat_history = crud.get_chat_history(last_chat_id)
+        # The summary of older messages takes its share of the token budget
+        summary = crud.get_chat_summary(last_chat_id, db=db).summary if chat_summarizer.enabled else None
+        token_budget = model_config.context_token_budget
+        if summary and token_budget:
+            token_budget = max(token_budget - count_tokens(summary), 0)
 
-        # Load configurations
-        config_llm = OmegaConf.load("./src/telegram_llm_chatbot/conf/llm.yaml")
-        model_config = instantiate(config_llm.custom)
-        llm = LLM(model_config)
-        logger.info(f"Loaded LLM model with config: {model_config.dict()}")
+        # Retrieve the tail of the chat history that fits into the model context
+        chat_history = crud.get_chat_history(
+            last_chat_id, limit=model_config.chat_history_limit, token_budget=token_budget, db=db
+        )
 
-        if llm.config.stream:
+        # Store the user turn and end the transaction before the model is called. No pooled
+        # connection or row lock is held while the call waits for a slot and streams, and an
+        # error of the model no longer rolls back the user's message.
+        db.commit()
+
+        renderer = StreamRenderer(
+            bot,
+            user_id,
+            min_interval=config.streaming.min_interval,
+            min_delta=config.streaming.min_delta,
+            clean=lambda text: text.replace("<end_of_turn>", ""),
+        )
+        if model_config.stream:
             # Inform the user about processing
-            sent_msg = bot.send_message(user_id, "...")
-            accumulated_response = ""
-
-            # Generate response and send chunks
-            for idx, chunk in enumerate(llm.run(chat_history, image=image)):
-                accumulated_response += chunk.content
-                if idx % 20 == 0:
-                    try:
-                        bot.edit_message_text(
-                            accumulated_response, chat_id=user_id, message_id=sent_msg.message_id
-                        )
-                    except Exception as e:
-                        logger.error(f"Failed to edit message: {e}")
-                        continue
-                if idx > 200:
-                    continue
-            bot.edit_message_text(
-                accumulated_response.replace("<end_of_turn>", ""), chat_id=user_id, message_id=sent_msg.message_id
+            renderer.start("...")
+
+        def plan_priority() -> int:
+            # Subscribers of paid plans are served ahead of trial users. Looked up in a session
+            # of its own, so that the update's session stays without a transaction while waiting
+            subscriptions = crud.get_active_subscriptions_by_user_id(user_id) or []
+            return 0 if any(s.plan_id != config.scheduler.trial_plan_id for s in subscriptions) else 1
+
+        # Each provider tried waits for a free slot of its own, the position in the queue is shown meanwhile
+        try:
+            response = llm.run(
+                chat_history,
+                image=image,
+                summary=summary,
+                scheduler=llm_scheduler,
+                priority=plan_priority,
+                on_position=lambda position: renderer.show_status(strings.queue_position.format(position=position)),
             )
-            crud.create_message(last_chat_id, "assistant", content=accumulated_response, timestamp=datetime.now())
-        else:
-            # Generate and send the final response
-            response = llm.run(chat_history, image=image)
-            bot.send_message(user_id, response.response_content)
-            crud.create_message(last_chat_id, "assistant", content=response.response_content, timestamp=datetime.now())
+            if model_config.stream:
+                # Generate response and edit it into the messages as it arrives
+                for chunk in response:
+                    renderer.feed(chunk.content)
+                response_content = renderer.text
+            else:
+                response_content = response.response_content
+                renderer.feed(response_content)
+        except LLMQueueFullException as e:
+            logger.warning(f"Rejected a message of user {user_id}: {e}")
+            renderer.show_status(strings.queue_full)
+            return
+
+        renderer.finish()
+        # A short transaction of its own, committed by the session middleware
+        crud.create_message(last_chat_id, "assistant", content=response_content, timestamp=datetime.now(), db=db)
+
+        # Fold the messages that fell out of the window into the summary after the reply was sent
+        if chat_history:
+            chat_summarizer.submit(last_chat_id, before_id=chat_history[0].id)
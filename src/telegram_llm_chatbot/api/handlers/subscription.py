@@ -6,6 +6,7 @@ from dotenv import find_dotenv, load_dotenv
 from omegaconf import OmegaConf
 from telebot.types import LabeledPrice
 
+from telegram_llm_chatbot.api.common import entitlements
 from telegram_llm_chatbot.db import crud
 
 logger = logging.getLogger(__name__)
@@ -70,16 +71,18 @@ def register_handlers(bot):
         )
 
     @bot.message_handler(content_types=['successful_payment'])
-    def successful_payment(message):
+    def successful_payment(message, db):
         user_id = message.from_user.id
         subscription_plan_id = message.successful_payment.invoice_payload
-        subscription = crud.create_subscription(user_id, subscription_plan_id)
+        subscription = crud.create_subscription(user_id, subscription_plan_id, db=db)
         crud.create_payment(
             subscription_id=subscription.id,
             amount=message.successful_payment.total_amount/100,
             currency=message.successful_payment.currency,
             payment_date=datetime.datetime.now(),
-            payment_method=message.successful_payment.provider_payment_charge_id
+            payment_method=message.successful_payment.provider_payment_charge_id,
+            db=db
         )
+        entitlements.invalidate(user_id)
         bot.send_message(user_id, strings.payment_successful.format(product_name=subscription.plan.name))
         logger.info(f"User {user_id} has successfully paid for subscription {subscription_plan_id}")
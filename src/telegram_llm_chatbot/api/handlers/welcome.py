@@ -2,6 +2,7 @@ import logging.config
 
 from omegaconf import OmegaConf
 
+from telegram_llm_chatbot.api.common import entitlements, user_registry
 from telegram_llm_chatbot.db import crud
 
 logging.basicConfig(level=logging.INFO)
@@ -12,24 +13,25 @@ config = OmegaConf.load("./src/telegram_llm_chatbot/conf/welcome.yaml")
 
 def register_handlers(bot):
     @bot.message_handler(commands=["help"])
-    def help_command(message):
+    def help_command(message, db):
         """Handle the /help command."""
         user_id = int(message.chat.id)
         # add user to database if not already present
-        if crud.get_user(user_id) is None:
+        if user_registry.get(user_id, db=db) is None:
             logger.info("New user {message.chat.username} added to database.")
-            crud.upsert_user(user_id, message.chat.username)
+            user_registry.sync(user_id, message.chat.username, db=db)
         bot.reply_to(message, config.strings.help)
 
     @bot.message_handler(commands=["start"])
-    def start_command(message):
+    def start_command(message, db):
         """Handle the /start command."""
         user_id = int(message.chat.id)
 
         # If user does not have any subscritions
-        if not crud.get_subscriptions_by_user_id(user_id):
+        if not crud.get_subscriptions_by_user_id(user_id, db=db):
 
             # Grant trial subscription
-            crud.create_subscription(user_id, plan_id=1)
+            crud.create_subscription(user_id, plan_id=1, db=db)
+            entitlements.invalidate(user_id)
 
         bot.reply_to(message, config.strings.start)
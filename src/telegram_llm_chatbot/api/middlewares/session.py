@@ -0,0 +1,94 @@
+import logging
+
+from telebot.handler_backends import BaseMiddleware, CancelUpdate
+
+from telegram_llm_chatbot.db.database import get_session
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class DatabaseSessionMiddleware(BaseMiddleware):
+    """
+    Middleware that runs the database work of each update in one session.
+
+    The session is stored in ``data['db']``; handlers receive it by declaring
+    a ``db`` parameter and pass it on to the CRUD functions. It is committed
+    after the handlers ran, or rolled back if they raised, in which case the
+    callables that middlewares appended to ``data['on_rollback']`` are run.
+
+    Handlers commit early before slow work such as downloads or model calls.
+    The session then gives its connection back to the pool and opens a new,
+    short transaction on the next statement.
+
+    pyTelegramBotAPI skips ``post_process`` when a later middleware raises or
+    cancels the update in ``pre_process``; wrap such middlewares in ``guard``
+    so that the session is finished in that case too.
+    """
+
+    def __init__(self) -> None:
+        """Handle the messages and callback queries."""
+        self.update_types = ['message', 'callback_query']
+
+    def pre_process(self, update, data: dict):
+        """Open the session of the update."""
+        data['db'] = get_session()
+        data['on_rollback'] = []
+
+    def post_process(self, update, data, exception):
+        """Finish the session of the update after its handlers ran."""
+        self.finish(data, exception)
+
+    def finish(self, data: dict, exception=None) -> None:
+        """Commit or roll back and close the session of an update, once."""
+        db = data.pop('db', None)
+        if db is None:
+            return
+        try:
+            if exception is None:
+                db.commit()
+            else:
+                db.rollback()
+                self._run_rollback_callbacks(data)
+        except Exception as e:
+            db.rollback()
+            self._run_rollback_callbacks(data)
+            logger.error(f"Error committing update transaction: {e}")
+        finally:
+            db.close()
+
+    @staticmethod
+    def _run_rollback_callbacks(data: dict) -> None:
+        for callback in data.get('on_rollback', []):
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Error in rollback callback: {e}")
+
+    def guard(self, middleware: BaseMiddleware) -> BaseMiddleware:
+        """Wrap a middleware that runs after this one, finishing the session if it ends the update early."""
+        return _SessionGuard(self, middleware)
+
+
+class _SessionGuard(BaseMiddleware):
+    def __init__(self, sessions: DatabaseSessionMiddleware, middleware: BaseMiddleware) -> None:
+        if getattr(middleware, 'update_sensitive', False):
+            raise ValueError("Update sensitive middlewares cannot be guarded")
+        self.sessions = sessions
+        self.middleware = middleware
+        self.update_sensitive = False
+        self.update_types = middleware.update_types
+
+    def pre_process(self, update, data: dict):
+        try:
+            result = self.middleware.pre_process(update, data)
+        except Exception as e:
+            self.sessions.finish(data, e)
+            raise
+        if isinstance(result, CancelUpdate):
+            # No handler and no post_process runs for a cancelled update
+            self.sessions.finish(data)
+        return result
+
+    def post_process(self, update, data, exception):
+        self.middleware.post_process(update, data, exception)
@@ -1,9 +1,11 @@
 import logging
+from datetime import datetime
 
 from telebot.handler_backends import BaseMiddleware
 from telebot.types import CallbackQuery, Message
 
-from telegram_llm_chatbot.db import crud
+from telegram_llm_chatbot.api.common import user_registry
+from telegram_llm_chatbot.db.log_writer import log_writer
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -13,19 +15,25 @@ class UserMessageMiddleware(BaseMiddleware):
         self.update_types = ['message']
 
     def pre_process(self, message: Message, data: dict):
-        user = crud.upsert_user(
+        # The registry may hold a write of a transaction that is rolled back later
+        data.setdefault('on_rollback', []).append(lambda: user_registry.invalidate(message.from_user.id))
+        # Only writes to the database for new users and changed usernames
+        user = user_registry.sync(
             user_id=message.from_user.id,
-            name=message.from_user.username
-        )
-        crud.write_log(
-            user_id=user.id,
-            content=message.text
+            name=message.from_user.username,
+            db=data.get('db')
         )
         logger.info(f"User: '{message.from_user.username}', message: '{message.text}'")
         data['user'] = user
+        data['received_at'] = datetime.now()
 
     def post_process(self, message, data, exception):
-        pass
+        # Queued only now, after the update transaction that may have created the user was committed
+        log_writer.submit(
+            user_id=message.from_user.id,
+            content=message.text,
+            timestamp=data.get('received_at')
+        )
 
 
 class UserCallbackMiddleware(BaseMiddleware):
@@ -33,16 +41,22 @@ class UserCallbackMiddleware(BaseMiddleware):
         self.update_types = ['callback_query']
 
     def pre_process(self, callback_query: CallbackQuery, data: dict):
-        user = crud.upsert_user(
+        # The registry may hold a write of a transaction that is rolled back later
+        data.setdefault('on_rollback', []).append(lambda: user_registry.invalidate(callback_query.from_user.id))
+        # Only writes to the database for new users and changed usernames
+        user = user_registry.sync(
             user_id=callback_query.from_user.id,
-            name=callback_query.from_user.username
-        )
-        crud.write_log(
-            user_id=user.id,
-            content=callback_query.data
+            name=callback_query.from_user.username,
+            db=data.get('db')
         )
         logger.info(f"User: '{callback_query.from_user.username}', callback_data: '{callback_query.data}'")
         data['user'] = user
+        data['received_at'] = datetime.now()
 
     def post_process(self, callback_query, data, exception):
-        pass
\ No newline at end of file
+        # Queued only now, after the update transaction that may have created the user was committed
+        log_writer.submit(
+            user_id=callback_query.from_user.id,
+            content=callback_query.data,
+            timestamp=data.get('received_at')
+        )
@@ -53,8 +53,16 @@ class ModelConfig(BaseModel):  # noqa: D101
     provider: Optional[str] = None
     max_tokens: Optional[int] = None
     chat_history_limit: int = 10
+    context_token_budget: Optional[int] = None  # Maximum tokens of chat history sent to the model
     temperature: float = 0.5
     stream: Optional[bool] = True
+    base_url: Optional[str] = None  # Override of the provider endpoint, e.g. a proxy or a local server
+    response_cache: bool = False  # Reuse responses to identical prompts, see ResponseCache
+    fallbacks: list[str] = []  # Sections of llm.yaml to fail over to, in order
+    first_token_timeout: Optional[float] = None  # Seconds a streamed attempt may take to start answering
+    stall_timeout: Optional[float] = None  # Seconds a streamed answer may pause between two chunks
+    response_timeout: Optional[float] = None  # Seconds a non-streamed attempt may take for the whole answer
+    hedge_percentile: Optional[float] = None  # Start the next fallback once the wait exceeds this TTFT percentile
 
 
 class ModelResponse(BaseModel):  # noqa: D101
@@ -0,0 +1,164 @@
+import logging
+import time
+from typing import Callable, Optional
+
+from telebot import TeleBot
+from telebot.apihelper import ApiTelegramException
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Telegram rejects messages longer than this
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+class StreamRenderer:
+    """Render a streamed reply into Telegram messages with throttled edits."""
+
+    def __init__(
+        self,
+        bot: TeleBot,
+        chat_id: int,
+        min_interval: float = 1.0,
+        min_delta: int = 40,
+        max_length: int = TELEGRAM_MESSAGE_LIMIT,
+        max_retries: int = 3,
+        clean: Optional[Callable[[str], str]] = None,
+    ):
+        """
+        Initialize the StreamRenderer.
+
+        Args:
+            bot (TeleBot): The bot used to send and edit the messages.
+            chat_id (int): The chat to send the reply to.
+            min_interval (float): Minimum number of seconds between two edits of the reply.
+            min_delta (int): Minimum number of new characters before the reply is edited again.
+            max_length (int): Length at which the reply continues in a new message.
+            max_retries (int): Number of attempts of the final edits when Telegram asks to retry later.
+            clean (Optional[Callable[[str], str]]): Applied to the text before it is shown.
+        """
+        self.bot = bot
+        self.chat_id = chat_id
+        self.min_interval = min_interval
+        self.min_delta = min_delta
+        self.max_length = max_length
+        self.max_retries = max_retries
+        self.clean = clean or (lambda text: text)
+        self._parts: list[str] = []
+        self._pending_chars = 0
+        self._next_edit_at = 0.0
+        # Telegram message IDs of the reply, where each one starts in the shown text and what it shows
+        self._message_ids: list[int] = []
+        self._offsets: list[int] = []
+        self._shown: list[str] = []
+        self.edits = 0
+        self.rate_limited = 0
+
+    @property
+    def text(self) -> str:
+        """The raw text received so far."""
+        return "".join(self._parts)
+
+    def start(self, placeholder: str = "...") -> None:
+        """Send the placeholder message that the reply is written into."""
+        # Without a placeholder, e.g. when rate-limited, the reply is sent as a new message later
+        if self._send(placeholder, 0) is None:
+            self._next_edit_at = time.monotonic() + self.min_interval
+
+    def show_status(self, status: str) -> None:
+        """Show a status, e.g. the position in the queue, in the placeholder until the reply arrives."""
+        if not self._message_ids:
+            self.start(status)
+        elif not self._parts:
+            self._edit(0, status)
+
+    def feed(self, piece: str) -> None:
+        """Add a piece of the reply and edit the messages if enough time passed and enough text arrived."""
+        if not piece:
+            return
+        self._parts.append(piece)
+        self._pending_chars += len(piece)
+        if self._pending_chars >= self.min_delta and time.monotonic() >= self._next_edit_at:
+            self.flush()
+
+    def finish(self) -> None:
+        """Show the complete reply, waiting out rate limits if needed."""
+        for _ in range(self.max_retries):
+            retry_after = self.flush()
+            if retry_after is None:
+                return
+            time.sleep(retry_after)
+        logger.error(f"Gave up rendering the reply in chat {self.chat_id} after {self.max_retries} attempts")
+
+    def flush(self) -> Optional[float]:
+        """
+        Bring the messages up to date with the text received so far.
+
+        Returns:
+            Optional[float]: The seconds to wait if Telegram rate-limited the messages, otherwise None.
+        """
+        text = self.clean(self.text)
+        self._pending_chars = 0
+        self._next_edit_at = time.monotonic() + self.min_interval
+
+        start = self._offsets[-1] if self._offsets else 0
+        while start < len(text):
+            segment = text[start:]
+            if len(segment) > self.max_length:
+                segment = segment[: self._split_point(segment)]
+            if self._offsets and self._offsets[-1] == start:
+                retry_after = self._edit(len(self._message_ids) - 1, segment)
+                if retry_after is not None:
+                    return retry_after
+            elif segment.strip():
+                # Without a placeholder, or continuing the reply, the segment goes into a new message
+                retry_after = self._send(segment, start)
+                if retry_after is not None:
+                    return retry_after
+            start += len(segment)
+        return None
+
+    def _send(self, text: str, offset: int) -> Optional[float]:
+        """Send a new message of the reply that shows the text from ``offset`` on."""
+        try:
+            message = self.bot.send_message(self.chat_id, text)
+        except ApiTelegramException as e:
+            if e.error_code == 429:
+                return self._rate_limited(e)
+            logger.error(f"Failed to send message: {e}")
+            return None
+        self._message_ids.append(message.message_id)
+        self._offsets.append(offset)
+        self._shown.append(text)
+        return None
+
+    def _split_point(self, segment: str) -> int:
+        """Return where to cut a segment that is too long, preferring a line break or a space."""
+        for separator in ("\n", " "):
+            cut = segment.rfind(separator, self.max_length // 2, self.max_length)
+            if cut > 0:
+                return cut + 1
+        return self.max_length
+
+    def _edit(self, index: int, segment: str) -> Optional[float]:
+        """Edit one message of the reply unless it already shows the segment."""
+        if not segment.strip() or segment == self._shown[index]:
+            return None
+        try:
+            self.bot.edit_message_text(segment, chat_id=self.chat_id, message_id=self._message_ids[index])
+        except ApiTelegramException as e:
+            if e.error_code == 429:
+                return self._rate_limited(e)
+            if "message is not modified" not in e.description:
+                logger.error(f"Failed to edit message: {e}")
+            return None
+        self._shown[index] = segment
+        self.edits += 1
+        return None
+
+    def _rate_limited(self, e: ApiTelegramException) -> float:
+        """Count a 429 response and hold further edits for the time Telegram asked for."""
+        self.rate_limited += 1
+        retry_after = float(e.result_json.get("parameters", {}).get("retry_after", self.min_interval))
+        self._next_edit_at = time.monotonic() + retry_after
+        return retry_after
@@ -0,0 +1,100 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after a time-to-live."""
+
+    def __init__(
+        self, maxsize: int, ttl: float, max_bytes: Optional[int] = None, sizeof: Optional[Callable[[Any], int]] = None
+    ):
+        """
+        Initialize the TTLCache.
+
+        Args:
+            maxsize (int): Maximum number of entries, the least recently used are evicted first.
+            ttl (float): Number of seconds an entry stays valid after it was stored.
+            max_bytes (Optional[int]): Maximum total size of the values, least recently used are evicted first.
+            sizeof (Optional[Callable[[Any], int]]): Returns the size of a value, defaults to ``sys.getsizeof``.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or sys.getsizeof
+        self._data: OrderedDict[Hashable, tuple[float, Any, int]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        """Return the cached value for ``key``, or ``default`` if it is absent or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value, _ = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store ``value`` under ``key``, evicting the least recently used entries if full."""
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        with self._lock:
+            if self.max_bytes is not None and size > self.max_bytes:
+                # Larger than the whole cache, keeping it would evict everything else
+                self._remove(key)
+                return
+            self._remove(key)
+            self._data[key] = (time.monotonic() + self.ttl, value, size)
+            self.bytes += size
+            while len(self._data) > self.maxsize or (self.max_bytes is not None and self.bytes > self.max_bytes):
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        """Remove ``key`` from the cache if present."""
+        with self._lock:
+            self._remove(key)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def _remove(self, key: Hashable) -> None:
+        """Remove ``key`` and its size, the lock must be held."""
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+    def __len__(self) -> int:  # noqa: D105
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """Return the size of the cache and its hit, miss and eviction counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+            if self.max_bytes is not None:
+                stats["bytes"] = self.bytes
+                stats["max_bytes"] = self.max_bytes
+            return stats
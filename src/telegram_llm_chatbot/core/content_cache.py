@@ -0,0 +1,136 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ContentCache:
+    """Size-bounded LRU cache on local disk for content derived from files, e.g. extracted text."""
+
+    def __init__(self, directory: str, max_bytes: int = 200_000_000):
+        """
+        Initialize the ContentCache and index the entries already on disk.
+
+        Args:
+            directory (str): The directory the entries are stored in, one file per entry.
+            max_bytes (int): Maximum total size of the entries, least recently used are evicted first.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._index: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(directory, exist_ok=True)
+        # Recency survives restarts through the access times set on every hit
+        entries = []
+        for entry in os.scandir(directory):
+            if entry.is_file() and not entry.name.startswith("."):
+                stat = entry.stat()
+                entries.append((stat.st_atime, entry.name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._index[name] = size
+            self.bytes += size
+        with self._lock:
+            self._evict()
+
+    @staticmethod
+    def key(kind: str, file_unique_id: Optional[str] = None, data: Optional[bytes] = None) -> str:
+        """
+        Return the cache key of a file's content.
+
+        Args:
+            kind (str): What is cached, including any settings the content depends on.
+            file_unique_id (Optional[str]): Telegram's ID of the file, the same for every bot and user.
+            data (Optional[bytes]): The file itself, hashed if there is no ``file_unique_id``.
+        """
+        if file_unique_id:
+            source = f"id:{file_unique_id}"
+        elif data is not None:
+            source = f"sha256:{hashlib.sha256(data).hexdigest()}"
+        else:
+            raise ValueError("Either file_unique_id or data is required")
+        return hashlib.sha256(f"{kind}|{source}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the cached content for ``key``, or None if it is absent."""
+        with self._lock:
+            if key not in self._index:
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+        path = os.path.join(self.directory, key)
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+            os.utime(path)
+        except OSError:
+            # Removed behind our back, e.g. by an eviction in another thread
+            with self._lock:
+                self._forget(key)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def set(self, key: str, data: bytes) -> None:
+        """Store ``data`` under ``key``, evicting the least recently used entries if full."""
+        if len(data) > self.max_bytes:
+            return
+        # Written under a temporary name first, so readers never see a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=".")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(temp_path, os.path.join(self.directory, key))
+        except OSError as e:
+            logger.error(f"Failed to write content cache entry {key}: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        with self._lock:
+            self._forget(key)
+            self._index[key] = len(data)
+            self.bytes += len(data)
+            self._evict()
+
+    def _forget(self, key: str) -> None:
+        """Remove ``key`` from the index, the lock must be held."""
+        size = self._index.pop(key, None)
+        if size is not None:
+            self.bytes -= size
+
+    def _evict(self) -> None:
+        """Delete least recently used entries until the cache fits, the lock must be held."""
+        while self.bytes > self.max_bytes and self._index:
+            key = next(iter(self._index))
+            self._forget(key)
+            self.evictions += 1
+            try:
+                os.remove(os.path.join(self.directory, key))
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        """Return the size of the cache and its hit, miss and eviction counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._index),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,60 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from telegram_llm_chatbot.core.cache import MISSING, TTLCache
+from telegram_llm_chatbot.db import crud
+
+
+class EntitlementCache:
+    """Cache of the time until which each user holds an active subscription."""
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 300):
+        """
+        Initialize the EntitlementCache.
+
+        Args:
+            maxsize (int): Maximum number of cached users.
+            ttl (float): Number of seconds an answer is reused before the database is asked again.
+        """
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def active_until(self, user_id: int, db: Optional[Session] = None) -> Optional[datetime]:
+        """
+        Return the end of the user's current entitlement, or None if the user has none.
+
+        Only running entitlements are cached. Users without one, and cached entitlements
+        that have ended in the meantime, are looked up again, so a new payment is never
+        hidden behind a stale negative answer.
+
+        Args:
+            user_id (int): The ID of the user.
+            db (Optional[Session]): An open session used on a cache miss.
+        """
+        active_until = self._cache.get(user_id)
+        if active_until is not MISSING and active_until > datetime.now():
+            return active_until
+
+        active_until = crud.get_active_subscription_end_date(user_id, db=db)
+        if active_until is not None:
+            self._cache.set(user_id, active_until)
+        else:
+            self._cache.invalidate(user_id)
+        return active_until
+
+    def is_entitled(self, user_id: int, db: Optional[Session] = None) -> bool:
+        """Check whether the user has a subscription that has not ended yet."""
+        return self.active_until(user_id, db=db) is not None
+
+    def invalidate(self, user_id: int) -> None:
+        """Forget the cached answer for one user, e.g. after a payment."""
+        self._cache.invalidate(user_id)
+
+    def clear(self) -> None:
+        """Forget all cached answers, e.g. after subscription plans were changed."""
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        """Return the cache hit and miss counters."""
+        return self._cache.stats()
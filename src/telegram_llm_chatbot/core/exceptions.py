@@ -73,3 +73,28 @@ class PDFFileReadingException(Exception):
 
     def __init__(self, message="Error reading the PDF file"):  # noqa: D107
         super().__init__(message)
+
+
+class LLMQueueFullException(Exception):
+    """
+    Exception raised when too many language model calls are waiting for their limits.
+
+    Attributes:
+        message (str): Detailed message for the exception.
+    """
+
+    def __init__(self, max_queue_size: int = 200):  # noqa: D107
+        message = f"The language model queue is full, {max_queue_size} calls are waiting"
+        super().__init__(message)
+
+
+class LLMCallCancelledException(Exception):
+    """
+    Exception raised when a language model call is cancelled while it waits in the queue.
+
+    Attributes:
+        message (str): Detailed message for the exception.
+    """
+
+    def __init__(self, message="The language model call was cancelled while it was queued"):  # noqa: D107
+        super().__init__(message)
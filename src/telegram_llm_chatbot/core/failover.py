@@ -0,0 +1,285 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import AbstractContextManager, nullcontext
+from typing import Any, Callable, Iterator, Optional
+
+from telegram_llm_chatbot.api.schemas import ModelConfig
+from telegram_llm_chatbot.core.exceptions import LLMCallCancelledException, LLMQueueFullException
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Recent errors above this rate move a provider to the end of the chain
+MAX_ERROR_RATE = 0.5
+
+
+def target_name(config: ModelConfig) -> str:
+    """Name a provider and model for the statistics."""
+    return f"{config.provider}/{config.model_name}"
+
+
+class ProviderStats:
+    """Rolling time-to-first-token and error statistics per provider and model."""
+
+    def __init__(self, window: int = 100, min_samples: int = 10):
+        """
+        Initialize the ProviderStats.
+
+        Args:
+            window (int): Number of most recent calls kept per provider and model.
+            min_samples (int): Number of calls needed before percentiles and error rates are used.
+        """
+        self.window = window
+        self.min_samples = min_samples
+        self._ttfts: dict[str, deque] = {}
+        self._outcomes: dict[str, deque] = {}
+        self._counts: dict[str, dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def _record(self, name: str, ok: bool, counter: str, ttft: Optional[float] = None) -> None:
+        with self._lock:
+            self._outcomes.setdefault(name, deque(maxlen=self.window)).append(ok)
+            counts = self._counts.setdefault(name, {"calls": 0, "errors": 0, "timeouts": 0, "hedges": 0})
+            counts["calls"] += 1
+            if counter:
+                counts[counter] += 1
+            if ttft is not None:
+                self._ttfts.setdefault(name, deque(maxlen=self.window)).append(ttft)
+
+    def record_success(self, name: str, ttft: float) -> None:
+        """Record a call that delivered its first token after ``ttft`` seconds."""
+        self._record(name, True, "", ttft)
+
+    def record_error(self, name: str, timeout: bool = False) -> None:
+        """Record a call that failed or missed its deadline."""
+        self._record(name, False, "timeouts" if timeout else "errors")
+
+    def record_hedge(self, name: str) -> None:
+        """Record that a hedged request was sent to this provider and model."""
+        with self._lock:
+            self._counts.setdefault(name, {"calls": 0, "errors": 0, "timeouts": 0, "hedges": 0})["hedges"] += 1
+
+    def ttft_percentile(self, name: str, percentile: float) -> Optional[float]:
+        """Return a percentile of the recent times to first token, or None with too few samples."""
+        with self._lock:
+            samples = sorted(self._ttfts.get(name, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(int(percentile * len(samples)), len(samples) - 1)]
+
+    def error_rate(self, name: str) -> float:
+        """Return the share of recent calls that failed, 0 with too few samples."""
+        with self._lock:
+            outcomes = list(self._outcomes.get(name, ()))
+        if len(outcomes) < self.min_samples:
+            return 0.0
+        return outcomes.count(False) / len(outcomes)
+
+    def clear(self) -> None:
+        """Forget all samples and counters."""
+        with self._lock:
+            self._ttfts.clear()
+            self._outcomes.clear()
+            self._counts.clear()
+
+    def stats(self) -> dict:
+        """Return the counters, the error rate and the median and p95 TTFT in ms per provider and model."""
+        with self._lock:
+            counts = {name: dict(counts) for name, counts in self._counts.items()}
+        result = {}
+        for name, name_counts in counts.items():
+            median, p95 = self.ttft_percentile(name, 0.5), self.ttft_percentile(name, 0.95)
+            result[name] = {
+                **name_counts,
+                "error_rate": round(self.error_rate(name), 4),
+                "ttft_p50_ms": round(1000 * median, 1) if median is not None else None,
+                "ttft_p95_ms": round(1000 * p95, 1) if p95 is not None else None,
+            }
+        return result
+
+
+provider_stats = ProviderStats()
+
+
+class _Attempt:
+    """One call to a provider, run in a background thread that hands its items over through a queue."""
+
+    def __init__(
+        self,
+        config: ModelConfig,
+        call: Callable[[ModelConfig], Iterator[Any]],
+        events: queue.Queue,
+        slot: Optional[Callable[[ModelConfig], AbstractContextManager]] = None,
+    ):
+        self.config = config
+        self.name = target_name(config)
+        # Set once the attempt holds its slot, the deadlines count from then on
+        self.started_at: Optional[float] = None
+        self.first_item_at: Optional[float] = None
+        self.cancelled = threading.Event()
+        self._call = call
+        self._events = events
+        self._slot = slot
+        threading.Thread(target=self._run, name=f"llm-{self.name}", daemon=True).start()
+
+    def _run(self) -> None:
+        try:
+            slot = self._slot(self.config, cancelled=self.cancelled) if self._slot is not None else nullcontext()
+            with slot:
+                # An attempt that lost while it waited for its slot gives the slot back right away
+                if self.cancelled.is_set():
+                    return
+                self.started_at = time.monotonic()
+                self._events.put((self, "started", None))
+                items = self._call(self.config)
+                try:
+                    for item in items:
+                        if self.cancelled.is_set():
+                            return
+                        self._events.put((self, "item", item))
+                finally:
+                    close = getattr(items, "close", None)
+                    if close is not None:
+                        close()
+            self._events.put((self, "done", None))
+        except LLMCallCancelledException:
+            # The attempt lost while it waited in the queue, nobody waits for its events
+            return
+        except Exception as e:
+            self._events.put((self, "error", e))
+
+
+def run_with_failover(
+    chain: list[ModelConfig],
+    call: Callable[[ModelConfig], Iterator[Any]],
+    first_token_timeout: Optional[float] = None,
+    hedge_percentile: Optional[float] = None,
+    stats: ProviderStats = provider_stats,
+    stall_timeout: Optional[float] = None,
+    on_answer: Optional[Callable[[ModelConfig], None]] = None,
+    slot: Optional[Callable[[ModelConfig], AbstractContextManager]] = None,
+) -> Iterator[Any]:
+    """
+    Yield the items of the first provider in the chain that starts answering in time.
+
+    Providers are tried in order, with the ones that recently failed often moved to the end.
+    An attempt fails over to the next provider when it raises or when its first item does not
+    arrive within ``first_token_timeout`` seconds. With ``hedge_percentile`` set, the next
+    provider is also started while the current one is still pending once its wait exceeds
+    that percentile of its recent times to first token; the first one to answer wins. Once an
+    item was yielded the answer is committed to that provider, and ``stall_timeout`` bounds
+    the wait for each of its following items.
+
+    For calls that return the whole answer as a single item, ``first_token_timeout`` is the
+    deadline of the complete call.
+
+    With ``slot`` set, every attempt, including fallbacks and hedges, holds a slot of its own
+    provider for as long as it runs. Deadlines and hedging count from the time it got the slot.
+
+    Args:
+        chain (list[ModelConfig]): The configured model followed by its fallbacks.
+        call (Callable[[ModelConfig], Iterator[Any]]): Starts a call and returns its chunks.
+        first_token_timeout (Optional[float]): Deadline of each attempt for its first item.
+        hedge_percentile (Optional[float]): Percentile of the time to first token that triggers a hedge.
+        stats (ProviderStats): The statistics to record into and to order the chain by.
+        stall_timeout (Optional[float]): Deadline of the winning attempt for each item after the first.
+        on_answer (Optional[Callable[[ModelConfig], None]]): Called with the configuration of the
+            provider that answers, before its first item is yielded.
+        slot (Optional[Callable[[ModelConfig], AbstractContextManager]]): Returns the slot a call to
+            a provider holds, e.g. of the ``LLMScheduler``. It is also passed the ``cancelled`` event
+            of the attempt, so a cancelled attempt leaves the queue without waiting for its turn.
+
+    Raises:
+        TimeoutError: The winning provider stopped sending items for ``stall_timeout`` seconds.
+        Exception: The error of the last attempt if all providers failed.
+    """
+    candidates = deque(sorted(chain, key=lambda config: stats.error_rate(target_name(config)) > MAX_ERROR_RATE))
+    events: queue.Queue = queue.Queue()
+    active: list[_Attempt] = []
+    last_error: Exception = RuntimeError("No model configured")
+    hedge_at: Optional[float] = None
+
+    def start_next(hedge: bool = False) -> None:
+        nonlocal hedge_at
+        attempt = _Attempt(candidates.popleft(), call, events, slot)
+        active.append(attempt)
+        if hedge:
+            stats.record_hedge(attempt.name)
+            logger.info(f"Hedging with {attempt.name}")
+        # The next hedge is planned once this attempt started
+        hedge_at = None
+
+    start_next()
+    winner: Optional[_Attempt] = None
+    first_event = None
+    while winner is None:
+        if not active:
+            if not candidates:
+                raise last_error
+            start_next()
+
+        now = time.monotonic()
+        wake_ups = [hedge_at] if hedge_at is not None else []
+        if first_token_timeout is not None:
+            wake_ups += [attempt.started_at + first_token_timeout for attempt in active if attempt.started_at]
+        try:
+            attempt, kind, payload = events.get(timeout=max(min(wake_ups) - now, 0) if wake_ups else None)
+        except queue.Empty:
+            now = time.monotonic()
+            for attempt in list(active):
+                if attempt.started_at is None:
+                    continue  # still waiting for its slot
+                if first_token_timeout is not None and now >= attempt.started_at + first_token_timeout:
+                    logger.warning(f"{attempt.name} did not answer within {first_token_timeout}s, failing over")
+                    stats.record_error(attempt.name, timeout=True)
+                    attempt.cancelled.set()
+                    active.remove(attempt)
+                    last_error = TimeoutError(f"{attempt.name} did not answer within {first_token_timeout}s")
+            if hedge_at is not None and now >= hedge_at and candidates:
+                start_next(hedge=True)
+            continue
+
+        if attempt not in active:
+            continue  # a cancelled attempt
+        if kind == "started":
+            if attempt is active[-1] and hedge_percentile is not None and candidates:
+                threshold = stats.ttft_percentile(attempt.name, hedge_percentile)
+                if threshold is not None:
+                    hedge_at = attempt.started_at + threshold
+            continue
+        if kind == "error":
+            logger.warning(f"{attempt.name} failed, failing over: {payload}")
+            # A full queue says nothing about the health of the provider
+            if not isinstance(payload, LLMQueueFullException):
+                stats.record_error(attempt.name)
+            active.remove(attempt)
+            last_error = payload
+            continue
+        winner, first_event = attempt, (kind, payload)
+
+    winner.first_item_at = time.monotonic()
+    stats.record_success(winner.name, winner.first_item_at - winner.started_at)
+    for attempt in active:
+        if attempt is not winner:
+            attempt.cancelled.set()
+    if on_answer is not None:
+        on_answer(winner.config)
+
+    kind, payload = first_event
+    try:
+        while kind == "item":
+            yield payload
+            while True:
+                try:
+                    attempt, kind, payload = events.get(timeout=stall_timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"{winner.name} stopped answering for {stall_timeout}s") from None
+                if attempt is winner:
+                    break
+        if kind == "error":
+            raise payload
+    finally:
+        winner.cancelled.set()
@@ -1,12 +1,14 @@
-import base64
-import io
+import logging
+import multiprocessing
 import os
-from typing import Set
+import time
+from typing import Iterator, Optional, Set
 
 import docx
 from docx.oxml.table import CT_Tbl
 from docx.oxml.text.paragraph import CT_P
-from PIL import Image
+from docx.table import Table
+from docx.text.paragraph import Paragraph
 from PyPDF2 import PdfReader
 
 from telegram_llm_chatbot.core.exceptions import (
@@ -18,13 +20,71 @@ from telegram_llm_chatbot.core.exceptions import (
     WordFileReadingException,
 )
 
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def iter_pdf_pages(pdf: PdfReader, start: int = 0, stop: Optional[int] = None) -> Iterator[str]:
+    """Yield the text of the pages of a PDF one at a time, so callers can stop early."""
+    stop = len(pdf.pages) if stop is None else min(stop, len(pdf.pages))
+    for page_number in range(start, stop):
+        yield pdf.pages[page_number].extract_text() or ""
+
+
+def extract_pdf_pages(
+    file_path: str, start: int = 0, stop: Optional[int] = None, max_chars: Optional[int] = None
+) -> list[str]:
+    """
+    Extract the text of a range of pages of a PDF until ``max_chars`` characters were collected.
+
+    Args:
+        file_path (str): The path of the PDF.
+        start (int): The first page, counted from 0.
+        stop (Optional[int]): The page after the last one, defaults to the end of the document.
+        max_chars (Optional[int]): Stop once this many characters were collected.
+
+    Returns:
+        list[str]: The text of each extracted page.
+    """
+    pages = []
+    length = 0
+    for text in iter_pdf_pages(PdfReader(file_path), start, stop):
+        pages.append(text)
+        length += len(text) + 1
+        if max_chars is not None and length >= max_chars:
+            break
+    return pages
+
 
 class TextFileParser:
     """Class to parse and extract content from uploaded files."""
 
-    def __init__(self, max_file_size_mb: int, allowed_file_types: Set[str]):
-        """Initialize the TextFileParser."""
+    def __init__(
+        self,
+        max_file_size_mb: int,
+        allowed_file_types: Set[str],
+        max_pdf_pages: Optional[int] = None,
+        pdf_workers: int = 0,
+        pdf_parallel_min_pages: int = 100,
+        pdf_timeout: Optional[float] = None,
+    ):
+        """
+        Initialize the TextFileParser.
+
+        Args:
+            max_file_size_mb (int): Files larger than this are rejected.
+            allowed_file_types (Set[str]): The accepted file extensions.
+            max_pdf_pages (Optional[int]): Only the first pages of longer PDFs are extracted.
+            pdf_workers (int): Processes that extract page ranges of long PDFs in parallel, 0 or 1 to disable.
+            pdf_parallel_min_pages (int): Minimum number of extracted pages for the parallel extraction.
+            pdf_timeout (Optional[float]): Seconds after which the extraction of a PDF is given up, checked
+                between pages in the handler thread and enforced by terminating the parallel workers.
+        """
         self.max_file_size_mb = max_file_size_mb
+        self.max_pdf_pages = max_pdf_pages
+        self.pdf_workers = pdf_workers
+        self.pdf_parallel_min_pages = pdf_parallel_min_pages
+        self.pdf_timeout = pdf_timeout
         self.handlers = {
             "txt": self.extract_txt_content,
             "doc": self.extract_word_content,
@@ -33,7 +93,7 @@ class TextFileParser:
         }
         self.allowed_file_types = allowed_file_types
 
-    def extract_txt_content(self, file_path: str) -> str:
+    def extract_txt_content(self, file_path: str, max_chars: Optional[int] = None) -> str:
         """Extract content from a text file.
 
         Returns:
@@ -45,17 +105,18 @@ class TextFileParser:
         """
         try:
             with open(file_path, encoding="utf-8") as file:
-                return file.read()
+                return file.read(max_chars if max_chars is not None else -1)
         except UnicodeDecodeError as e:
             raise TextFileDecodingException() from e
         except Exception as e:
             raise UnexpectedFileReadingException() from e
 
-    def extract_word_content(self, file_path: str) -> str:
+    def extract_word_content(self, file_path: str, max_chars: Optional[int] = None) -> str:
         """Extract content from a Word document.
 
-        Extract the text content from paragraphs and
-        tables in the Word document while preserving the order of elements.
+        Extract the text content from paragraphs and tables in the Word document while
+        preserving the order of elements. The body is walked once, wrapping each element
+        directly, and the walk stops as soon as ``max_chars`` characters were collected.
 
         Returns:
             The content of the Word document.
@@ -65,52 +126,106 @@ class TextFileParser:
         try:
             doc = docx.Document(file_path)
             content = []
+            length = 0
+
+            for element in doc.element.body.iterchildren():
+                if max_chars is not None and length >= max_chars:
+                    break
 
-            for element in doc.element.body:
-                # Check if the element is a paragraph (CT_P)
                 if isinstance(element, CT_P):
-                    for para in doc.paragraphs:
-                        if para._element == element:
-                            paragraph_text = para.text.strip()
-                            if paragraph_text:
-                                content.append(paragraph_text)
-                            break
+                    paragraph_text = Paragraph(element, doc).text.strip()
+                    if paragraph_text:
+                        content.append(paragraph_text)
+                        length += len(paragraph_text) + 1
 
-                # Check if the element is a table (CT_Tbl)
                 elif isinstance(element, CT_Tbl):
-                    for table in doc.tables:
-                        if table._element == element:
-                            for row in table.rows:
-                                row_text = "\t".join(cell.text.strip() for cell in row.cells)
-                                content.append(row_text)
-                            content.append("")
+                    for row in Table(element, doc).rows:
+                        row_text = "\t".join(cell.text.strip() for cell in row.cells)
+                        content.append(row_text)
+                        length += len(row_text) + 1
+                        if max_chars is not None and length >= max_chars:
                             break
+                    content.append("")
 
-            return "\n".join(content)
+            text = "\n".join(content)
+            return text[:max_chars] if max_chars is not None else text
         except Exception as e:
             raise WordFileReadingException() from e
 
-    def extract_pdf_content(self, file_path: str) -> str:
+    def extract_pdf_content(self, file_path: str, max_chars: Optional[int] = None) -> str:
         """Extract content from a PDF file.
 
+        Pages are extracted one at a time until ``max_chars`` characters were collected or
+        ``max_pdf_pages`` pages were read. Long documents are split into page ranges that
+        worker processes extract in parallel if ``pdf_workers`` is set; all other documents are
+        extracted in the calling thread, where ``pdf_timeout`` is checked between pages. Spawning
+        a worker costs far more than extracting a short document.
+
         Returns:
             The content of the PDF file.
 
         Raises:
-            PDFFileReadingException: Error reading the PDF file.
+            PDFFileReadingException: Error reading the PDF file, or it took longer than ``pdf_timeout``.
         """
         try:
             pdf = PdfReader(file_path)
-            content = ""
-            for page in pdf.pages:
-                content += page.extract_text()
-            return content
+            page_count = len(pdf.pages)
+            if self.max_pdf_pages is not None:
+                page_count = min(page_count, self.max_pdf_pages)
+
+            if self.pdf_workers > 1 and page_count >= self.pdf_parallel_min_pages:
+                pages = self._extract_pdf_parallel(file_path, page_count, max_chars)
+            else:
+                deadline = time.monotonic() + self.pdf_timeout if self.pdf_timeout else None
+                pages = []
+                length = 0
+                for text in iter_pdf_pages(pdf, stop=page_count):
+                    if deadline is not None and time.monotonic() > deadline:
+                        raise TimeoutError(f"Extracting {file_path} took longer than {self.pdf_timeout} seconds")
+                    pages.append(text)
+                    length += len(text) + 1
+                    if max_chars is not None and length >= max_chars:
+                        break
+
+            content = "\n".join(pages)
+            return content[:max_chars] if max_chars is not None else content
         except Exception as e:
             raise PDFFileReadingException() from e
 
-    def extract_content(self, file_path: str) -> str:
+    def _extract_pdf_parallel(self, file_path: str, page_count: int, max_chars: Optional[int]) -> list[str]:
+        """Extract page ranges in worker processes and collect them in order until the budget is met."""
+        range_size = -(-page_count // self.pdf_workers)
+        ranges = [(start, min(start + range_size, page_count)) for start in range(0, page_count, range_size)]
+        deadline = time.monotonic() + self.pdf_timeout if self.pdf_timeout else None
+
+        # Spawned rather than forked, the bot process runs many threads. Leaving the block
+        # terminates the workers, including those whose pages are no longer needed.
+        with multiprocessing.get_context("spawn").Pool(min(self.pdf_workers, len(ranges))) as pool:
+            results = [
+                pool.apply_async(extract_pdf_pages, (file_path, start, stop, max_chars)) for start, stop in ranges
+            ]
+            pages = []
+            length = 0
+            for result in results:
+                timeout = max(deadline - time.monotonic(), 0) if deadline is not None else None
+                try:
+                    range_pages = result.get(timeout)
+                except multiprocessing.TimeoutError:
+                    raise TimeoutError(f"Extracting {file_path} took longer than {self.pdf_timeout} seconds") from None
+                pages.extend(range_pages)
+                length += sum(len(text) + 1 for text in range_pages)
+                if max_chars is not None and length >= max_chars:
+                    break
+        logger.info(f"Extracted {len(pages)} of {page_count} pages of {file_path} in {len(ranges)} ranges")
+        return pages
+
+    def extract_content(self, file_path: str, max_chars: Optional[int] = None) -> str:
         """Extract content from an uploaded file based on its type.
 
+        Args:
+            file_path: The path of the file.
+            max_chars: Stop extracting once this many characters were collected.
+
         Returns:
             The content of the file.
 
@@ -127,12 +242,12 @@ class TextFileParser:
         try:
             file_extension = file_path.rsplit(".", 1)[1].lower()
         except IndexError:
-            raise UnsupportedFileTypeException("The file has no extension")  # noqa: WPS326
+            raise UnsupportedFileTypeException("The file has no extension") from None  # noqa: WPS326
 
         handler = self.handlers.get(file_extension)
         if handler:
             try:
-                return handler(file_path)
+                return handler(file_path, max_chars=max_chars)
             except UnsupportedFileTypeException as e:
                 raise e
             except TextFileDecodingException as e:
@@ -143,18 +258,3 @@ class TextFileParser:
                 raise UnexpectedFileReadingException(f"Unexpected error: {str(e)}") from e
         else:
             raise UnsupportedFileTypeException(file_extension)
-
-
-def image_to_base64(image: Image) -> str:
-    """
-    Converts a PIL Image to a base64 string.
-
-    Args:
-        image (Image): The image to convert.
-
-    Returns:
-        str: Base64 encoded string of the image.
-    """
-    buffered = io.BytesIO()
-    image.save(buffered, format="PNG")  # or any other format
-    return base64.b64encode(buffered.getvalue()).decode()
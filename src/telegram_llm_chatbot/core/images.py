@@ -0,0 +1,138 @@
+import base64
+import io
+import json
+import logging
+import threading
+from typing import NamedTuple
+
+from PIL import Image, ImageOps
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Pillow format names and the MIME types providers expect in data URLs
+IMAGE_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+class PreparedImage(NamedTuple):
+    """An image encoded for a vision request."""
+
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    original_bytes: int
+
+    @property
+    def saved_bytes(self) -> int:
+        """Bytes saved compared to the image as it was received."""
+        return self.original_bytes - len(self.data)
+
+    def data_url(self) -> str:
+        """Return the image as a base64 data URL."""
+        return f"data:{self.mime_type};base64,{base64.b64encode(self.data).decode()}"
+
+    def to_bytes(self) -> bytes:
+        """Serialize the image with its metadata, e.g. for the content cache."""
+        header = json.dumps(
+            {"mime_type": self.mime_type, "width": self.width, "height": self.height, "original_bytes": self.original_bytes}
+        )
+        return header.encode() + b"\n" + self.data
+
+    @classmethod
+    def from_bytes(cls, payload: bytes) -> "PreparedImage":
+        """Restore an image serialized with ``to_bytes``."""
+        header, data = payload.split(b"\n", 1)
+        return cls(data=data, **json.loads(header))
+
+
+class ImagePreparer:
+    """Downscale and re-encode images in memory before they are sent to a vision model."""
+
+    def __init__(self, max_edge: int = 1568, image_format: str = "JPEG", quality: int = 85):
+        """
+        Initialize the ImagePreparer.
+
+        Args:
+            max_edge (int): Maximum width and height in pixels, larger images are downscaled.
+            image_format (str): Encoding sent to the model, ``JPEG`` or ``WEBP``.
+            quality (int): Encoder quality from 1 to 100.
+        """
+        image_format = image_format.upper()
+        if image_format not in IMAGE_MIME_TYPES:
+            raise ValueError(f"Unsupported image format: {image_format}")
+        self.max_edge = max_edge
+        self.image_format = image_format
+        self.quality = quality
+        self._lock = threading.Lock()
+        self.prepared = 0
+        self.original_bytes = 0
+        self.prepared_bytes = 0
+
+    @property
+    def cache_kind(self) -> str:
+        """Name the prepared images of these settings in the content cache."""
+        return f"image:{self.image_format}:{self.max_edge}:{self.quality}"
+
+    def prepare(self, data: bytes) -> PreparedImage:
+        """
+        Decode an image, downscale it to ``max_edge`` and encode it in the configured format.
+
+        The original bytes are kept if the image is already small enough, in the target
+        format and not larger than the re-encoded version.
+
+        Args:
+            data (bytes): The image as received, in any format Pillow reads.
+
+        Returns:
+            PreparedImage: The encoded image with its MIME type and size.
+        """
+        with Image.open(io.BytesIO(data)) as source:
+            source_format = source.format
+            # Phone cameras store the rotation in EXIF, which is lost on re-encoding
+            oriented = ImageOps.exif_transpose(source)
+            resized = max(oriented.size) > self.max_edge
+            if resized:
+                oriented.thumbnail((self.max_edge, self.max_edge), Image.Resampling.LANCZOS)
+            output = oriented
+            if self.image_format == "JPEG" and oriented.mode != "RGB":
+                output = self._flatten(oriented)
+
+            buffer = io.BytesIO()
+            output.save(buffer, format=self.image_format, quality=self.quality, optimize=True)
+            encoded = buffer.getvalue()
+            width, height = output.size
+
+        if not resized and source_format == self.image_format and len(data) <= len(encoded):
+            encoded = data
+        prepared = PreparedImage(encoded, IMAGE_MIME_TYPES[self.image_format], width, height, len(data))
+
+        with self._lock:
+            self.prepared += 1
+            self.original_bytes += len(data)
+            self.prepared_bytes += len(encoded)
+        logger.info(
+            f"Prepared a {width}x{height} image: {len(data)} -> {len(encoded)} bytes, "
+            f"{prepared.saved_bytes} bytes saved"
+        )
+        return prepared
+
+    @staticmethod
+    def _flatten(image: Image.Image) -> Image.Image:
+        """Convert an image to RGB, putting transparent areas on a white background."""
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            return background
+        return image.convert("RGB")
+
+    def stats(self) -> dict:
+        """Return the number of prepared images and the bytes received, sent and saved."""
+        with self._lock:
+            return {
+                "prepared": self.prepared,
+                "original_bytes": self.original_bytes,
+                "prepared_bytes": self.prepared_bytes,
+                "saved_bytes": self.original_bytes - self.prepared_bytes,
+            }
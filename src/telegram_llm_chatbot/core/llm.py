@@ -1,42 +1,131 @@
-from typing import Optional
+import functools
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Optional, Union
 
+from hydra.utils import instantiate
+from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import AIMessage, HumanMessage
 from langchain_fireworks import ChatFireworks
 from langchain_openai import ChatOpenAI
-from PIL.Image import Image
+from omegaconf import OmegaConf
 
 from telegram_llm_chatbot.api.schemas import ModelConfig, ModelResponse
-from telegram_llm_chatbot.core.files import image_to_base64
-from telegram_llm_chatbot.db.models import Message
+from telegram_llm_chatbot.core.failover import run_with_failover
+from telegram_llm_chatbot.core.images import PreparedImage
+from telegram_llm_chatbot.core.response_cache import ResponseCache
+from telegram_llm_chatbot.core.scheduler import LLMScheduler
+from telegram_llm_chatbot.core.tokens import count_tokens
+from telegram_llm_chatbot.db.rows import ChatMessageRow
+
+logger = logging.getLogger(__name__)
 
 
 class LLM:
-    def __init__(self, config: ModelConfig):  # noqa: D107
+    # Provider clients shared by all instances and threads, so that their HTTP connection
+    # pools and keep-alive connections are reused across messages
+    _client_cache: OrderedDict[tuple, BaseChatModel] = OrderedDict()
+    _client_cache_lock = threading.Lock()
+    client_cache_size = 8
+
+    def __init__(  # noqa: D107
+        self,
+        config: ModelConfig,
+        response_cache: Optional[ResponseCache] = None,
+        fallbacks: Optional[list[ModelConfig]] = None,
+    ):
         self.config = config
         self.clients = {"openai": ChatOpenAI, "fireworksai": ChatFireworks}
+        self.response_cache = response_cache
+        self.fallbacks = fallbacks or []
+
+    @staticmethod
+    def client_key(config: ModelConfig) -> tuple:
+        """Return the configuration fields a provider client is built from."""
+        return (config.provider, config.model_name, config.max_tokens, config.temperature, config.base_url)
+
+    def get_client(self, config: ModelConfig) -> BaseChatModel:
+        """Return the cached provider client for a configuration, creating it on first use."""
+        key = self.client_key(config)
+        with self._client_cache_lock:
+            client = self._client_cache.get(key)
+            if client is not None:
+                self._client_cache.move_to_end(key)
+                return client
+
+            kwargs = {}
+            if config.base_url:
+                kwargs["base_url"] = config.base_url
+            client = self.clients[config.provider](
+                model_name=config.model_name, max_tokens=config.max_tokens, temperature=config.temperature, **kwargs
+            )
+            self._client_cache[key] = client
+            while len(self._client_cache) > self.client_cache_size:
+                self._client_cache.popitem(last=False)
+            return client
+
+    @classmethod
+    def evict_client(cls, config: ModelConfig) -> None:
+        """Drop the cached client of a configuration that is no longer used."""
+        with cls._client_cache_lock:
+            cls._client_cache.pop(cls.client_key(config), None)
+
+    @classmethod
+    def clear_clients(cls) -> None:
+        """Drop all cached clients."""
+        with cls._client_cache_lock:
+            cls._client_cache.clear()
 
     def update_config(self, config: ModelConfig) -> None:
         """Update the model configuration"""
-        for attr in ["provider", "model_name", "max_tokens", "chat_history_limit", "temperature", "stream"]:
+        old_config = self.config.model_copy()
+        for attr in [
+            "provider",
+            "model_name",
+            "max_tokens",
+            "chat_history_limit",
+            "context_token_budget",
+            "temperature",
+            "stream",
+            "base_url",
+            "response_cache",
+        ]:
             if getattr(config, attr) is not None:
                 self.config.__setattr__(attr, getattr(config, attr))
+        if self.client_key(old_config) != self.client_key(self.config):
+            self.evict_client(old_config)
 
     def run(
-        self, chat_history: list[Message], config: Optional[ModelConfig] = None, image: Optional[Image] = None
+        self,
+        chat_history: list[ChatMessageRow],
+        config: Optional[ModelConfig] = None,
+        image: Optional[PreparedImage] = None,
+        summary: Optional[str] = None,
+        scheduler: Optional[LLMScheduler] = None,
+        priority: Union[int, Callable[[], int]] = 0,
+        on_position: Optional[Callable[[int], None]] = None,
     ) -> ModelResponse:
-        """Run the model with the given chat history and configuration"""
+        """
+        Run the model with the given chat history and configuration, after the summary of older messages
+
+        With a scheduler, each provider that is tried, including fallbacks and hedges, waits for a
+        slot of its own; ``priority`` and ``on_position`` are passed to ``LLMScheduler.slot``.
+        """
         if config is None and self.config is not None:
             config = self.config
         else:
             raise ValueError("Model configuration is required")
 
-        provider = config.provider
-        if provider not in self.clients:
-            raise ValueError(f"Invalid provider: {provider}. Available providers: {', '.join(self.clients.keys())}")
-
-        client = self.clients[provider](
-            model_name=config.model_name, max_tokens=config.max_tokens, temperature=config.temperature
-        )
+        chain = [config, *self.fallbacks]
+        for provider in {candidate.provider for candidate in chain}:
+            if provider not in self.clients:
+                raise ValueError(
+                    f"Invalid provider: {provider}. Available providers: {', '.join(self.clients.keys())}"
+                )
 
         chat_history = chat_history[-config.chat_history_limit :]
         role_message_map = {"user": HumanMessage, "assistant": AIMessage}
@@ -47,20 +136,172 @@ class LLM:
         ]
         # messages.append(AIMessage(content=[{"type": "text", "text": self.system_prompt}]))
 
+        # Put the summary of the messages before the window into the first user turn, so that
+        # models which require alternating user and assistant turns accept the prompt
+        if summary:
+            summary_part = {"type": "text", "text": f"Summary of the earlier conversation:\n{summary}"}
+            if messages and isinstance(messages[0], HumanMessage):
+                messages[0].content.insert(0, summary_part)
+            else:
+                messages.insert(0, HumanMessage(content=[summary_part]))
+
         # Handle the image if provided
         if image:
             message = HumanMessage(content=[{"type": "text", "text": "Received the following image(s):"}])
-            image_base64 = image_to_base64(image)
-            message.content.append(
-                {
-                    "type": "image_url",
-                    "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"},
-                }
-            )
+            message.content.append({"type": "image_url", "image_url": {"url": image.data_url()}})
             messages.append(message)
 
+        # Prompts with images are not cached, they are rarely identical
+        cache_key = None
+        if config.response_cache and self.response_cache is not None and not image:
+            cache_key = self.response_cache.key(config, messages)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                if config.stream:
+                    return self.response_cache.replay(cached)
+                return ModelResponse(response_content=cached, config=config)
+
+        # Only answers of the configured model are cached, a fallback's answer would be
+        # served under the configured model's key long after the outage ended
+        answered_by: list[ModelConfig] = []
+
+        def answered_by_config() -> bool:
+            return bool(answered_by) and answered_by[0] is config
+
+        def call(candidate: ModelConfig):
+            client = self.get_client(candidate)
+            return client.stream(messages) if config.stream else iter([client.invoke(messages)])
+
+        slot = None
+        if scheduler is not None:
+            prompt_tokens = count_tokens(summary or "") + sum(count_tokens(m.content) for m in chat_history)
+            call, slot = self._schedule(call, scheduler, prompt_tokens, priority, on_position)
+
+        if config.stream:
+            stream = self._call_chain(chain, config, call, on_answer=answered_by.append, slot=slot)
+            return self.response_cache.record(cache_key, stream, keep=answered_by_config) if cache_key else stream
+        else:
+            responses = self._call_chain(chain, config, call, on_answer=answered_by.append, slot=slot)
+            response = next(responses)
+            responses.close()
+            response_content = response.content.replace("<end_of_turn>", "")
+            if cache_key and answered_by_config():
+                self.response_cache.set(cache_key, response_content)
+            return ModelResponse(response_content=response_content, config=config)
+
+    @staticmethod
+    def _schedule(
+        call,
+        scheduler: LLMScheduler,
+        prompt_tokens: int,
+        priority: Union[int, Callable[[], int]],
+        on_position: Optional[Callable[[int], None]],
+    ):
+        """
+        Return the call counting the text it receives and the scheduler slot of a call to a provider.
+
+        The slot is settled with the tokens of the prompt and of the answer of that provider.
+        """
+        if callable(priority):
+            # Looked up at most once, however many providers have to wait
+            priority = functools.cache(priority)
+        # Text received per provider, each one is tried at most once per run
+        answers: dict[int, list[str]] = {}
+
+        def counted_call(candidate: ModelConfig):
+            answer = answers.setdefault(id(candidate), [])
+            items = call(candidate)
+            try:
+                for item in items:
+                    answer.append(item.content if isinstance(item.content, str) else "")
+                    yield item
+            finally:
+                # Closing a provider stream aborts its request
+                close = getattr(items, "close", None)
+                if close is not None:
+                    close()
+
+        @contextmanager
+        def slot(candidate: ModelConfig, cancelled: Optional[threading.Event] = None):
+            estimate = prompt_tokens + (candidate.max_tokens or 0)
+            with scheduler.slot(
+                candidate, tokens=estimate, priority=priority, on_position=on_position, cancelled=cancelled
+            ) as ticket:
+                try:
+                    yield ticket
+                finally:
+                    ticket.settle(prompt_tokens + count_tokens("".join(answers.get(id(candidate), []))))
+
+        return counted_call, slot
+
+    @staticmethod
+    def _call_chain(chain: list[ModelConfig], config: ModelConfig, call, on_answer=None, slot=None):
+        """Run a call on the chain of providers with the deadlines and hedging of the configuration."""
         if config.stream:
-            return client.stream(messages)
+            first_item_timeout, stall_timeout = config.first_token_timeout, config.stall_timeout
         else:
-            response = client.invoke(messages)
-            return ModelResponse(response_content=response.content.replace("<end_of_turn>", ""), config=config)
+            # The whole answer arrives as one item
+            first_item_timeout, stall_timeout = config.response_timeout, None
+        return run_with_failover(
+            chain,
+            call,
+            first_token_timeout=first_item_timeout,
+            hedge_percentile=config.hedge_percentile,
+            stall_timeout=stall_timeout,
+            on_answer=on_answer,
+            slot=slot,
+        )
+
+
+class LLMHolder:
+    """Shared LLM built once from a section of a config file and swapped when the file changes."""
+
+    def __init__(
+        self,
+        path: str,
+        key: str = "custom",
+        check_interval: float = 5.0,
+        response_cache: Optional[ResponseCache] = None,
+    ):
+        """
+        Initialize the LLMHolder and load the configuration.
+
+        Args:
+            path (str): Path of the yaml file with the model configurations.
+            key (str): The section of the file that configures the model in use.
+            check_interval (float): Minimum number of seconds between two checks of the file's mtime.
+            response_cache (Optional[ResponseCache]): Cache used by models with ``response_cache`` enabled.
+        """
+        self.path = path
+        self.key = key
+        self.check_interval = check_interval
+        self.response_cache = response_cache
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._next_check = 0.0
+        self._llm: Optional[LLM] = None
+        self.reload()
+
+    def get(self) -> LLM:
+        """Return the current LLM, reloading it first if the file changed since the last check."""
+        if time.monotonic() >= self._next_check:
+            self._next_check = time.monotonic() + self.check_interval
+            try:
+                if os.path.getmtime(self.path) != self._mtime:
+                    self.reload()
+            except Exception as e:
+                logger.error(f"Failed to reload model configuration from {self.path}: {e}")
+        return self._llm
+
+    def reload(self) -> LLM:
+        """Load the configuration file and atomically replace the current LLM."""
+        with self._lock:
+            mtime = os.path.getmtime(self.path)
+            configs = OmegaConf.load(self.path)
+            model_config = instantiate(configs[self.key])
+            fallbacks = [instantiate(configs[name]) for name in model_config.fallbacks]
+            old_llm, self._llm, self._mtime = self._llm, LLM(model_config, self.response_cache, fallbacks), mtime
+            if old_llm is not None and LLM.client_key(old_llm.config) != LLM.client_key(model_config):
+                LLM.evict_client(old_llm.config)
+        logger.info(f"Loaded LLM model with config: {model_config.model_dump()}")
+        return self._llm
@@ -0,0 +1,41 @@
+import logging
+import threading
+from typing import Any, Callable
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_providers: dict[str, Callable[[], dict[str, Any]]] = {}
+
+
+def register_metrics(name: str, provider: Callable[[], dict[str, Any]]) -> None:
+    """
+    Register a callable that reports a group of runtime metrics.
+
+    Args:
+        name (str): The name of the metrics group, e.g. ``db_pool``.
+        provider (Callable): A function returning a flat dict of metric values.
+    """
+    with _lock:
+        _providers[name] = provider
+
+
+def collect_metrics() -> dict[str, dict[str, Any]]:
+    """
+    Collect a snapshot of all registered metrics groups.
+
+    Returns:
+        dict: Metric values keyed by group name.
+    """
+    with _lock:
+        providers = dict(_providers)
+
+    snapshot = {}
+    for name, provider in providers.items():
+        try:
+            snapshot[name] = provider()
+        except Exception as e:
+            logger.error(f"Error collecting metrics for {name}: {e}")
+            snapshot[name] = {"error": str(e)}
+    return snapshot
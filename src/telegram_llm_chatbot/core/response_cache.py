@@ -0,0 +1,71 @@
+import hashlib
+import json
+from typing import Callable, Iterator, Optional
+
+from langchain_core.messages import AIMessageChunk, BaseMessage
+
+from telegram_llm_chatbot.api.schemas import ModelConfig
+from telegram_llm_chatbot.core.cache import MISSING, TTLCache
+
+
+class ResponseCache:
+    """Exact-match cache of model responses, keyed by the model settings and the rendered prompt."""
+
+    def __init__(self, maxsize: int = 1000, ttl: float = 3600, max_bytes: int = 10_000_000, replay_chunk_size: int = 64):
+        """
+        Initialize the ResponseCache.
+
+        Args:
+            maxsize (int): Maximum number of cached responses.
+            ttl (float): Number of seconds a response is reused.
+            max_bytes (int): Maximum total size of the cached responses in bytes.
+            replay_chunk_size (int): Number of characters per chunk when a cached response is streamed.
+        """
+        self.replay_chunk_size = replay_chunk_size
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl, max_bytes=max_bytes, sizeof=lambda text: len(text.encode()))
+
+    @staticmethod
+    def key(config: ModelConfig, messages: list[BaseMessage]) -> str:
+        """Hash the settings that determine a response and the messages sent to the model."""
+        payload = [
+            config.provider,
+            config.model_name,
+            config.temperature,
+            config.max_tokens,
+            [(message.type, message.content) for message in messages],
+        ]
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response text, or None."""
+        text = self._cache.get(key)
+        return None if text is MISSING else text
+
+    def set(self, key: str, text: str) -> None:
+        """Cache a complete response text."""
+        if text:
+            self._cache.set(key, text)
+
+    def replay(self, text: str) -> Iterator[AIMessageChunk]:
+        """Stream a cached response in chunks, like the provider stream it replaces."""
+        for start in range(0, len(text), self.replay_chunk_size):
+            yield AIMessageChunk(content=text[start : start + self.replay_chunk_size])
+
+    def record(
+        self, key: str, stream: Iterator[AIMessageChunk], keep: Optional[Callable[[], bool]] = None
+    ) -> Iterator[AIMessageChunk]:
+        """Pass a provider stream through and cache its text once it completed, if ``keep`` allows."""
+        parts = []
+        for chunk in stream:
+            parts.append(chunk.content)
+            yield chunk
+        if keep is None or keep():
+            self.set(key, "".join(parts))
+
+    def clear(self) -> None:
+        """Remove all cached responses."""
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        """Return the cache hit, miss and size counters."""
+        return self._cache.stats()
@@ -0,0 +1,298 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from itertools import count
+from typing import Callable, Iterator, Optional, Union
+
+from telegram_llm_chatbot.api.schemas import ModelConfig
+from telegram_llm_chatbot.core.exceptions import LLMCallCancelledException, LLMQueueFullException
+from telegram_llm_chatbot.core.failover import target_name
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Tokens are counted over a sliding window of this many seconds
+TOKEN_WINDOW = 60.0
+# Seconds between two checks of the cancel event of a waiting call
+CANCEL_POLL_INTERVAL = 0.05
+
+
+class _Limit:
+    """Concurrency and tokens-per-minute limit of one provider or model."""
+
+    def __init__(self, concurrency: Optional[int] = None, tokens_per_minute: Optional[int] = None):
+        self.concurrency = concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.running = 0
+        # [admitted_at, tokens] of the calls in the token window, tokens are settled after the call
+        self.reservations: deque[list] = deque()
+        self.tokens = 0
+
+    def expire(self, now: float) -> None:
+        while self.reservations and self.reservations[0][0] <= now - TOKEN_WINDOW:
+            self.tokens -= self.reservations.popleft()[1]
+
+    def blocked_for(self, tokens: int, now: float) -> Optional[float]:
+        """Return None if a call fits, otherwise the seconds until it may fit (inf: until a call ends)."""
+        if self.concurrency is not None and self.running >= self.concurrency:
+            return float("inf")
+        if self.tokens_per_minute is None:
+            return None
+        self.expire(now)
+        if not self.reservations:
+            # A call larger than the whole budget still runs alone rather than never
+            return None
+        excess = self.tokens + tokens - self.tokens_per_minute
+        if excess <= 0:
+            return None
+        for admitted_at, reserved in self.reservations:
+            excess -= reserved
+            if excess <= 0:
+                return admitted_at + TOKEN_WINDOW - now
+        return float("inf")
+
+
+class _Waiter:
+    def __init__(self, keys: list[str], tokens: int, priority: int, seq: int):
+        self.keys = keys
+        self.tokens = tokens
+        self.priority = priority
+        self.seq = seq
+
+
+class SchedulerTicket:
+    """A running call admitted by the scheduler."""
+
+    def __init__(self, scheduler: "LLMScheduler", keys: list[str], reservations: list[tuple[_Limit, list]]):
+        """Hold the limits and token reservations the call is counted against."""
+        self._scheduler = scheduler
+        self.keys = keys
+        self._reservations = reservations
+        self.waited = 0.0
+        self.position = 0
+
+    def settle(self, tokens: int) -> None:
+        """Replace the estimated tokens of the call by the tokens it actually used."""
+        self._scheduler._settle(self, tokens)
+
+
+class LLMScheduler:
+    """Admit LLM calls under per-provider and per-model limits, queueing the rest by priority."""
+
+    def __init__(
+        self,
+        providers: Optional[dict] = None,
+        models: Optional[dict] = None,
+        max_queue_size: int = 200,
+        position_interval: float = 2.0,
+        wait_samples: int = 1000,
+    ):
+        """
+        Initialize the LLMScheduler.
+
+        Args:
+            providers (Optional[dict]): ``concurrency`` and ``tokens_per_minute`` per provider name.
+            models (Optional[dict]): The same limits per ``provider/model_name``.
+            max_queue_size (int): Maximum number of waiting calls, further calls are rejected.
+            position_interval (float): Minimum number of seconds between two queue position updates.
+            wait_samples (int): Number of recent wait times kept for the metrics.
+        """
+        self.max_queue_size = max_queue_size
+        self.position_interval = position_interval
+        self._limits: dict[str, _Limit] = {}
+        for prefix, limits in (("provider", providers or {}), ("model", models or {})):
+            for name, limit in limits.items():
+                self._limits[f"{prefix}:{name}"] = _Limit(limit.get("concurrency"), limit.get("tokens_per_minute"))
+        self._waiting: list[_Waiter] = []
+        self._seq = count()
+        self._cond = threading.Condition()
+        self._waits: deque[float] = deque(maxlen=wait_samples)
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+
+    def _keys(self, config: ModelConfig) -> list[str]:
+        """Return the limits that apply to a model."""
+        keys = [f"provider:{config.provider}", f"model:{target_name(config)}"]
+        return [key for key in keys if key in self._limits]
+
+    @contextmanager
+    def slot(
+        self,
+        config: ModelConfig,
+        tokens: int = 0,
+        priority: Union[int, Callable[[], int]] = 0,
+        on_position: Optional[Callable[[int], None]] = None,
+        cancelled: Optional[threading.Event] = None,
+    ) -> Iterator[SchedulerTicket]:
+        """
+        Hold a slot for one call to the model, waiting in the queue if its limits are reached.
+
+        Args:
+            config (ModelConfig): The model that is called.
+            tokens (int): Estimated tokens of the call, counted against the tokens-per-minute limits.
+            priority (Union[int, Callable[[], int]]): Lower values are served first. A callable is only
+                evaluated if the call has to wait, so calls that run right away cost no lookup.
+            on_position (Optional[Callable[[int], None]]): Called with the position in the queue
+                whenever it changes, at most every ``position_interval`` seconds.
+            cancelled (Optional[threading.Event]): Once set, a waiting call leaves the queue.
+
+        Raises:
+            LLMQueueFullException: The queue is full.
+            LLMCallCancelledException: ``cancelled`` was set while the call waited.
+        """
+        ticket = self._acquire(config, tokens, priority, on_position, cancelled)
+        try:
+            yield ticket
+        finally:
+            self._release(ticket)
+
+    def _acquire(self, config, tokens, priority, on_position, cancelled=None) -> SchedulerTicket:
+        keys = self._keys(config)
+        with self._cond:
+            if self._position(keys, tokens, None)[0] == 0:
+                self._waits.append(0.0)
+                return self._admit(keys, tokens)
+
+        if callable(priority):
+            priority = priority()
+        with self._cond:
+            if len(self._waiting) >= self.max_queue_size:
+                self.rejected += 1
+                raise LLMQueueFullException(self.max_queue_size)
+            waiter = _Waiter(keys, tokens, priority, next(self._seq))
+            self._waiting.append(waiter)
+            self._waiting.sort(key=lambda w: (w.priority, w.seq))
+            self.queued += 1
+            # Calls of a lower priority moved down
+            self._cond.notify_all()
+        enqueued_at = time.monotonic()
+
+        reported, next_report = 0, 0.0
+        try:
+            while True:
+                with self._cond:
+                    if cancelled is not None and cancelled.is_set():
+                        raise LLMCallCancelledException()
+                    position, retry_in = self._position(keys, tokens, waiter)
+                    if position == 0:
+                        self._waiting.remove(waiter)
+                        ticket = self._admit(keys, tokens)
+                        # The calls behind this one moved up
+                        self._cond.notify_all()
+                        break
+                    now = time.monotonic()
+                    report = on_position is not None and position != reported and now >= next_report
+                    if not report:
+                        timeout = retry_in
+                        if on_position is not None and position != reported:
+                            timeout = min(timeout, next_report - now)
+                        if cancelled is not None:
+                            timeout = min(timeout, CANCEL_POLL_INTERVAL)
+                        self._cond.wait(None if timeout == float("inf") else timeout)
+                        continue
+                try:
+                    on_position(position)
+                except Exception as e:
+                    logger.error(f"Failed to report the queue position: {e}")
+                reported, next_report = position, time.monotonic() + self.position_interval
+        except BaseException:
+            with self._cond:
+                if waiter in self._waiting:
+                    self._waiting.remove(waiter)
+                    self._cond.notify_all()
+            raise
+
+        ticket.waited = time.monotonic() - enqueued_at
+        ticket.position = reported
+        with self._cond:
+            self._waits.append(ticket.waited)
+        return ticket
+
+    def _position(self, keys: list[str], tokens: int, waiter: Optional[_Waiter]) -> tuple[int, float]:
+        """
+        Return the position of a call in the queue of its limits, 0 if it may run now,
+        and the seconds after which its limits should be checked again. The lock must be held.
+        """
+        # Calls only overtake queued calls that wait for none of the same limits
+        ahead = 0
+        for other in self._waiting:
+            if other is waiter:
+                break
+            if set(other.keys) & set(keys):
+                ahead += 1
+        if ahead:
+            return ahead + 1, float("inf")
+
+        now = time.monotonic()
+        blocked = [self._limits[key].blocked_for(tokens, now) for key in keys]
+        blocked = [wait for wait in blocked if wait is not None]
+        if blocked:
+            return 1, max(blocked)
+        return 0, 0.0
+
+    def _admit(self, keys: list[str], tokens: int) -> SchedulerTicket:
+        """Count a call against its limits. The lock must be held."""
+        now = time.monotonic()
+        reservations = []
+        for key in keys:
+            limit = self._limits[key]
+            limit.running += 1
+            if limit.tokens_per_minute is not None:
+                reservation = [now, tokens]
+                limit.reservations.append(reservation)
+                limit.tokens += tokens
+                reservations.append((limit, reservation))
+        self.admitted += 1
+        return SchedulerTicket(self, keys, reservations)
+
+    def _settle(self, ticket: SchedulerTicket, tokens: int) -> None:
+        with self._cond:
+            for limit, reservation in ticket._reservations:
+                if any(entry is reservation for entry in limit.reservations):
+                    limit.tokens += tokens - reservation[1]
+                    reservation[1] = tokens
+            self._cond.notify_all()
+
+    def _release(self, ticket: SchedulerTicket) -> None:
+        with self._cond:
+            for key in ticket.keys:
+                self._limits[key].running -= 1
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        """Return the queue depth, the wait times in ms and the usage of each limit."""
+        with self._cond:
+            now = time.monotonic()
+            waits = sorted(self._waits)
+            limits = {}
+            for key, limit in self._limits.items():
+                limit.expire(now)
+                limits[key] = {
+                    "running": limit.running,
+                    "queued": sum(1 for waiter in self._waiting if key in waiter.keys),
+                    "concurrency": limit.concurrency,
+                    "tokens_last_minute": limit.tokens,
+                    "tokens_per_minute": limit.tokens_per_minute,
+                }
+            stats = {
+                "queue_depth": len(self._waiting),
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "rejected": self.rejected,
+            }
+
+        def percentile(p: float) -> Optional[float]:
+            return round(1000 * waits[min(int(p * len(waits)), len(waits) - 1)], 1) if waits else None
+
+        stats.update(
+            {
+                "wait_p50_ms": percentile(0.5),
+                "wait_p95_ms": percentile(0.95),
+                "wait_max_ms": round(1000 * waits[-1], 1) if waits else None,
+                "limits": limits,
+            }
+        )
+        return stats
@@ -0,0 +1,186 @@
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Optional
+
+from langchain_core.messages import HumanMessage
+
+from telegram_llm_chatbot.core.llm import LLM
+from telegram_llm_chatbot.core.scheduler import LLMScheduler
+from telegram_llm_chatbot.core.tokens import count_tokens
+from telegram_llm_chatbot.db import crud
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "Update the summary of a conversation between a user and an assistant with the new messages below. "
+    "Keep the facts, names, decisions and open questions that later messages may refer to and leave out "
+    "small talk. Answer with the updated summary only.\n\n"
+    "Current summary:\n{summary}\n\n"
+    "New messages:\n{messages}"
+)
+
+
+class ChatSummarizer:
+    """Fold messages that fell out of the history window into a rolling per-chat summary in the background."""
+
+    def __init__(
+        self,
+        get_llm: Callable[[], LLM],
+        enabled: bool = True,
+        min_messages: int = 4,
+        batch_size: int = 50,
+        max_message_chars: int = 2000,
+        max_chars: int = 4000,
+        max_queue_size: int = 1000,
+        scheduler: Optional[LLMScheduler] = None,
+        priority: int = 2,
+    ):
+        """
+        Initialize the ChatSummarizer.
+
+        Args:
+            get_llm (Callable[[], LLM]): Returns the model used to write the summaries.
+            enabled (bool): Whether summaries are written and used at all.
+            min_messages (int): Number of unsummarized messages that triggers a summary update.
+            batch_size (int): Maximum number of messages folded into the summary per model call.
+            max_message_chars (int): Messages are truncated to this length in the summary prompt.
+            max_chars (int): Maximum length of a stored summary.
+            max_queue_size (int): Maximum number of chats waiting for a summary update.
+            scheduler (Optional[LLMScheduler]): Limits the model calls together with the chat replies.
+            priority (int): Scheduler priority of the model calls, behind the replies to users by default.
+        """
+        self.get_llm = get_llm
+        self.enabled = enabled
+        self.min_messages = min_messages
+        self.batch_size = batch_size
+        self.max_message_chars = max_message_chars
+        self.max_chars = max_chars
+        self.scheduler = scheduler
+        self.priority = priority
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._pending: dict[int, int] = {}
+        self._pending_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.submitted = 0
+        self.dropped = 0
+        self.updated = 0
+        self.errors = 0
+        self.last_run_ms = 0.0
+
+    def start(self) -> None:
+        """Start the background thread if summaries are enabled."""
+        if not self.enabled or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="chat-summarizer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop the background thread, pending updates are discarded and picked up again later."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, chat_id: int, before_id: int) -> bool:
+        """
+        Request a summary update for the messages of a chat older than the history window.
+
+        Args:
+            chat_id (int): The ID of the chat.
+            before_id (int): The ID of the oldest message in the history window.
+
+        Returns:
+            bool: False if summaries are disabled or the queue is full.
+        """
+        if not self.enabled:
+            return False
+        with self._pending_lock:
+            if chat_id in self._pending:
+                # Already queued, only move the window start forward
+                self._pending[chat_id] = max(self._pending[chat_id], before_id)
+                return True
+            try:
+                self._queue.put_nowait(chat_id)
+            except queue.Full:
+                self.dropped += 1
+                return False
+            self._pending[chat_id] = before_id
+            self.submitted += 1
+        return True
+
+    def summarize(self, chat_id: int, before_id: int) -> bool:
+        """
+        Fold the unsummarized messages before the window into the chat summary.
+
+        Args:
+            chat_id (int): The ID of the chat.
+            before_id (int): The ID of the oldest message in the history window.
+
+        Returns:
+            bool: Whether the summary was updated.
+        """
+        updated = False
+        while True:
+            messages = crud.get_unsummarized_messages(chat_id, before_id, limit=self.batch_size)
+            if len(messages) < self.min_messages:
+                return updated
+
+            summary = crud.get_chat_summary(chat_id).summary
+            transcript = "\n".join(f"{m.role}: {m.content[: self.max_message_chars]}" for m in messages)
+            prompt = SUMMARY_PROMPT.format(summary=summary or "(none)", messages=transcript)
+
+            llm = self.get_llm()
+            response = self._invoke(llm, prompt)
+            new_summary = response.content.replace("<end_of_turn>", "").strip()[: self.max_chars]
+            if not crud.update_chat_summary(chat_id, new_summary, until_id=messages[-1].id):
+                return updated
+            updated = True
+            self.updated += 1
+            if len(messages) < self.batch_size:
+                return updated
+
+    def _invoke(self, llm: LLM, prompt: str):
+        """Call the model, holding a scheduler slot if there is a scheduler."""
+        client = llm.get_client(llm.config)
+        if self.scheduler is None:
+            return client.invoke([HumanMessage(content=prompt)])
+        prompt_tokens = count_tokens(prompt)
+        with self.scheduler.slot(
+            llm.config, tokens=prompt_tokens + (llm.config.max_tokens or 0), priority=self.priority
+        ) as ticket:
+            response = client.invoke([HumanMessage(content=prompt)])
+            ticket.settle(prompt_tokens + count_tokens(response.content))
+        return response
+
+    def stats(self) -> dict:
+        """Return the summarizer counters."""
+        return {
+            "enabled": self.enabled,
+            "queued": self._queue.qsize(),
+            "submitted": self.submitted,
+            "dropped": self.dropped,
+            "updated": self.updated,
+            "errors": self.errors,
+            "last_run_ms": round(self.last_run_ms, 3),
+        }
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                chat_id = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            with self._pending_lock:
+                before_id = self._pending.pop(chat_id)
+            start = time.perf_counter()
+            try:
+                self.summarize(chat_id, before_id)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Error summarizing chat {chat_id}: {e}")
+            self.last_run_ms = 1000 * (time.perf_counter() - start)
@@ -0,0 +1,41 @@
+import logging
+from functools import lru_cache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Encoding used for all models; close enough for budgeting the context of other tokenizers
+TOKEN_ENCODING = "cl100k_base"  # noqa: S105
+
+# Rough number of characters per token when the tiktoken encoding cannot be loaded
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """Load the tiktoken encoding once, or return None if it is not available."""
+    try:
+        import tiktoken  # noqa: PLC0415
+
+        return tiktoken.get_encoding(TOKEN_ENCODING)
+    except Exception as e:
+        logger.warning(f"Token counts are estimated from the text length, tiktoken is unavailable: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens of a text.
+
+    Args:
+        text (str): The text to count.
+
+    Returns:
+        int: The number of tokens, estimated from the length if the encoding cannot be loaded.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text, disallowed_special=()))
@@ -0,0 +1,86 @@
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from telegram_llm_chatbot.core.cache import MISSING, TTLCache
+from telegram_llm_chatbot.db import crud
+from telegram_llm_chatbot.db.rows import UserRecord
+
+
+class UserRegistry:
+    """In-process LRU registry of user records, kept in sync by writing through to the database."""
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 3600):
+        """
+        Initialize the UserRegistry.
+
+        Args:
+            maxsize (int): Maximum number of cached users.
+            ttl (float): Number of seconds a record is trusted before it is read again.
+        """
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def _store(self, user) -> Optional[UserRecord]:
+        """Cache the columns of a user object returned by the CRUD layer."""
+        if user is None:
+            return None
+        record = UserRecord.from_user(user)
+        self._cache.set(record.id, record)
+        return record
+
+    def get(self, user_id: int, db: Optional[Session] = None) -> Optional[UserRecord]:
+        """
+        Return the record of a user, reading it from the database on a miss.
+
+        Args:
+            user_id (int): The ID of the user.
+            db (Optional[Session]): An open session used on a cache miss.
+
+        Returns:
+            Optional[UserRecord]: The user record, or None if the user does not exist.
+        """
+        record = self._cache.get(user_id)
+        if record is not MISSING:
+            return record
+        return self._store(crud.get_user(user_id, db=db))
+
+    def sync(
+        self, user_id: int, name: str, last_chat_id: Optional[int] = None, db: Optional[Session] = None
+    ) -> Optional[UserRecord]:
+        """
+        Make sure the user exists with the given name, writing only if something differs.
+
+        Args:
+            user_id (int): The ID of the user.
+            name (str): The current name of the user.
+            last_chat_id (Optional[int]): The ID of the chat to select, if any.
+            db (Optional[Session]): An open session used when the database has to be updated.
+
+        Returns:
+            Optional[UserRecord]: The user record, or None if the upsert failed.
+        """
+        record = self._cache.get(user_id)
+        if record is not MISSING and record.name == name and last_chat_id in (None, record.current_chat_id):
+            return record
+        return self._store(crud.upsert_user(user_id, name, last_chat_id=last_chat_id, db=db))
+
+    def current_chat_id(self, user_id: int, db: Optional[Session] = None) -> Optional[int]:
+        """Return the ID of the chat the user has selected, or None."""
+        record = self.get(user_id, db=db)
+        return record.current_chat_id if record else None
+
+    def set_current_chat(self, user_id: int, chat_id: int, db: Optional[Session] = None) -> Optional[UserRecord]:
+        """Select a chat for the user in the database and in the registry."""
+        return self._store(crud.update_user_last_chat_id(user_id, chat_id, db=db))
+
+    def invalidate(self, user_id: int) -> None:
+        """Forget the record of one user, e.g. after its transaction was rolled back."""
+        self._cache.invalidate(user_id)
+
+    def clear(self) -> None:
+        """Forget all records."""
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        """Return the cache hit and miss counters."""
+        return self._cache.stats()
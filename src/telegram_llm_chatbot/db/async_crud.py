@@ -0,0 +1,69 @@
+"""Async variant of the CRUD API for asyncio-based bot runtimes.
+
+Every function has the same name and arguments as its counterpart in ``crud``, takes an
+optional ``AsyncSession`` as ``db`` and must be awaited. The statements are the ones of the
+sync API, executed on the asyncpg driver through ``AsyncSession.run_sync``, so the two
+APIs cannot drift apart.
+"""
+
+import functools
+from typing import Any, Callable, Coroutine, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from telegram_llm_chatbot.db import crud
+from telegram_llm_chatbot.db.async_database import async_session_scope
+
+
+def _make_async(fn: Callable[..., Any]) -> Callable[..., Coroutine[Any, Any, Any]]:
+    """Wrap a sync CRUD function so that it runs on an async session."""
+
+    @functools.wraps(fn)
+    async def wrapper(*args, db: Optional[AsyncSession] = None, **kwargs):
+        async with async_session_scope(db) as session:
+            return await session.run_sync(lambda sync_session: fn(*args, db=sync_session, **kwargs))
+
+    return wrapper
+
+
+# Chats and messages
+create_chat = _make_async(crud.create_chat)
+get_user_chats = _make_async(crud.get_user_chats)
+delete_chat = _make_async(crud.delete_chat)
+create_message = _make_async(crud.create_message)
+get_last_chat_id = _make_async(crud.get_last_chat_id)
+get_chat_name = _make_async(crud.get_chat_name)
+update_user_last_chat_id = _make_async(crud.update_user_last_chat_id)
+get_chat_summary = _make_async(crud.get_chat_summary)
+get_unsummarized_messages = _make_async(crud.get_unsummarized_messages)
+update_chat_summary = _make_async(crud.update_chat_summary)
+
+# Users
+get_user = _make_async(crud.get_user)
+get_users = _make_async(crud.get_users)
+get_chat = _make_async(crud.get_chat)
+get_chat_history = _make_async(crud.get_chat_history)
+upsert_user = _make_async(crud.upsert_user)
+delete_user = _make_async(crud.delete_user)
+write_log = _make_async(crud.write_log)
+
+# Subscription plans and subscriptions
+create_subscription_plan = _make_async(crud.create_subscription_plan)
+get_subscription_plan = _make_async(crud.get_subscription_plan)
+get_subscription_plans = _make_async(crud.get_subscription_plans)
+update_subscription_plan = _make_async(crud.update_subscription_plan)
+delete_subscription_plan = _make_async(crud.delete_subscription_plan)
+create_subscription = _make_async(crud.create_subscription)
+get_subscriptions_by_user_id = _make_async(crud.get_subscriptions_by_user_id)
+update_subscription = _make_async(crud.update_subscription)
+get_active_subscriptions_by_user_id = _make_async(crud.get_active_subscriptions_by_user_id)
+get_active_subscription_end_date = _make_async(crud.get_active_subscription_end_date)
+sweep_subscription_statuses = _make_async(crud.sweep_subscription_statuses)
+update_subscription_statuses = _make_async(crud.update_subscription_statuses)
+delete_subscription = _make_async(crud.delete_subscription)
+
+# Payments
+create_payment = _make_async(crud.create_payment)
+get_payment = _make_async(crud.get_payment)
+update_payment = _make_async(crud.update_payment)
+delete_payment = _make_async(crud.delete_payment)
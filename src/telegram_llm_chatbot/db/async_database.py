@@ -0,0 +1,104 @@
+import logging
+import threading
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+from .database import (
+    DB_HOST,
+    DB_MAX_OVERFLOW,
+    DB_NAME,
+    DB_PASSWORD,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_PORT,
+    DB_USER,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# asyncpg takes the SSL mode as `ssl` instead of libpq's `sslmode`
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?ssl=require"
+
+_async_engine: Optional[AsyncEngine] = None
+_async_engine_lock = threading.RLock()
+AsyncSessionLocal = async_sessionmaker(expire_on_commit=False)
+
+
+def init_async_engine(url: Optional[str] = None, **engine_kwargs) -> AsyncEngine:
+    """
+    Create the process-wide async engine, replacing any existing one.
+
+    The previous engine is not disposed, since that has to be awaited; call
+    ``await engine.dispose()`` on it if its connections should be closed.
+
+    Args:
+        url (Optional[str]): The database URL, defaults to the asyncpg URL built from the environment.
+        **engine_kwargs: Overrides for the pool settings passed to ``create_async_engine``.
+
+    Returns:
+        AsyncEngine: The new engine.
+    """
+    global _async_engine
+    options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    options.update(engine_kwargs)
+    with _async_engine_lock:
+        _async_engine = create_async_engine(url or ASYNC_DATABASE_URL, **options)
+        AsyncSessionLocal.configure(bind=_async_engine)
+    logger.info(f"Async database engine created with pool_size={options['pool_size']}")
+    return _async_engine
+
+
+def get_async_engine() -> AsyncEngine:
+    """Get the process-wide async engine object, creating it on first use."""
+    if _async_engine is None:
+        with _async_engine_lock:
+            if _async_engine is None:
+                init_async_engine()
+    return _async_engine
+
+
+def get_async_session() -> AsyncSession:
+    """Get a new async session object bound to the shared async engine."""
+    get_async_engine()
+    return AsyncSessionLocal()
+
+
+@asynccontextmanager
+async def async_session_scope(db: Optional[AsyncSession] = None) -> AsyncIterator[AsyncSession]:
+    """
+    Provide a transactional scope around a series of async operations.
+
+    Mirrors ``database.session_scope``: a session given by the caller is only
+    flushed, otherwise a new one is committed or rolled back and closed.
+
+    Args:
+        db (Optional[AsyncSession]): A session opened by the caller.
+
+    Yields:
+        AsyncSession: The session to use.
+    """
+    if db is not None:
+        yield db
+        await db.flush()
+        return
+
+    db = get_async_session()
+    try:
+        yield db
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    finally:
+        await db.close()
@@ -1,142 +1,233 @@
 import logging
+import time
 from datetime import datetime
+from typing import Optional
 
+from sqlalchemy import delete, or_, select, update
 from sqlalchemy.orm import Session
 
-from telegram_llm_chatbot.db.database import get_session
+from telegram_llm_chatbot.core.tokens import count_tokens
+from telegram_llm_chatbot.db.database import session_scope
 from telegram_llm_chatbot.db.models import Chat, Message, User
+from telegram_llm_chatbot.db.rows import ChatMessageRow, ChatRow, ChatSummaryRow, DeleteReport
 
 # Load logging configuration with OmegaConf
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def create_chat(user_id: int, name: str) -> Chat:
+def create_chat(user_id: int, name: str, db: Optional[Session] = None) -> Chat:
     """
     Create a new chat for a user.
 
     Args:
         user_id (int): The ID of the user who owns the chat.
         name (str): The name of the chat.
+        db (Optional[Session]): An open session to run in, otherwise a new one is used.
 
     Returns:
         Chat: The created chat object.
     """
-    db: Session = get_session()
-    db_chat = Chat(user_id=user_id, name=name)
-    db.add(db_chat)
-    db.commit()
-    db.refresh(db_chat)
-    db.close()
+    with session_scope(db) as db:
+        db_chat = Chat(user_id=user_id, name=name)
+        db.add(db_chat)
     return db_chat
 
 
-def get_user_chats(user_id: int) -> list[Chat]:
+def get_user_chats(user_id: int, db: Optional[Session] = None) -> list[ChatRow]:
     """
     Retrieve all chats for a specific user.
 
     Args:
         user_id (int): The ID of the user whose chats to retrieve.
+        db (Optional[Session]): An open session to run in, otherwise a new one is used.
 
     Returns:
-        list[Chat]: A list of chat objects associated with the user.
+        list[ChatRow]: The ID, name and timestamp of each chat of the user.
     """
-    db: Session = get_session()
-    result = db.query(Chat).filter(Chat.user_id == user_id).all()
-    db.close()
-    return result
+    query = select(Chat.id, Chat.name, Chat.timestamp).where(Chat.user_id == user_id).order_by(Chat.id)
+    with session_scope(db) as db:
+        rows = db.execute(query).tuples().all()
+    return [ChatRow._make(row) for row in rows]
 
 
-def delete_chat(user_id: int, chat_id: int) -> None:
+def delete_chat(user_id: int, chat_id: int, db: Optional[Session] = None) -> DeleteReport:
     """
     Delete a chat and all associated messages.
 
+    Both deletes are single set-based statements, no rows are loaded into the session.
+
     Args:
         user_id (int): The ID of the user who owns the chat.
         chat_id (int): The ID of the chat to delete.
-    """
-    db: Session = get_session()
-    # First, delete the messages associated with the chat
-    db_messages = db.query(Message).filter(Message.chat_id == chat_id).all()
-    for message in db_messages:
-        db.delete(message)
-
-    # Then, delete the chat
-    db_chat = db.query(Chat).filter(Chat.id == chat_id, Chat.user_id == user_id).first()
-    db.delete(db_chat)
-    db.commit()
-    db.close()
+        db (Optional[Session]): An open session to run in, otherwise a new one is used.
 
+    Returns:
+        DeleteReport: The number of deleted rows per table and the elapsed time.
 
-def create_message(chat_id: int, role: str, content: str, timestamp: datetime) -> Message:
+    Raises:
+        ValueError: The user has no chat with this ID.
     """
-    Create a new message in a chat.
+    start = time.perf_counter()
+    owned_chat = select(Chat.id).where(Chat.id == chat_id, Chat.user_id == user_id)
+    with session_scope(db) as db:
+        # First, delete the messages associated with the chat
+        messages = db.execute(
+            delete(Message).where(Message.chat_id.in_(owned_chat)), execution_options={"synchronize_session": False}
+        ).rowcount
+
+        # Then, delete the chat
+        chats = db.execute(
+            delete(Chat).where(Chat.id == chat_id, Chat.user_id == user_id),
+            execution_options={"synchronize_session": False},
+        ).rowcount
+        if not chats:
+            raise ValueError(f"Chat with id {chat_id} not found for user {user_id}")
+
+    report = DeleteReport({"messages": messages, "chats": chats}, (time.perf_counter() - start) * 1000)
+    logger.info(f"Deleted chat {chat_id} of user {user_id}: {report.rows} in {report.elapsed_ms:.1f} ms")
+    return report
+
+
+def create_message(
+    chat_id: int, role: str, content: str, timestamp: datetime, db: Optional[Session] = None
+) -> Message:
+    """
+    Create a new message in a chat and store its token count.
 
     Args:
         chat_id (int): The ID of the chat to add the message to.
         role (str): The role of the message sender.
         content (str): The content of the message.
         timestamp (datetime): The timestamp of the message.
+        db (Optional[Session]): An open session to run in, otherwise a new one is used.
 
     Returns:
         Message: The created message object.
     """
-    db: Session = get_session()
-    db_message = Message(chat_id=chat_id, role=role, content=content, timestamp=timestamp)
-    db.add(db_message)
-    db.commit()
-    db.refresh(db_message)
-    db.close()
+    with session_scope(db) as db:
+        db_message = Message(
+            chat_id=chat_id, role=role, content=content, timestamp=timestamp, token_count=count_tokens(content)
+        )
+        db.add(db_message)
     return db_message
 
 
-def get_last_chat_id(user_id: int) -> int:
+def get_last_chat_id(user_id: int, db: Optional[Session] = None) -> int:
     """
     Retrieve the last chat ID for a user.
 
     Args:
         user_id (int): The ID of the user.
+        db (Optional[Session]): An open session to run in, otherwise a new one is used.
 
     Returns:
         int: The ID of the last chat the user participated in.
     """
-    db: Session = get_session()
-    result = db.query(User).filter(User.id == user_id).first()
-    db.close()
+    with session_scope(db) as db:
+        result = db.query(User).filter(User.id == user_id).first()
     return result.current_chat_id
 
 
-def get_chat_name(user_id: int, chat_id: int) -> str:
+def get_chat_name(user_id: int, chat_id: int, db: Optional[Session] = None) -> str:
     """
     Retrieve the name of a chat.
 
     Args:
         user_id (int): The ID of the user who owns the chat.
         chat_id (int): The ID of the chat.
+        db (Optional[Session]): An open session to run in, otherwise a new one is used.
 
     Returns:
         str: The name of the chat.
     """
-    db: Session = get_session()
-    result = db.query(Chat).filter(Chat.id == chat_id, Chat.user_id == user_id).first()
-    db.close()
+    with session_scope(db) as db:
+        result = db.query(Chat).filter(Chat.id == chat_id, Chat.user_id == user_id).first()
     return result.name
 
 
-def update_user_last_chat_id(user_id: int, chat_id: int) -> Chat:
+def update_user_last_chat_id(user_id: int, chat_id: int, db: Optional[Session] = None) -> Chat:
     """
     Update the last chat ID for a user.
 
     Args:
         user_id (int): The ID of the user.
         chat_id (int): The ID of the chat to set as the last chat.
+        db (Optional[Session]): An open session to run in, otherwise a new one is used.
 
     Returns:
         Chat: The updated user object.
     """
-    db: Session = get_session()
-    db_user = db.query(User).filter(User.id == user_id).first()
-    db_user.current_chat_id = chat_id
-    db.commit()
-    db.close()
+    with session_scope(db) as db:
+        db_user = db.query(User).filter(User.id == user_id).first()
+        db_user.current_chat_id = chat_id
     return db_user
+
+
+def get_chat_summary(chat_id: int, db: Optional[Session] = None) -> ChatSummaryRow:
+    """
+    Retrieve the rolling summary of a chat.
+
+    Args:
+        chat_id (int): The ID of the chat.
+        db (Optional[Session]): An open session to run in, otherwise a new one is used.
+
+    Returns:
+        ChatSummaryRow: The summary and the ID of the last summarized message, both None if there is none.
+    """
+    query = select(Chat.summary, Chat.summary_until_id).where(Chat.id == chat_id)
+    with session_scope(db) as db:
+        row = db.execute(query).first()
+    return ChatSummaryRow._make(row) if row else ChatSummaryRow(None, None)
+
+
+def get_unsummarized_messages(
+    chat_id: int, before_id: int, limit: int, db: Optional[Session] = None
+) -> list[ChatMessageRow]:
+    """
+    Retrieve the oldest messages of a chat that are not part of its summary yet.
+
+    Args:
+        chat_id (int): The ID of the chat.
+        before_id (int): Only messages with a smaller ID, i.e. older than the history window, are returned.
+        limit (int): The maximum number of messages to return.
+        db (Optional[Session]): An open session to run in, otherwise a new one is used.
+
+    Returns:
+        list[ChatMessageRow]: The messages, oldest first.
+    """
+    summary_until_id = select(Chat.summary_until_id).where(Chat.id == chat_id).scalar_subquery()
+    query = (
+        select(Message.role, Message.content, Message.id)
+        .where(Message.chat_id == chat_id, Message.id < before_id)
+        .where(or_(summary_until_id.is_(None), Message.id > summary_until_id))
+        .order_by(Message.id)
+        .limit(limit)
+    )
+    with session_scope(db) as db:
+        rows = db.execute(query).tuples().all()
+    return [ChatMessageRow._make(row) for row in rows]
+
+
+def update_chat_summary(chat_id: int, summary: str, until_id: int, db: Optional[Session] = None) -> bool:
+    """
+    Store a new rolling summary of a chat unless a newer one was stored in the meantime.
+
+    Args:
+        chat_id (int): The ID of the chat.
+        summary (str): The summary of all messages up to and including ``until_id``.
+        until_id (int): The ID of the last message folded into the summary.
+        db (Optional[Session]): An open session to run in, otherwise a new one is used.
+
+    Returns:
+        bool: Whether the summary was stored.
+    """
+    statement = (
+        update(Chat)
+        .where(Chat.id == chat_id)
+        .where(or_(Chat.summary_until_id.is_(None), Chat.summary_until_id < until_id))
+        .values(summary=summary, summary_until_id=until_id)
+    )
+    with session_scope(db) as db:
+        updated = db.execute(statement, execution_options={"synchronize_session": False}).rowcount
+    return bool(updated)
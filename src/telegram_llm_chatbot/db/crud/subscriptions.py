@@ -2,10 +2,12 @@ import logging
 from datetime import datetime, timedelta
 from typing import Optional
 
+from sqlalchemy import Select, func, select, update
 from sqlalchemy.orm import Session
 
-from telegram_llm_chatbot.db.database import get_session
+from telegram_llm_chatbot.db.database import session_scope
 from telegram_llm_chatbot.db.models import Payment, Subscription, SubscriptionPlan
+from telegram_llm_chatbot.db.rows import SubscriptionRow
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -16,33 +18,31 @@ def create_subscription_plan(
     name: str,
     price: float, currency: str,
     duration_in_days: int,
-    description: Optional[str] = None
+    description: Optional[str] = None,
+    db: Optional[Session] = None
     ) -> SubscriptionPlan:
     plan = SubscriptionPlan(
         name=name, description=description,
         price=price, currency=currency,
         duration_in_days=duration_in_days
     )
-    db: Session = get_session()
-    db.expire_on_commit = False
-    db.add(plan)
-    db.commit()
-    db.close()
+    with session_scope(db) as db:
+        db.add(plan)
     return plan
 
-def get_subscription_plan(plan_id: int) -> Optional[SubscriptionPlan]:
-    db: Session = get_session()
-    plan = db.query(SubscriptionPlan).filter(SubscriptionPlan.id == plan_id).first()
-    db.close()
+def get_subscription_plan(plan_id: int, db: Optional[Session] = None) -> Optional[SubscriptionPlan]:
+    with session_scope(db) as db:
+        plan = db.query(SubscriptionPlan).filter(SubscriptionPlan.id == plan_id).first()
     return plan
 
-def get_subscription_plans(plan_name: Optional[str] = None) -> Optional[list[SubscriptionPlan]]:
-    db: Session = get_session()
-    if plan_name:
-        plans = db.query(SubscriptionPlan).filter(SubscriptionPlan.name == plan_name).all()
-    else:
-        plans = db.query(SubscriptionPlan).all()
-    db.close()
+def get_subscription_plans(
+    plan_name: Optional[str] = None, db: Optional[Session] = None
+    ) -> Optional[list[SubscriptionPlan]]:
+    with session_scope(db) as db:
+        if plan_name:
+            plans = db.query(SubscriptionPlan).filter(SubscriptionPlan.name == plan_name).all()
+        else:
+            plans = db.query(SubscriptionPlan).all()
     return plans
 
 def update_subscription_plan(
@@ -51,113 +51,166 @@ def update_subscription_plan(
     description: Optional[str]=None,
     price: Optional[float]=None,
     currency: Optional[str]=None,
-    duration_in_days: Optional[int]=None
+    duration_in_days: Optional[int]=None,
+    db: Optional[Session] = None
     ) -> Optional[SubscriptionPlan]:
-    db: Session = get_session()
-    plan = db.query(SubscriptionPlan).filter(SubscriptionPlan.id == plan_id).first()
-    if plan:
-        if name is not None:
-            plan.name = name
-        if description is not None:
-            plan.description = description
-        if price is not None:
-            plan.price = price
-        if currency is not None:
-            plan.currency = currency
-        if duration_in_days is not None:
-            plan.duration_in_days = duration_in_days
-        db.commit()
-    db.close()
+    with session_scope(db) as db:
+        plan = db.query(SubscriptionPlan).filter(SubscriptionPlan.id == plan_id).first()
+        if plan:
+            if name is not None:
+                plan.name = name
+            if description is not None:
+                plan.description = description
+            if price is not None:
+                plan.price = price
+            if currency is not None:
+                plan.currency = currency
+            if duration_in_days is not None:
+                plan.duration_in_days = duration_in_days
     return plan
 
-def delete_subscription_plan(plan_id: int):
-    db: Session = get_session()
-    plan = db.query(SubscriptionPlan).filter(SubscriptionPlan.id == plan_id).first()
-    if plan:
-        db.delete(plan)
-        db.commit()
-    db.close()
+def delete_subscription_plan(plan_id: int, db: Optional[Session] = None):
+    with session_scope(db) as db:
+        plan = db.query(SubscriptionPlan).filter(SubscriptionPlan.id == plan_id).first()
+        if plan:
+            db.delete(plan)
 
 # Subscription CRUD operations
-def create_subscription(user_id: int, plan_id: int, status: str = "active") -> Subscription:
-    plan = get_subscription_plan(plan_id)
-    if not plan:
-        raise ValueError("Subscription plan not found")
-    subscription = Subscription(
-        user_id=user_id,
-        plan_id=plan_id,
-        start_date=datetime.now(),
-        end_date=datetime.now() + timedelta(days=plan.duration_in_days),
-        status=status
+def create_subscription(
+    user_id: int, plan_id: int, status: str = "active", db: Optional[Session] = None
+    ) -> Subscription:
+    with session_scope(db) as db:
+        plan = get_subscription_plan(plan_id, db=db)
+        if not plan:
+            raise ValueError("Subscription plan not found")
+        subscription = Subscription(
+            user_id=user_id,
+            plan=plan,
+            start_date=datetime.now(),
+            end_date=datetime.now() + timedelta(days=plan.duration_in_days),
+            status=status
+        )
+        db.add(subscription)
+
+        logger.info(f"Subscription created for user {user_id} with plan {plan.name}")
+    return subscription
+
+def _select_subscription_rows(user_id: int):
+    """Select the subscriptions of a user with the plan name joined in, for SubscriptionRow."""
+    return (
+        select(
+            Subscription.id,
+            Subscription.plan_id,
+            SubscriptionPlan.name,
+            Subscription.status,
+            Subscription.start_date,
+            Subscription.end_date,
+        )
+        .outerjoin(SubscriptionPlan, Subscription.plan_id == SubscriptionPlan.id)
+        .where(Subscription.user_id == user_id)
+        .order_by(Subscription.id)
     )
-    db: Session = get_session()
-    db.expire_on_commit = False
-    db.add(subscription)
 
-    logger.info(f"Subscription created for user {user_id} with plan {plan.name}")
+def get_subscriptions_by_user_id(user_id: int, db: Optional[Session] = None) -> list[SubscriptionRow]:
+    with session_scope(db) as db:
+        rows = db.execute(_select_subscription_rows(user_id)).tuples().all()
+    return [SubscriptionRow._make(row) for row in rows]
 
-    db.commit()
-    db.close()
+def update_subscription(
+    subscription_id: int,
+    status: Optional[str]=None,
+    end_date: Optional[datetime]=None,
+    db: Optional[Session] = None
+    ) -> Optional[Subscription]:
+    with session_scope(db) as db:
+        subscription = db.query(Subscription).filter(Subscription.id == subscription_id).first()
+        if subscription:
+            if status is not None:
+                subscription.status = status
+            if end_date is not None:
+                subscription.end_date = end_date
     return subscription
 
-def get_subscriptions_by_user_id(user_id: int) -> Optional[list[Subscription]]:
-    db: Session = get_session()
-    subscriptions = db.query(Subscription).filter(Subscription.user_id == user_id).all()
-    db.close()
-    return subscriptions
-
-def update_subscription(subscription_id: int, status: Optional[str]=None, end_date: Optional[datetime]=None) -> Optional[Subscription]:
-    db: Session = get_session()
-    subscription = db.query(Subscription).filter(Subscription.id == subscription_id).first()
-    if subscription:
-        if status is not None:
-            subscription.status = status
-        if end_date is not None:
-            subscription.end_date = end_date
-        db.commit()
-    db.close()
-    return subscription
+def get_active_subscriptions_by_user_id(
+    user_id: int, db: Optional[Session] = None
+    ) -> Optional[list[SubscriptionRow]]:
+    query = _select_subscription_rows(user_id).where(Subscription.status.in_(["active"]))  # Relevant statuses
+    with session_scope(db) as db:
+        active_subscriptions = [SubscriptionRow._make(row) for row in db.execute(query).tuples()]
 
-def get_active_subscriptions_by_user_id(user_id: int) -> Optional[list[Subscription]]:
-    db: Session = get_session()
+    return active_subscriptions if active_subscriptions else None
 
-    # Fetch the subscriptions
-    active_subscriptions = (
-        db.query(Subscription)
-        .filter(Subscription.user_id == user_id)
-        .filter(Subscription.status.in_(["active"]))  # Relevant statuses
-        .all()
+def _select_active_subscription_end_date(user_id: int, now: datetime) -> Select:
+    """Build the query of ``get_active_subscription_end_date``."""
+    return (
+        select(func.max(Subscription.end_date))
+        .where(Subscription.user_id == user_id)
+        .where(Subscription.status.in_(["active", "inactive"]))
+        .where(Subscription.end_date > now)
     )
 
-    db.commit()
-    db.close()
-    return active_subscriptions if active_subscriptions else None
+def get_active_subscription_end_date(user_id: int, db: Optional[Session] = None) -> Optional[datetime]:
+    """
+    Return the latest end date among the user's subscriptions that are still running.
+
+    Subscriptions are matched on ``end_date`` rather than on ``status`` alone, so the result
+    is correct even before the sweeper has updated the statuses. Nothing is written.
+
+    Args:
+        user_id (int): The ID of the user.
+        db (Optional[Session]): An open session to run in, otherwise a new one is used.
 
-def update_subscription_statuses(user_id: int) -> None:
+    Returns:
+        Optional[datetime]: The time until which the user is entitled, or None if not entitled.
+    """
+    query = _select_active_subscription_end_date(user_id, datetime.now())
+    with session_scope(db) as db:
+        end_date = db.execute(query).scalar()
+    return end_date
+
+def sweep_subscription_statuses(user_id: Optional[int] = None, db: Optional[Session] = None) -> tuple[int, int]:
+    """
+    Expire and reactivate subscriptions with one set-based UPDATE each.
+
+    Args:
+        user_id (Optional[int]): Restrict the sweep to one user, otherwise all users are swept.
+        db (Optional[Session]): An open session to run in, otherwise a new one is used.
+
+    Returns:
+        tuple[int, int]: The number of expired and of reactivated subscriptions.
+    """
     current_date = datetime.now()
-    db: Session = get_session()
-    subscriptions = db.query(Subscription).filter(
-        Subscription.user_id == user_id
-    ).all()
-
-    for subscription in subscriptions:
-        if subscription.status == "active" and subscription.end_date < current_date:
-            subscription.status = "inactive"
-            logger.info(f"Subscription {subscription.id} has expired")
-        elif subscription.status == "inactive" and subscription.end_date > current_date:
-            subscription.status = "active"
-            logger.info(f"Subscription {subscription.id} has been reactivated")
-
-    db.commit()
-    db.close()
-
-def delete_subscription(subscription_id: int):
-    db: Session = get_session()
-    subscription = db.query(Subscription).filter(Subscription.id == subscription_id).first()
-    if subscription:
-        db.delete(subscription)
-        db.commit()
-    db.close()
+    expire = (
+        update(Subscription)
+        .where(Subscription.status == "active", Subscription.end_date < current_date)
+        .values(status="inactive")
+    )
+    reactivate = (
+        update(Subscription)
+        .where(Subscription.status == "inactive", Subscription.end_date > current_date)
+        .values(status="active")
+    )
+    if user_id is not None:
+        expire = expire.where(Subscription.user_id == user_id)
+        reactivate = reactivate.where(Subscription.user_id == user_id)
+
+    with session_scope(db) as db:
+        options = {"synchronize_session": False}
+        expired = db.execute(expire, execution_options=options).rowcount
+        reactivated = db.execute(reactivate, execution_options=options).rowcount
+
+    if expired or reactivated:
+        logger.info(f"Subscriptions expired: {expired}, reactivated: {reactivated}")
+    return expired, reactivated
+
+def update_subscription_statuses(user_id: int, db: Optional[Session] = None) -> None:
+    sweep_subscription_statuses(user_id, db=db)
+
+def delete_subscription(subscription_id: int, db: Optional[Session] = None):
+    with session_scope(db) as db:
+        subscription = db.query(Subscription).filter(Subscription.id == subscription_id).first()
+        if subscription:
+            db.delete(subscription)
 
 # Payment CRUD operations
 def create_payment(
@@ -165,7 +218,8 @@ def create_payment(
     amount: float,
     currency: str,
     payment_date: datetime,
-    payment_method: str
+    payment_method: str,
+    db: Optional[Session] = None
     ) -> Payment:
     payment = Payment(
         subscription_id=subscription_id,
@@ -174,34 +228,32 @@ def create_payment(
         payment_date=payment_date,
         payment_method=payment_method
     )
-    db: Session = get_session()
-    db.add(payment)
-    db.commit()
-    db.close()
+    with session_scope(db) as db:
+        db.add(payment)
     return payment
 
-def get_payment(payment_id: int) -> Optional[Payment]:
-    db: Session = get_session()
-    payment = db.query(Payment).filter(Payment.id == payment_id).first()
-    db.close()
+def get_payment(payment_id: int, db: Optional[Session] = None) -> Optional[Payment]:
+    with session_scope(db) as db:
+        payment = db.query(Payment).filter(Payment.id == payment_id).first()
     return payment
 
-def update_payment(payment_id: int, amount: Optional[float]=None, payment_method: Optional[str]=None) -> Optional[Payment]:
-    db: Session = get_session()
-    payment = db.query(Payment).filter(Payment.id == payment_id).first()
-    if payment:
-        if amount is not None:
-            payment.amount = amount
-        if payment_method is not None:
-            payment.payment_method = payment_method
-        db.commit()
-    db.close()
+def update_payment(
+    payment_id: int,
+    amount: Optional[float]=None,
+    payment_method: Optional[str]=None,
+    db: Optional[Session] = None
+    ) -> Optional[Payment]:
+    with session_scope(db) as db:
+        payment = db.query(Payment).filter(Payment.id == payment_id).first()
+        if payment:
+            if amount is not None:
+                payment.amount = amount
+            if payment_method is not None:
+                payment.payment_method = payment_method
     return payment
 
-def delete_payment(payment_id: int):
-    db: Session = get_session()
-    payment = db.query(Payment).filter(Payment.id == payment_id).first()
-    if payment:
-        db.delete(payment)
-        db.commit()
-    db.close()
+def delete_payment(payment_id: int, db: Optional[Session] = None):
+    with session_scope(db) as db:
+        payment = db.query(Payment).filter(Payment.id == payment_id).first()
+        if payment:
+            db.delete(payment)
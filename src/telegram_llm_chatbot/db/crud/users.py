@@ -1,159 +1,236 @@
 import datetime
 import logging
+import time
 from typing import Optional
 
+from sqlalchemy import Select, delete, func, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
 
-from telegram_llm_chatbot.db.database import get_session
-from telegram_llm_chatbot.db.models import Chat, Message, User, Log
+from telegram_llm_chatbot.db.database import session_scope
+from telegram_llm_chatbot.db.models import Chat, Log, Message, Payment, Subscription, User
+from telegram_llm_chatbot.db.rows import ChatMessageRow, DeleteReport
 
 # Load logging configuration with OmegaConf
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Dialects with a native INSERT ... ON CONFLICT DO UPDATE
+UPSERT_DIALECTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
 
-def get_user(user_id: int) -> User:
+
+def get_user(user_id: int, db: Optional[Session] = None) -> User:
     """
     Retrieve a user by their ID.
 
     Args:
         user_id (int): The ID of the user to retrieve.
+        db (Optional[Session]): An open session to run in, otherwise a new one is used.
 
     Returns:
         User: The user object if found, otherwise None.
     """
-    db: Session = get_session()
-    result = db.query(User).filter(User.id == user_id).first()
-    db.close()
+    with session_scope(db) as db:
+        result = db.query(User).filter(User.id == user_id).first()
     return result
 
 
-def get_users() -> list[User]:
+def get_users(db: Optional[Session] = None) -> list[User]:
     """
     Retrieve all users.
 
+    Args:
+        db (Optional[Session]): An open session to run in, otherwise a new one is used.
+
     Returns:
         list[User]: A list of all user objects.
     """
-    db: Session = get_session()
-    result = db.query(User).all()
-    db.close()
+    with session_scope(db) as db:
+        result = db.query(User).all()
     return result
 
 
-def get_chat(chat_id: int, user_id: int) -> Chat:
+def get_chat(chat_id: int, user_id: int, db: Optional[Session] = None) -> Chat:
     """
     Retrieve a specific chat for a user.
 
     Args:
         chat_id (int): The ID of the chat to retrieve.
         user_id (int): The ID of the user who owns the chat.
+        db (Optional[Session]): An open session to run in, otherwise a new one is used.
 
     Returns:
         Chat: The chat object if found, otherwise None.
     """
-    db: Session = get_session()
-    result = db.query(Chat).filter(Chat.id == chat_id, Chat.user_id == user_id).first()
-    db.close()
+    with session_scope(db) as db:
+        result = db.query(Chat).filter(Chat.id == chat_id, Chat.user_id == user_id).first()
     return result
 
 
-def get_chat_history(chat_id: int) -> list[Message]:
+def _select_chat_history(chat_id: int, limit: Optional[int] = None, token_budget: Optional[int] = None) -> Select:
+    """Build the query of ``get_chat_history``, newest message first."""
+    newest_first = (Message.timestamp.desc(), Message.id.desc())
+    if token_budget is None:
+        query = (
+            select(Message.role, Message.content, Message.id).where(Message.chat_id == chat_id).order_by(*newest_first)
+        )
+        if limit is not None:
+            query = query.limit(limit)
+    else:
+        # Messages stored before token counts existed are estimated from their length
+        tokens = func.coalesce(Message.token_count, func.length(Message.content) / 4 + 1)
+        window = (
+            select(
+                Message.role,
+                Message.content,
+                Message.timestamp,
+                Message.id,
+                tokens.label("tokens"),
+                func.sum(tokens).over(order_by=newest_first).label("running_tokens"),
+            )
+            .where(Message.chat_id == chat_id)
+            .order_by(*newest_first)
+        )
+        if limit is not None:
+            window = window.limit(limit)
+        window = window.subquery()
+        query = (
+            select(window.c.role, window.c.content, window.c.id)
+            .where(or_(window.c.running_tokens <= token_budget, window.c.running_tokens == window.c.tokens))
+            .order_by(window.c.timestamp.desc(), window.c.id.desc())
+        )
+    return query
+
+
+def get_chat_history(
+    chat_id: int, limit: Optional[int] = None, token_budget: Optional[int] = None, db: Optional[Session] = None
+) -> list[ChatMessageRow]:
     """
-    Retrieve the message history for a specific chat.
+    Retrieve the most recent messages of a specific chat in chronological order.
+
+    Only the ``role`` and ``content`` columns are fetched. The limit is applied in SQL
+    to the newest messages, so the cost does not grow with the length of the chat.
+    With a token budget, a running sum of the stored token counts, newest first, keeps
+    the messages that fit into the budget; the newest message is always kept.
 
     Args:
         chat_id (int): The ID of the chat whose history to retrieve.
+        limit (Optional[int]): The maximum number of most recent messages to return.
+        token_budget (Optional[int]): The maximum total number of tokens of the returned messages.
+        db (Optional[Session]): An open session to run in, otherwise a new one is used.
 
     Returns:
-        list[Message]: A list of message objects associated with the chat.
+        list[ChatMessageRow]: The messages, oldest first.
     """
-    db: Session = get_session()
-    result = db.query(Message).filter(Message.chat_id == chat_id).order_by(Message.timestamp.asc()).all()
-    db.close()
-    return result
+    query = _select_chat_history(chat_id, limit, token_budget)
+    with session_scope(db) as db:
+        rows = db.execute(query).tuples().all()
+    return [ChatMessageRow._make(row) for row in reversed(rows)]
 
 
-def upsert_user(user_id: int, name: str, last_chat_id: Optional[int] = None) -> User:
+def upsert_user(
+    user_id: int, name: str, last_chat_id: Optional[int] = None, db: Optional[Session] = None
+) -> User:
     """
     Insert or update a user.
 
+    On Postgres and SQLite this is a single ``INSERT ... ON CONFLICT (id) DO UPDATE ...
+    RETURNING`` statement that only sets the given columns, so a renamed user is updated
+    instead of failing on the primary key. Rows whose columns already hold the given values
+    are not rewritten. In a caller's session the upsert runs in a savepoint, so a failure
+    leaves the rest of the caller's transaction intact.
+
     Args:
         user_id (int): The ID of the user.
         name (str): The name of the user.
         last_chat_id (Optional[int]): The ID of the last chat the user participated in.
+        db (Optional[Session]): An open session to run in, otherwise a new one is used.
     """
-    db: Session = get_session()
-    db.expire_on_commit = False
+    values = {"name": name}
+    if last_chat_id:
+        values["current_chat_id"] = last_chat_id
+
+    user = None
     try:
-        user = db.query(User).filter(User.name == name, User.id == user_id).first()
-        if user:
-            user.name = name
-            user.id = user_id
-            if last_chat_id:
-                user.current_chat_id = last_chat_id
-        else:
-            user = User(id=user_id, name=name)
-            db.add(user)
+        with session_scope(db, nested=True) as db:
+            dialect = db.get_bind().dialect.name
+            if dialect in UPSERT_DIALECTS:
+                insert = UPSERT_DIALECTS[dialect]
+                statement = insert(User).values(id=user_id, **values)
+                statement = statement.on_conflict_do_update(
+                    index_elements=[User.id],
+                    set_={column: statement.excluded[column] for column in values},
+                    # Without changes the row is left alone: no dead tuple, no WAL, no trigger
+                    where=or_(*(User.__table__.c[column].is_distinct_from(statement.excluded[column]) for column in values)),
+                ).returning(User)
+                user = db.scalars(statement, execution_options={"populate_existing": True}).one_or_none()
+                if user is None:
+                    # The user exists unchanged, the conflict clause returned no row
+                    user = db.get(User, user_id)
+            else:
+                user = db.merge(User(id=user_id, **values))
         logger.info(f"User with name {user.name} added successfully.")
-        db.commit()
     except Exception as e:
-        db.rollback()
         logger.error(f"Error adding user with name {name}: {e}")
-    finally:
-        db.close()
     return user
 
 
-def delete_user(user_id: int) -> None:
+def delete_user(user_id: int, db: Optional[Session] = None) -> Optional[DeleteReport]:
     """
     Delete a user and all associated data.
 
+    Every table is cleared with one set-based statement, children first, so the delete
+    does not depend on the database cascades and no rows are loaded into the session.
+
     Args:
         user_id (int): The ID of the user to delete.
+        db (Optional[Session]): An open session to run in, otherwise a new one is used.
+
+    Returns:
+        Optional[DeleteReport]: The number of deleted rows per table and the elapsed time,
+            or None if the delete failed.
     """
-    db: Session = get_session()
+    start = time.perf_counter()
+    user_chats = select(Chat.id).where(Chat.user_id == user_id)
+    user_subscriptions = select(Subscription.id).where(Subscription.user_id == user_id)
+    statements = {
+        "messages": delete(Message).where(Message.chat_id.in_(user_chats)),
+        "chats": delete(Chat).where(Chat.user_id == user_id),
+        "payments": delete(Payment).where(Payment.subscription_id.in_(user_subscriptions)),
+        "subscriptions": delete(Subscription).where(Subscription.user_id == user_id),
+        "logs": delete(Log).where(Log.user_id == user_id),
+        "users": delete(User).where(User.id == user_id),
+    }
     try:
-        # First, find the user's chats and associated messages
-        user_chats = db.query(Chat).filter(Chat.user_id == user_id).all()
-
-        for chat in user_chats:
-            # Delete messages associated with each chat
-            db_messages = db.query(Message).filter(Message.chat_id == chat.id).all()
-            for message in db_messages:
-                db.delete(message)
-
-            # Delete the chat itself
-            db.delete(chat)
-
-        # Finally, delete the user
-        db_user = db.query(User).filter(User.id == user_id).first()
-        if db_user:
-            db.delete(db_user)
-
-        db.commit()
-        logger.info(f"User with id {user_id} and all associated data deleted successfully.")
+        with session_scope(db, nested=True) as db:
+            rows = {
+                table: db.execute(statement, execution_options={"synchronize_session": False}).rowcount
+                for table, statement in statements.items()
+            }
     except Exception as e:
-        db.rollback()
         logger.error(f"Error deleting user with id {user_id}: {e}")
-    finally:
-        db.close()
+        return None
+
+    report = DeleteReport(rows, (time.perf_counter() - start) * 1000)
+    logger.info(
+        f"User with id {user_id} and all associated data deleted successfully: "
+        f"{report.rows} in {report.elapsed_ms:.1f} ms."
+    )
+    return report
+
 
-def write_log(user_id: int, content: str) -> None:
+def write_log(user_id: int, content: str, db: Optional[Session] = None) -> None:
     """
     Write a log entry for a user.
 
     Args:
         user_id (int): The ID of the user.
         content (str): The content of the log entry.
+        db (Optional[Session]): An open session to run in, otherwise a new one is used.
     """
-    db: Session = get_session()
     try:
-        db.add(Log(user_id=user_id, content=content, timestamp=datetime.datetime.now()))
-        db.commit()
+        with session_scope(db, nested=True) as db:
+            db.add(Log(user_id=user_id, content=content, timestamp=datetime.datetime.now()))
         logger.info(f"Log entry added for user with id {user_id}.")
     except Exception as e:
-        db.rollback()
         logger.error(f"Error adding log entry for user with id {user_id}: {e}")
-    finally:
-        db.close()
@@ -1,11 +1,20 @@
 import logging.config
 import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
 
 from dotenv import find_dotenv, load_dotenv
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import NullPool
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
 
+from telegram_llm_chatbot.core.metrics import register_metrics
+
+from .migrations import run_migrations
 from .models import Base
 
 # Load logging configuration with OmegaConf
@@ -21,6 +30,13 @@ DB_NAME = os.getenv("DB_NAME")
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 
+# Connection pool settings
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
 # Check if any of the required environment variables are not set
 if not all([DB_HOST, DB_NAME, DB_USER, DB_PASSWORD]):
     logger.error("One or more database environment variables are not set.")
@@ -30,19 +46,160 @@ if not all([DB_HOST, DB_NAME, DB_USER, DB_PASSWORD]):
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?sslmode=require"
 
 
-def get_enginge():
-    """Get a new engine object."""
-    return create_engine(DATABASE_URL, poolclass=NullPool)
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records checkout counts and time spent waiting for a connection."""
+
+    def __init__(self, *args, **kwargs):  # noqa: D107
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.peak_overflow = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        wait = time.perf_counter() - start
+        with self._stats_lock:
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.peak_overflow = max(self.peak_overflow, self.overflow())
+        return connection
+
+    def stats(self) -> dict:
+        """Return a snapshot of the pool state and checkout statistics."""
+        with self._stats_lock:
+            return {
+                "pool_size": self.size(),
+                "checked_in": self.checkedin(),
+                "checked_out": self.checkedout(),
+                "overflow": self.overflow(),
+                "peak_overflow": self.peak_overflow,
+                "max_overflow": self._max_overflow,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(1000 * self.total_wait / self.checkouts, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(1000 * self.max_wait, 3),
+            }
+
+
+_engine: Optional[Engine] = None
+_engine_lock = threading.RLock()
+SessionLocal = sessionmaker(expire_on_commit=False)
+
+
+def init_engine(url: Optional[str] = None, **engine_kwargs) -> Engine:
+    """
+    Create the process-wide engine, replacing and disposing any existing one.
+
+    Args:
+        url (Optional[str]): The database URL, defaults to the one built from the environment.
+        **engine_kwargs: Overrides for the pool settings passed to ``create_engine``.
+
+    Returns:
+        Engine: The new engine.
+    """
+    global _engine
+    options = {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    options.update(engine_kwargs)
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+        _engine = create_engine(url or DATABASE_URL, **options)
+        SessionLocal.configure(bind=_engine)
+    logger.info(
+        f"Database engine created with pool_size={options['pool_size']}, max_overflow={options['max_overflow']}"
+    )
+    return _engine
+
+
+def get_engine() -> Engine:
+    """Get the process-wide engine object, creating it on first use."""
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                init_engine()
+    return _engine
+
+
+def get_pool_stats() -> dict:
+    """Get connection pool statistics, or an empty dict if the engine was not created yet."""
+    if _engine is None:
+        return {}
+    pool = _engine.pool
+    if isinstance(pool, InstrumentedQueuePool):
+        return pool.stats()
+    # Engines created with another pool class, e.g. in tests, only report their status line
+    return {"status": pool.status()}
+
+
+register_metrics("db_pool", get_pool_stats)
 
 
 def create_tables():
-    """Create tables in the database."""
-    engine = get_enginge()
+    """Create missing tables in the database and apply pending schema migrations."""
+    engine = get_engine()
     Base.metadata.create_all(engine)
     logger.info("Tables created")
+    applied = run_migrations(engine)
+    if applied:
+        logger.info(f"Applied migrations: {applied}")
 
 
 def get_session():
-    """Get a new session object."""
-    engine = get_enginge()
-    return sessionmaker(bind=engine)()
+    """Get a new session object bound to the shared engine."""
+    get_engine()
+    return SessionLocal()
+
+
+@contextmanager
+def session_scope(db: Optional[Session] = None, nested: bool = False) -> Iterator[Session]:
+    """
+    Provide a transactional scope around a series of operations.
+
+    When an existing session is given, the caller owns its transaction: pending
+    changes are flushed but neither committed nor rolled back, and the session
+    stays open. Otherwise a new session is opened, committed on success, rolled
+    back on error and closed.
+
+    Args:
+        db (Optional[Session]): A session opened by the caller, e.g. per Telegram update.
+        nested (bool): Run inside a savepoint of the caller's session, so that an error
+            only discards this scope's changes and the caller's transaction stays usable.
+
+    Yields:
+        Session: The session to use.
+    """
+    if db is not None:
+        if nested:
+            with db.begin_nested():
+                yield db
+        else:
+            yield db
+        db.flush()
+        return
+
+    db = get_session()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
@@ -0,0 +1,165 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import insert
+
+from telegram_llm_chatbot.core.metrics import register_metrics
+from telegram_llm_chatbot.db.database import get_engine
+from telegram_llm_chatbot.db.models import Log
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "500"))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "1.0"))
+LOG_PUT_TIMEOUT = float(os.getenv("LOG_PUT_TIMEOUT", "0.05"))
+
+
+class LogWriter:
+    """Write audit log entries to the ``logs`` table from a background thread in batches."""
+
+    def __init__(
+        self,
+        max_queue_size: int = LOG_QUEUE_SIZE,
+        batch_size: int = LOG_BATCH_SIZE,
+        flush_interval: float = LOG_FLUSH_INTERVAL,
+        put_timeout: float = LOG_PUT_TIMEOUT,
+    ):
+        """
+        Initialize the LogWriter.
+
+        Args:
+            max_queue_size (int): Maximum number of pending entries before new ones are dropped.
+            batch_size (int): Number of entries that triggers a flush.
+            flush_interval (float): Maximum number of seconds an entry waits before it is flushed.
+            put_timeout (float): Seconds a producer blocks on a full queue before the entry is dropped.
+        """
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.submitted = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_flush_ms = 0.0
+
+    def start(self) -> None:
+        """Start the background flush thread if it is not running yet."""
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, user_id: int, content: Optional[str], timestamp: Optional[datetime] = None) -> bool:
+        """
+        Queue a log entry for writing.
+
+        Args:
+            user_id (int): The ID of the user.
+            content (Optional[str]): The content of the log entry.
+            timestamp (Optional[datetime]): When the event happened, defaults to now.
+
+        Returns:
+            bool: False if the queue stayed full for ``put_timeout`` seconds and the entry was dropped.
+        """
+        if self._thread is None:
+            self.start()
+        row = {"user_id": user_id, "content": content, "timestamp": timestamp or datetime.now()}
+        try:
+            self._queue.put(row, timeout=self.put_timeout)
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+            return False
+        with self._stats_lock:
+            self.submitted += 1
+        return True
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Stop the background thread after flushing every queued entry."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        # Write whatever was queued after the thread exited
+        self._flush(self._drain(self._queue.qsize()))
+
+    def stats(self) -> dict:
+        """Return the writer counters and the current queue depth."""
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "submitted": self.submitted,
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "batches": self.batches,
+                "last_flush_ms": round(self.last_flush_ms, 3),
+            }
+
+    def _drain(self, limit: int) -> list[dict]:
+        rows = []
+        while len(rows) < limit:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            rows = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(rows) < self.batch_size and not self._stop.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    rows.append(self._queue.get(timeout=min(remaining, 0.5)))
+                except queue.Empty:
+                    continue
+                rows.extend(self._drain(self.batch_size - len(rows)))
+            self._flush(rows)
+
+    def _flush(self, rows: list[dict]) -> None:
+        if not rows:
+            return
+        start = time.perf_counter()
+        written = 0
+        try:
+            with get_engine().begin() as connection:
+                connection.execute(insert(Log), rows)
+            written = len(rows)
+        except Exception as e:
+            logger.error(f"Error writing a batch of {len(rows)} log entries, retrying one by one: {e}")
+            for row in rows:
+                try:
+                    with get_engine().begin() as connection:
+                        connection.execute(insert(Log), row)
+                    written += 1
+                except Exception as row_error:
+                    logger.error(f"Error adding log entry for user with id {row['user_id']}: {row_error}")
+        with self._stats_lock:
+            self.written += written
+            self.failed += len(rows) - written
+            self.batches += 1
+            self.last_flush_ms = 1000 * (time.perf_counter() - start)
+
+
+log_writer = LogWriter()
+atexit.register(log_writer.close)
+register_metrics("log_writer", log_writer.stats)
@@ -0,0 +1,142 @@
+import logging
+from datetime import datetime
+from typing import Callable, NamedTuple
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import AddConstraint
+
+from .models import Base
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Arbitrary key for the Postgres advisory lock that serialises concurrent migration runs
+MIGRATION_LOCK_ID = 7_251_044
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String),
+    Column("applied_at", DateTime),
+)
+
+
+class Migration(NamedTuple):
+    """A versioned schema change applied once to a live database."""
+
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+def _create_indexes(*names: str) -> Callable[[Connection], None]:
+    """Build an upgrade step that creates the named indexes declared on the models."""
+
+    def upgrade(connection: Connection) -> None:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name in names:
+                    index.create(connection, checkfirst=True)
+
+    return upgrade
+
+
+def _add_columns(table_name: str, *names: str) -> Callable[[Connection], None]:
+    """Build an upgrade step that adds the named columns declared on a model, if missing."""
+
+    def upgrade(connection: Connection) -> None:
+        table = Base.metadata.tables[table_name]
+        existing = {column["name"] for column in inspect(connection).get_columns(table_name)}
+        quote = connection.dialect.identifier_preparer.quote
+        for name in names:
+            if name in existing:
+                continue
+            column_type = table.c[name].type.compile(dialect=connection.dialect)
+            connection.execute(text(f"ALTER TABLE {quote(table_name)} ADD COLUMN {quote(name)} {column_type}"))
+
+    return upgrade
+
+
+def _cascade_foreign_keys(connection: Connection) -> None:
+    """Recreate the foreign keys declared with ``ondelete="CASCADE"`` that lack it in the database.
+
+    Only Postgres can alter constraints in place. SQLite keeps its original foreign keys,
+    which is harmless because the CRUD deletes remove child rows explicitly.
+    """
+    if connection.dialect.name != "postgresql":
+        logger.info(f"Skipping foreign key cascades on {connection.dialect.name}")
+        return
+
+    inspector = inspect(connection)
+    quote = connection.dialect.identifier_preparer.quote
+    for table in Base.metadata.sorted_tables:
+        for constraint in table.foreign_key_constraints:
+            if constraint.ondelete != "CASCADE":
+                continue
+            columns = [column.name for column in constraint.columns]
+            for existing in inspector.get_foreign_keys(table.name):
+                if existing["constrained_columns"] != columns:
+                    continue
+                if existing["options"].get("ondelete", "").upper() == "CASCADE":
+                    break
+                connection.execute(text(f"ALTER TABLE {quote(table.name)} DROP CONSTRAINT {quote(existing['name'])}"))
+                connection.execute(AddConstraint(constraint))
+                break
+
+
+HOT_PATH_INDEXES = (
+    "ix_messages_chat_id_timestamp",
+    "ix_messages_timestamp",
+    "ix_chats_user_id",
+    "ix_subscriptions_user_id_status_end_date",
+    "ix_logs_user_id_timestamp",
+)
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "Indexes for the hot query predicates", _create_indexes(*HOT_PATH_INDEXES)),
+    Migration(2, "ON DELETE CASCADE for the foreign keys of user data", _cascade_foreign_keys),
+    Migration(3, "Token counts of messages", _add_columns("messages", "token_count")),
+    Migration(4, "Rolling chat summaries", _add_columns("chats", "summary", "summary_until_id")),
+]
+
+
+def get_applied_versions(connection: Connection) -> set[int]:
+    """Return the migration versions already recorded in the database."""
+    schema_migrations.create(connection, checkfirst=True)
+    return set(connection.execute(select(schema_migrations.c.version)).scalars())
+
+
+def run_migrations(engine: Engine) -> list[int]:
+    """
+    Apply all pending migrations, each in its own transaction.
+
+    Args:
+        engine (Engine): The engine of the database to migrate.
+
+    Returns:
+        list[int]: The versions that were applied by this call.
+    """
+    with engine.begin() as connection:
+        applied = get_applied_versions(connection)
+
+    newly_applied = []
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        if migration.version in applied:
+            continue
+        with engine.begin() as connection:
+            if connection.dialect.name == "postgresql":
+                connection.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+                # Another process may have applied it while we waited for the lock
+                if migration.version in get_applied_versions(connection):
+                    continue
+            logger.info(f"Applying migration {migration.version}: {migration.description}")
+            migration.upgrade(connection)
+            connection.execute(
+                schema_migrations.insert().values(
+                    version=migration.version, description=migration.description, applied_at=datetime.now()
+                )
+            )
+        newly_applied.append(migration.version)
+    return newly_applied
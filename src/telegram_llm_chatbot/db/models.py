@@ -1,4 +1,4 @@
-from sqlalchemy import BigInteger, Column, DateTime, Enum, ForeignKey, Integer, Numeric, String
+from sqlalchemy import BigInteger, Column, DateTime, Enum, ForeignKey, Index, Integer, Numeric, String
 from sqlalchemy.orm import DeclarativeBase, relationship
 
 
@@ -18,14 +18,16 @@ class User(Base):
     role = Column(String, default="user")
     current_chat_id = Column(Integer)
 
-    # Establish relationship with Chat and enable cascade deletion
-    chats = relationship("Chat", backref="user", cascade="all, delete-orphan")
+    # Establish relationship with Chat, deletion cascades in the database
+    chats = relationship("Chat", backref="user", cascade="all, delete-orphan", passive_deletes=True)
 
-    # Establish relationship with Subscription and enable cascade deletion
-    subscriptions = relationship("Subscription", back_populates="user", cascade="all, delete-orphan")
+    # Establish relationship with Subscription, deletion cascades in the database
+    subscriptions = relationship(
+        "Subscription", back_populates="user", cascade="all, delete-orphan", passive_deletes=True
+    )
 
-    # Establish relationship with Log and enable cascade deletion
-    logs = relationship("Log", backref="user", cascade="all, delete-orphan")
+    # Establish relationship with Log, deletion cascades in the database
+    logs = relationship("Log", backref="user", cascade="all, delete-orphan", passive_deletes=True)
 
 class Chat(Base):
     """Chat model"""
@@ -33,33 +35,43 @@ class Chat(Base):
     __tablename__ = "chats"
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    user_id = Column(BigInteger, ForeignKey("users.id"))
+    user_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), index=True)
     name = Column(String)
     timestamp = Column(DateTime)
+    # Rolling summary of the messages up to and including summary_until_id
+    summary = Column(String, nullable=True)
+    summary_until_id = Column(Integer, nullable=True)
 
-    # Establish relationship with Message and enable cascade deletion
-    messages = relationship("Message", backref="chat", cascade="all, delete-orphan")
+    # Establish relationship with Message, deletion cascades in the database
+    messages = relationship("Message", backref="chat", cascade="all, delete-orphan", passive_deletes=True)
 
 
 class Message(Base):
     """Message model"""
 
     __tablename__ = "messages"
+    __table_args__ = (
+        # Chat history is always read per chat, newest first
+        Index("ix_messages_chat_id_timestamp", "chat_id", "timestamp"),
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    chat_id = Column(Integer, ForeignKey("chats.id"))
+    chat_id = Column(Integer, ForeignKey("chats.id", ondelete="CASCADE"))
     role = Column(String)
     content = Column(String)
-    timestamp = Column(DateTime)
+    timestamp = Column(DateTime, index=True)
+    # Counted once when the message is stored, used to fit the history into a token budget
+    token_count = Column(Integer, nullable=True)
 
 
 class Log(Base):
     """Log model"""
 
     __tablename__ = "logs"
+    __table_args__ = (Index("ix_logs_user_id_timestamp", "user_id", "timestamp"),)
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    user_id = Column(BigInteger, ForeignKey("users.id"))
+    user_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"))
     content = Column(String)
     timestamp = Column(DateTime)
 
@@ -78,9 +90,13 @@ class SubscriptionPlan(Base):
 
 class Subscription(Base):
     __tablename__ = "subscriptions"
+    __table_args__ = (
+        # Entitlement checks filter on the user, the status and the end date
+        Index("ix_subscriptions_user_id_status_end_date", "user_id", "status", "end_date"),
+    )
 
     id = Column(Integer, primary_key=True)
-    user_id = Column(BigInteger, ForeignKey("users.id"))
+    user_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"))
     plan_id = Column(Integer, ForeignKey("subscription_plans.id"))
     start_date = Column(DateTime)
     end_date = Column(DateTime)
@@ -89,20 +105,20 @@ class Subscription(Base):
     user = relationship("User", back_populates="subscriptions")
     plan = relationship("SubscriptionPlan", back_populates="subscriptions")
 
-    # Establish relationship with Payment and enable cascade deletion
-    payments = relationship("Payment", back_populates="subscription", cascade="all, delete-orphan")
+    # Establish relationship with Payment, deletion cascades in the database
+    payments = relationship(
+        "Payment", back_populates="subscription", cascade="all, delete-orphan", passive_deletes=True
+    )
 
 
 class Payment(Base):
     __tablename__ = "payments"
 
     id = Column(Integer, primary_key=True)
-    subscription_id = Column(Integer, ForeignKey("subscriptions.id"))
+    subscription_id = Column(Integer, ForeignKey("subscriptions.id", ondelete="CASCADE"))
     amount = Column(Numeric(10, 2))
     currency = Column(String)
     payment_date = Column(DateTime)
     payment_method = Column(String)
 
     subscription = relationship("Subscription", back_populates="payments")
-
-User.subscriptions = relationship("Subscription", back_populates="user", cascade="all, delete-orphan")
\ No newline at end of file
@@ -0,0 +1,64 @@
+"""Lightweight result types returned by the CRUD functions instead of ORM objects."""
+
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+
+class DeleteReport(NamedTuple):
+    """Number of rows removed per table by a bulk delete and how long it took."""
+
+    rows: dict[str, int]
+    elapsed_ms: float
+
+    @property
+    def total(self) -> int:
+        """Total number of rows removed."""
+        return sum(self.rows.values())
+
+
+class UserRecord(NamedTuple):
+    """The columns of a user needed to route an update."""
+
+    id: int
+    name: Optional[str]
+    role: Optional[str]
+    current_chat_id: Optional[int]
+
+    @classmethod
+    def from_user(cls, user) -> "UserRecord":
+        """Copy the columns of a ``User`` object."""
+        return cls(user.id, user.name, user.role, user.current_chat_id)
+
+
+class ChatMessageRow(NamedTuple):
+    """A message of a chat history."""
+
+    role: str
+    content: str
+    id: Optional[int] = None
+
+
+class ChatSummaryRow(NamedTuple):
+    """The rolling summary of a chat and the ID of the last message folded into it."""
+
+    summary: Optional[str]
+    summary_until_id: Optional[int]
+
+
+class ChatRow(NamedTuple):
+    """A chat of a user."""
+
+    id: int
+    name: str
+    timestamp: Optional[datetime]
+
+
+class SubscriptionRow(NamedTuple):
+    """A subscription of a user together with the name of its plan."""
+
+    id: int
+    plan_id: int
+    plan_name: Optional[str]
+    status: str
+    start_date: datetime
+    end_date: datetime
@@ -0,0 +1,81 @@
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from telegram_llm_chatbot.core.metrics import register_metrics
+from telegram_llm_chatbot.db import crud
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SUBSCRIPTION_SWEEP_INTERVAL = float(os.getenv("SUBSCRIPTION_SWEEP_INTERVAL", "300"))
+
+
+class SubscriptionSweeper:
+    """Periodically expire and reactivate subscriptions of all users from a background thread."""
+
+    def __init__(self, interval: float = SUBSCRIPTION_SWEEP_INTERVAL):
+        """
+        Initialize the SubscriptionSweeper.
+
+        Args:
+            interval (float): Number of seconds between two sweeps.
+        """
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.runs = 0
+        self.errors = 0
+        self.expired = 0
+        self.reactivated = 0
+        self.last_run_ms = 0.0
+
+    def start(self) -> None:
+        """Start sweeping in the background, beginning with an immediate sweep."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="subscription-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop the background thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def sweep(self) -> None:
+        """Run one sweep over all subscriptions."""
+        start = time.perf_counter()
+        try:
+            expired, reactivated = crud.sweep_subscription_statuses()
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Error sweeping subscription statuses: {e}")
+            return
+        self.runs += 1
+        self.expired += expired
+        self.reactivated += reactivated
+        self.last_run_ms = 1000 * (time.perf_counter() - start)
+
+    def stats(self) -> dict:
+        """Return the sweeper counters."""
+        return {
+            "runs": self.runs,
+            "errors": self.errors,
+            "expired": self.expired,
+            "reactivated": self.reactivated,
+            "last_run_ms": round(self.last_run_ms, 3),
+        }
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.sweep()
+            self._stop.wait(self.interval)
+
+
+subscription_sweeper = SubscriptionSweeper()
+register_metrics("subscription_sweeper", subscription_sweeper.stats)
@@ -0,0 +1,42 @@
+import os
+
+# The database module validates these at import time, the tests use a SQLite engine instead
+for name in ("DB_HOST", "DB_NAME", "DB_USER", "DB_PASSWORD"):
+    os.environ.setdefault(name, "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("FIREWORKS_API_KEY", "test")
+
+import pytest  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from telegram_llm_chatbot.db import database  # noqa: E402
+from telegram_llm_chatbot.db.models import Base  # noqa: E402
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """A fresh SQLite database with foreign keys and savepoints working, used by the CRUD functions."""
+    engine = database.init_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def enable_foreign_keys(connection, _):
+        connection.execute("PRAGMA foreign_keys=ON")
+        # pysqlite's own transaction handling breaks savepoints, let SQLAlchemy emit BEGIN as on Postgres
+        connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def begin(connection):
+        connection.exec_driver_sql("BEGIN")
+
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    """A session on the test database, closed after the test."""
+    session = database.get_session()
+    yield session
+    session.rollback()
+    session.close()
@@ -0,0 +1,89 @@
+import pytest
+from telebot.handler_backends import BaseMiddleware, CancelUpdate
+
+from telegram_llm_chatbot.api.middlewares.session import DatabaseSessionMiddleware
+from telegram_llm_chatbot.db import crud
+
+
+class FailingMiddleware(BaseMiddleware):
+    def __init__(self, result=None, error=None):
+        self.update_types = ["message"]
+        self.result = result
+        self.error = error
+
+    def pre_process(self, message, data):
+        if self.error:
+            raise self.error
+        return self.result
+
+    def post_process(self, message, data, exception):
+        pass
+
+
+def test_post_process_commits_and_closes(engine):
+    # Arrange
+    sessions = DatabaseSessionMiddleware()
+    data = {}
+    sessions.pre_process(None, data)
+    crud.upsert_user(1, "alice", db=data["db"])
+
+    # Act
+    sessions.post_process(None, data, None)
+
+    # Assert
+    assert "db" not in data
+    assert crud.get_user(1).name == "alice"
+    assert engine.pool.checkedout() == 0
+
+
+def test_post_process_rolls_back_and_runs_callbacks(engine):
+    # Arrange
+    sessions = DatabaseSessionMiddleware()
+    data = {}
+    sessions.pre_process(None, data)
+    rolled_back = []
+    data["on_rollback"].append(lambda: rolled_back.append(True))
+    crud.upsert_user(1, "alice", db=data["db"])
+
+    # Act
+    sessions.post_process(None, data, RuntimeError("handler failed"))
+
+    # Assert
+    assert rolled_back == [True]
+    assert crud.get_user(1) is None
+    assert engine.pool.checkedout() == 0
+
+
+def test_guard_closes_session_when_pre_process_raises(engine):
+    # Arrange
+    sessions = DatabaseSessionMiddleware()
+    guarded = sessions.guard(FailingMiddleware(error=ValueError("broken")))
+    data = {}
+    sessions.pre_process(None, data)
+    crud.upsert_user(1, "alice", db=data["db"])
+
+    # Act
+    with pytest.raises(ValueError):
+        guarded.pre_process(None, data)
+
+    # Assert
+    assert "db" not in data
+    assert crud.get_user(1) is None
+    assert engine.pool.checkedout() == 0
+
+
+def test_guard_commits_cancelled_update(engine):
+    # Arrange
+    sessions = DatabaseSessionMiddleware()
+    guarded = sessions.guard(FailingMiddleware(result=CancelUpdate()))
+    data = {}
+    sessions.pre_process(None, data)
+    crud.upsert_user(1, "alice", db=data["db"])
+
+    # Act
+    result = guarded.pre_process(None, data)
+
+    # Assert
+    assert isinstance(result, CancelUpdate)
+    assert crud.get_user(1).name == "alice"
+    assert engine.pool.checkedout() == 0
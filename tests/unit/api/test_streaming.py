@@ -0,0 +1,174 @@
+from types import SimpleNamespace
+
+from telebot.apihelper import ApiTelegramException
+
+from telegram_llm_chatbot.api import streaming
+from telegram_llm_chatbot.api.streaming import TELEGRAM_MESSAGE_LIMIT, StreamRenderer
+
+
+def too_many_requests(function_name):
+    """Build the 429 error Telegram returns when a chat gets too many requests."""
+    return ApiTelegramException(
+        function_name,
+        None,
+        {"error_code": 429, "description": "Too Many Requests", "parameters": {"retry_after": 3}},
+    )
+
+
+class FakeBot:
+    """Keep the messages of a chat as Telegram would show them."""
+
+    def __init__(self, rate_limit_edits=0, rate_limit_sends=0):
+        self.messages = {}
+        self.edits = 0
+        self.rate_limit_edits = rate_limit_edits
+        self.rate_limit_sends = rate_limit_sends
+
+    def send_message(self, chat_id, text):
+        assert len(text) <= TELEGRAM_MESSAGE_LIMIT
+        if self.rate_limit_sends:
+            self.rate_limit_sends -= 1
+            raise too_many_requests("sendMessage")
+        message_id = len(self.messages) + 1
+        self.messages[message_id] = text
+        return SimpleNamespace(message_id=message_id)
+
+    def edit_message_text(self, text, chat_id, message_id):
+        assert len(text) <= TELEGRAM_MESSAGE_LIMIT
+        if self.rate_limit_edits:
+            self.rate_limit_edits -= 1
+            raise too_many_requests("editMessageText")
+        self.messages[message_id] = text
+        self.edits += 1
+
+
+def render(bot, pieces, **kwargs):
+    renderer = StreamRenderer(bot, chat_id=1, min_interval=0, min_delta=0, **kwargs)
+    renderer.start()
+    for piece in pieces:
+        renderer.feed(piece)
+    renderer.finish()
+    return renderer
+
+
+def test_reply_within_the_limit_stays_in_the_placeholder():
+    # Arrange
+    bot = FakeBot()
+
+    # Act
+    render(bot, ["Hello", ", ", "world"])
+
+    # Assert
+    assert list(bot.messages.values()) == ["Hello, world"]
+
+
+def test_reply_rolls_over_into_a_new_message_at_4096_characters():
+    # Arrange
+    bot = FakeBot()
+    words = ["word"] * 2000
+
+    # Act
+    render(bot, [word + " " for word in words])
+
+    # Assert
+    texts = list(bot.messages.values())
+    assert len(texts) == 3
+    assert all(len(text) <= TELEGRAM_MESSAGE_LIMIT for text in texts)
+    assert "".join(texts) == "word " * 2000
+    # The cut is made after a space, no word is split between two messages
+    assert all(text.endswith(" ") for text in texts[:-1])
+
+
+def test_rollover_prefers_a_line_break():
+    # Arrange
+    bot = FakeBot()
+    first = "a " * 1500 + "\n"
+    text = first + "b " * 1500
+
+    # Act
+    render(bot, [text])
+
+    # Assert
+    assert list(bot.messages.values()) == [first, "b " * 1500]
+
+
+def test_text_without_separators_is_cut_at_the_limit():
+    # Arrange
+    bot = FakeBot()
+
+    # Act
+    render(bot, ["x" * (TELEGRAM_MESSAGE_LIMIT + 10)])
+
+    # Assert
+    assert [len(text) for text in bot.messages.values()] == [TELEGRAM_MESSAGE_LIMIT, 10]
+
+
+def test_edits_are_throttled_until_the_reply_is_finished():
+    # Arrange
+    bot = FakeBot()
+    renderer = StreamRenderer(bot, chat_id=1, min_interval=60, min_delta=0)
+    renderer.start()
+
+    # Act
+    for piece in ["one ", "two ", "three"]:
+        renderer.feed(piece)
+    edits_while_streaming = bot.edits
+    renderer.finish()
+
+    # Assert
+    assert edits_while_streaming == 0
+    assert bot.messages[1] == "one two three"
+    assert bot.edits == 1
+
+
+def test_finish_waits_out_a_rate_limit(monkeypatch):
+    # Arrange
+    bot = FakeBot(rate_limit_edits=1)
+    sleeps = []
+    monkeypatch.setattr(streaming.time, "sleep", sleeps.append)
+    renderer = StreamRenderer(bot, chat_id=1, min_interval=60, min_delta=0)
+    renderer.start()
+    renderer.feed("Hello")
+
+    # Act
+    renderer.finish()
+
+    # Assert
+    assert sleeps == [3.0]
+    assert renderer.rate_limited == 1
+    assert bot.messages[1] == "Hello"
+
+
+def test_finish_waits_out_a_rate_limited_send(monkeypatch):
+    # Arrange
+    bot = FakeBot(rate_limit_sends=1)
+    sleeps = []
+    monkeypatch.setattr(streaming.time, "sleep", sleeps.append)
+    renderer = StreamRenderer(bot, chat_id=1, min_interval=0, min_delta=100)
+    renderer.feed("Hello")
+
+    # Act
+    renderer.finish()
+
+    # Assert
+    assert sleeps == [3.0]
+    assert renderer.rate_limited == 1
+    assert list(bot.messages.values()) == ["Hello"]
+
+
+def test_rate_limited_rollover_is_sent_once_the_wait_is_over(monkeypatch):
+    # Arrange
+    bot = FakeBot()
+    monkeypatch.setattr(streaming.time, "sleep", lambda seconds: None)
+    renderer = StreamRenderer(bot, chat_id=1, min_interval=0, min_delta=0)
+    renderer.start()
+    renderer.feed("x" * TELEGRAM_MESSAGE_LIMIT)
+    bot.rate_limit_sends = 1
+
+    # Act
+    renderer.feed("y" * 10)
+    renderer.finish()
+
+    # Assert
+    assert renderer.rate_limited == 1
+    assert list(bot.messages.values()) == ["x" * TELEGRAM_MESSAGE_LIMIT, "y" * 10]
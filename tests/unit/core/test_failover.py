@@ -0,0 +1,193 @@
+import threading
+import time
+
+import pytest
+
+from telegram_llm_chatbot.api.schemas import ModelConfig
+from telegram_llm_chatbot.core.failover import ProviderStats, run_with_failover, target_name
+from telegram_llm_chatbot.core.scheduler import LLMScheduler
+
+PRIMARY = ModelConfig(provider="fireworksai", model_name="primary")
+FALLBACK = ModelConfig(provider="openai", model_name="fallback")
+
+
+def provider(behaviours):
+    """Build a call that answers per model with (delay before each item, items) or raises an exception."""
+    calls = []
+
+    def call(config):
+        calls.append(config.model_name)
+        behaviour = behaviours[config.model_name]
+        if isinstance(behaviour, Exception):
+            raise behaviour
+        delays, items = behaviour
+
+        def stream():
+            for delay, item in zip(delays, items):
+                time.sleep(delay)
+                yield item
+
+        return stream()
+
+    return call, calls
+
+
+def test_primary_answers_without_failover():
+    # Arrange
+    call, calls = provider({"primary": ([0, 0], ["a", "b"]), "fallback": ([0], ["x"])})
+    stats = ProviderStats(min_samples=1)
+    answered = []
+
+    # Act
+    items = list(run_with_failover([PRIMARY, FALLBACK], call, stats=stats, on_answer=answered.append))
+
+    # Assert
+    assert items == ["a", "b"]
+    assert calls == ["primary"]
+    assert answered == [PRIMARY]
+
+
+def test_error_fails_over_to_the_next_provider():
+    # Arrange
+    call, calls = provider({"primary": RuntimeError("down"), "fallback": ([0], ["x"])})
+    stats = ProviderStats(min_samples=1)
+    answered = []
+
+    # Act
+    items = list(run_with_failover([PRIMARY, FALLBACK], call, stats=stats, on_answer=answered.append))
+
+    # Assert
+    assert items == ["x"]
+    assert calls == ["primary", "fallback"]
+    assert answered == [FALLBACK]
+    assert stats.stats()[target_name(PRIMARY)]["errors"] == 1
+
+
+def test_missed_first_token_deadline_fails_over():
+    # Arrange
+    call, _ = provider({"primary": ([1.0], ["late"]), "fallback": ([0], ["x"])})
+    stats = ProviderStats(min_samples=1)
+
+    # Act
+    items = list(run_with_failover([PRIMARY, FALLBACK], call, first_token_timeout=0.1, stats=stats))
+
+    # Assert
+    assert items == ["x"]
+    assert stats.stats()[target_name(PRIMARY)]["timeouts"] == 1
+
+
+def test_all_providers_failing_raises_the_last_error():
+    # Arrange
+    call, _ = provider({"primary": RuntimeError("down"), "fallback": ValueError("also down")})
+
+    # Act / Assert
+    with pytest.raises(ValueError, match="also down"):
+        list(run_with_failover([PRIMARY, FALLBACK], call, stats=ProviderStats()))
+
+
+def test_slow_chunks_after_the_first_are_not_cut_by_the_first_token_deadline():
+    # Arrange
+    call, _ = provider({"primary": ([0, 0.3], ["a", "b"])})
+
+    # Act
+    items = list(run_with_failover([PRIMARY], call, first_token_timeout=0.1, stats=ProviderStats()))
+
+    # Assert
+    assert items == ["a", "b"]
+
+
+def test_stall_timeout_aborts_a_stalled_answer():
+    # Arrange
+    call, _ = provider({"primary": ([0, 1.0], ["a", "b"])})
+    items = []
+
+    # Act
+    with pytest.raises(TimeoutError):
+        for item in run_with_failover([PRIMARY], call, stall_timeout=0.1, stats=ProviderStats()):
+            items.append(item)
+
+    # Assert
+    assert items == ["a"]
+
+
+def test_hedge_starts_the_fallback_and_the_first_answer_wins():
+    # Arrange
+    stats = ProviderStats(min_samples=1)
+    stats.record_success(target_name(PRIMARY), 0.01)
+    release = threading.Event()
+
+    def call(config):
+        if config is PRIMARY:
+            release.wait(2)
+            return iter(["slow"])
+        return iter(["fast"])
+
+    answered = []
+
+    # Act
+    items = list(
+        run_with_failover([PRIMARY, FALLBACK], call, hedge_percentile=0.5, stats=stats, on_answer=answered.append)
+    )
+    release.set()
+
+    # Assert
+    assert items == ["fast"]
+    assert answered == [FALLBACK]
+    assert stats.stats()[target_name(FALLBACK)]["hedges"] == 1
+
+
+def test_providers_with_a_high_error_rate_are_tried_last():
+    # Arrange
+    stats = ProviderStats(min_samples=2)
+    for _ in range(2):
+        stats.record_error(target_name(PRIMARY))
+    call, calls = provider({"primary": ([0], ["a"]), "fallback": ([0], ["x"])})
+
+    # Act
+    items = list(run_with_failover([PRIMARY, FALLBACK], call, stats=stats))
+
+    # Assert
+    assert items == ["x"]
+    assert calls == ["fallback"]
+
+
+def test_waiting_for_a_slot_does_not_count_against_the_first_token_deadline():
+    # Arrange
+    scheduler = LLMScheduler(providers={"fireworksai": {"concurrency": 1}})
+    call, _ = provider({"primary": ([0], ["a"])})
+    blocker = scheduler.slot(PRIMARY)
+    blocker.__enter__()
+    threading.Timer(0.3, blocker.__exit__, (None, None, None)).start()
+
+    # Act
+    items = list(
+        run_with_failover([PRIMARY], call, first_token_timeout=0.1, stats=ProviderStats(), slot=scheduler.slot)
+    )
+
+    # Assert
+    assert items == ["a"]
+    assert scheduler.stats()["admitted"] == 2
+
+
+def test_hedge_that_lost_while_queued_leaves_the_queue():
+    # Arrange
+    stats = ProviderStats(min_samples=1)
+    stats.record_success(target_name(PRIMARY), 0.01)
+    scheduler = LLMScheduler(providers={"openai": {"concurrency": 1}})
+    blocker = scheduler.slot(FALLBACK)
+    blocker.__enter__()
+    call, calls = provider({"primary": ([0.2], ["a"]), "fallback": ([0], ["x"])})
+
+    # Act
+    items = list(run_with_failover([PRIMARY, FALLBACK], call, hedge_percentile=0.5, stats=stats, slot=scheduler.slot))
+
+    # Assert
+    deadline = time.monotonic() + 2
+    while scheduler.stats()["queue_depth"]:
+        assert time.monotonic() < deadline, "the cancelled hedge is still queued"
+        time.sleep(0.005)
+    blocker.__exit__(None, None, None)
+    assert items == ["a"]
+    assert calls == ["primary"]
+    assert stats.stats()[target_name(FALLBACK)]["hedges"] == 1
+    assert scheduler.stats()["queued"] == 1
@@ -0,0 +1,176 @@
+import time
+
+import docx
+import pytest
+
+from telegram_llm_chatbot.core import files
+from telegram_llm_chatbot.core.exceptions import PDFFileReadingException
+from telegram_llm_chatbot.core.files import TextFileParser
+
+
+@pytest.fixture
+def parser():
+    return TextFileParser(max_file_size_mb=10, allowed_file_types={"txt", "docx", "pdf"})
+
+
+def make_docx(path, paragraphs=(), table_rows=(), paragraphs_after=()):
+    document = docx.Document()
+    for text in paragraphs:
+        document.add_paragraph(text)
+    if table_rows:
+        table = document.add_table(rows=len(table_rows), cols=len(table_rows[0]))
+        for row, values in zip(table.rows, table_rows):
+            for cell, value in zip(row.cells, values):
+                cell.text = value
+    for text in paragraphs_after:
+        document.add_paragraph(text)
+    document.save(path)
+    return str(path)
+
+
+def test_docx_keeps_paragraphs_and_tables_in_document_order(parser, tmp_path):
+    # Arrange
+    path = make_docx(
+        tmp_path / "doc.docx",
+        paragraphs=["Intro", ""],
+        table_rows=[("a", "b"), ("c", "d")],
+        paragraphs_after=["Outro"],
+    )
+
+    # Act
+    text = parser.extract_content(path)
+
+    # Assert
+    assert text == "Intro\na\tb\nc\td\n\nOutro"
+
+
+def test_docx_is_cut_at_the_character_budget(parser, tmp_path):
+    # Arrange
+    path = make_docx(tmp_path / "doc.docx", paragraphs=[f"paragraph {i} " + "x" * 90 for i in range(1000)])
+
+    # Act
+    text = parser.extract_content(path, max_chars=1000)
+
+    # Assert
+    assert len(text) == 1000
+    assert text.startswith("paragraph 0 ")
+    assert "paragraph 10 " not in text
+
+
+def test_docx_budget_stops_inside_a_table(parser, tmp_path):
+    # Arrange
+    rows = [(f"row {i}", "y" * 50) for i in range(200)]
+    path = make_docx(tmp_path / "doc.docx", table_rows=rows, paragraphs_after=["after the table"])
+
+    # Act
+    text = parser.extract_content(path, max_chars=300)
+
+    # Assert
+    assert len(text) == 300
+    assert text.startswith("row 0\t")
+    assert "after the table" not in text
+
+
+def test_docx_shorter_than_the_budget_is_returned_whole(parser, tmp_path):
+    # Arrange
+    path = make_docx(tmp_path / "doc.docx", paragraphs=["one", "two"])
+
+    # Act
+    text = parser.extract_content(path, max_chars=10_000)
+
+    # Assert
+    assert text == "one\ntwo"
+
+
+def make_pdf(path, pages, lines=20):
+    """Write a PDF whose pages contain lines naming their page, e.g. ``page 3 line 0``."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page in range(pages):
+        text = "".join(f"(page {page} line {line}) Tj T* " for line in range(lines))
+        stream = f"BT /F1 10 Tf 12 TL 40 800 Td {text}ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> "
+            b"/Contents %d 0 R >>" % len(objects)
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode()
+
+    with open(path, "wb") as file:
+        file.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(file.tell())
+            file.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        xref = file.tell()
+        file.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            file.write(b"%010d 00000 n \n" % offset)
+        file.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return str(path)
+
+
+def test_pdf_is_cut_at_the_character_budget(parser, tmp_path):
+    # Arrange
+    path = make_pdf(tmp_path / "doc.pdf", pages=50)
+
+    # Act
+    text = parser.extract_content(path, max_chars=1000)
+
+    # Assert
+    assert len(text) == 1000
+    assert text.startswith("page 0 line 0")
+    assert "page 10 " not in text
+
+
+def test_pdf_pages_beyond_the_page_cap_are_not_extracted(tmp_path):
+    # Arrange
+    parser = TextFileParser(max_file_size_mb=10, allowed_file_types={"pdf"}, max_pdf_pages=3)
+    path = make_pdf(tmp_path / "doc.pdf", pages=10, lines=1)
+
+    # Act
+    text = parser.extract_content(path)
+
+    # Assert
+    assert "page 2 line 0" in text
+    assert "page 3 line 0" not in text
+
+
+def test_pdf_timeout_is_checked_between_pages(tmp_path, monkeypatch):
+    # Arrange
+    path = make_pdf(tmp_path / "doc.pdf", pages=5, lines=2)
+    parser = TextFileParser(max_file_size_mb=10, allowed_file_types={"pdf"}, pdf_timeout=0.05)
+    iter_pages = files.iter_pdf_pages
+
+    def slow_pages(*args, **kwargs):
+        for text in iter_pages(*args, **kwargs):
+            time.sleep(0.03)
+            yield text
+
+    monkeypatch.setattr(files, "iter_pdf_pages", slow_pages)
+
+    # Act / Assert
+    with pytest.raises(PDFFileReadingException):
+        parser.extract_pdf_content(path)
+
+
+def test_short_pdf_with_a_timeout_is_extracted_in_the_calling_thread(tmp_path, monkeypatch):
+    # Arrange
+    path = make_pdf(tmp_path / "doc.pdf", pages=5, lines=2)
+    parser = TextFileParser(
+        max_file_size_mb=10, allowed_file_types={"pdf"}, pdf_workers=4, pdf_parallel_min_pages=100, pdf_timeout=60
+    )
+
+    def no_workers(*args, **kwargs):
+        raise AssertionError("a worker pool was started for a short document")
+
+    monkeypatch.setattr(files.multiprocessing, "get_context", no_workers)
+
+    # Act
+    text = parser.extract_pdf_content(path)
+
+    # Assert
+    assert text.startswith("page 0 line 0")
+    assert "page 4 line 1" in text
@@ -0,0 +1,102 @@
+from langchain_core.messages import AIMessage
+
+from telegram_llm_chatbot.api.schemas import ModelConfig
+from telegram_llm_chatbot.core.llm import LLM
+from telegram_llm_chatbot.core.response_cache import ResponseCache
+from telegram_llm_chatbot.core.scheduler import LLMScheduler
+from telegram_llm_chatbot.core.summarizer import ChatSummarizer
+from telegram_llm_chatbot.core.tokens import count_tokens
+from telegram_llm_chatbot.db.rows import ChatMessageRow
+
+HISTORY = [ChatMessageRow("user", "Hello")]
+
+
+class FakeClient:
+    def __init__(self, answer=None):
+        self.answer = answer
+        self.invocations = 0
+
+    def invoke(self, messages):
+        self.invocations += 1
+        if self.answer is None:
+            raise RuntimeError("provider down")
+        return AIMessage(content=self.answer)
+
+
+def make_llm(monkeypatch, primary_client, fallback_client):
+    primary = ModelConfig(provider="fireworksai", model_name="primary", stream=False, response_cache=True)
+    fallback = ModelConfig(provider="openai", model_name="fallback", stream=False)
+    llm = LLM(primary, response_cache=ResponseCache(), fallbacks=[fallback])
+    clients = {"primary": primary_client, "fallback": fallback_client}
+    monkeypatch.setattr(llm, "get_client", lambda config: clients[config.model_name])
+    return llm
+
+
+def test_answers_of_the_configured_model_are_cached(monkeypatch):
+    # Arrange
+    primary, fallback = FakeClient("hi"), FakeClient("fallback hi")
+    llm = make_llm(monkeypatch, primary, fallback)
+
+    # Act
+    first = llm.run(HISTORY)
+    second = llm.run(HISTORY)
+
+    # Assert
+    assert first.response_content == second.response_content == "hi"
+    assert primary.invocations == 1
+
+
+def test_answers_of_a_fallback_are_not_cached(monkeypatch):
+    # Arrange
+    primary, fallback = FakeClient(None), FakeClient("fallback hi")
+    llm = make_llm(monkeypatch, primary, fallback)
+    llm.run(HISTORY)
+    primary.answer = "hi"
+
+    # Act
+    response = llm.run(HISTORY)
+
+    # Assert
+    assert response.response_content == "hi"
+    assert fallback.invocations == 1
+
+
+def test_each_attempted_provider_holds_a_slot_of_its_own(monkeypatch):
+    # Arrange
+    primary, fallback = FakeClient(None), FakeClient("fallback hi")
+    llm = make_llm(monkeypatch, primary, fallback)
+    scheduler = LLMScheduler(
+        providers={"fireworksai": {"tokens_per_minute": 10_000}, "openai": {"tokens_per_minute": 10_000}}
+    )
+
+    # Act
+    llm.run(HISTORY, scheduler=scheduler, priority=1)
+
+    # Assert
+    limits = scheduler.stats()["limits"]
+    prompt_tokens = count_tokens("Hello")
+    assert scheduler.stats()["admitted"] == 2
+    assert limits["provider:fireworksai"]["tokens_last_minute"] == prompt_tokens
+    assert limits["provider:openai"]["tokens_last_minute"] == prompt_tokens + count_tokens("fallback hi")
+    assert limits["provider:fireworksai"]["running"] == limits["provider:openai"]["running"] == 0
+
+
+def test_summaries_wait_for_a_slot_at_their_own_priority(monkeypatch):
+    # Arrange
+    client = FakeClient("summary")
+    llm = make_llm(monkeypatch, client, FakeClient(None))
+    scheduler = LLMScheduler(providers={"fireworksai": {"concurrency": 1}})
+    priorities = []
+    slot = scheduler.slot
+    monkeypatch.setattr(
+        scheduler, "slot", lambda config, tokens=0, priority=0: priorities.append(priority) or slot(config, tokens)
+    )
+    summarizer = ChatSummarizer(lambda: llm, scheduler=scheduler, priority=2)
+
+    # Act
+    response = summarizer._invoke(llm, "Summarize this")
+
+    # Assert
+    assert response.content == "summary"
+    assert priorities == [2]
+    assert scheduler.stats()["admitted"] == 1
@@ -0,0 +1,158 @@
+import threading
+import time
+
+import pytest
+
+from telegram_llm_chatbot.api.schemas import ModelConfig
+from telegram_llm_chatbot.core.exceptions import LLMCallCancelledException, LLMQueueFullException
+from telegram_llm_chatbot.core.scheduler import LLMScheduler
+
+MODEL = ModelConfig(provider="fireworksai", model_name="model")
+
+
+def wait_for_queue_depth(scheduler, depth):
+    deadline = time.monotonic() + 2
+    while scheduler.stats()["queue_depth"] != depth:
+        assert time.monotonic() < deadline, "the calls were not queued in time"
+        time.sleep(0.005)
+
+
+def queue_call(scheduler, priority, admitted, release):
+    """Start a call in a thread that records its priority once admitted and holds its slot until released."""
+
+    def run():
+        with scheduler.slot(MODEL, priority=priority):
+            admitted.append(priority)
+            release.wait(2)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_call_under_the_limits_runs_right_away_without_evaluating_the_priority():
+    # Arrange
+    scheduler = LLMScheduler(providers={"fireworksai": {"concurrency": 1}})
+
+    def priority():
+        raise AssertionError("priority looked up for a call that did not wait")
+
+    # Act
+    with scheduler.slot(MODEL, priority=priority) as ticket:
+        running = scheduler.stats()["limits"]["provider:fireworksai"]["running"]
+
+    # Assert
+    assert running == 1
+    assert ticket.waited == 0
+    assert scheduler.stats()["limits"]["provider:fireworksai"]["running"] == 0
+
+
+def test_waiting_calls_are_admitted_by_priority():
+    # Arrange
+    scheduler = LLMScheduler(providers={"fireworksai": {"concurrency": 1}})
+    admitted, release = [], threading.Event()
+    blocker = scheduler.slot(MODEL)
+    blocker.__enter__()
+    threads = [queue_call(scheduler, 1, admitted, release)]
+    wait_for_queue_depth(scheduler, 1)
+    threads.append(queue_call(scheduler, 0, admitted, release))
+    wait_for_queue_depth(scheduler, 2)
+
+    # Act
+    blocker.__exit__(None, None, None)
+    release.set()
+    for thread in threads:
+        thread.join(2)
+
+    # Assert
+    assert admitted == [0, 1]
+    assert scheduler.stats()["queued"] == 2
+
+
+def test_calls_beyond_the_queue_size_are_rejected():
+    # Arrange
+    scheduler = LLMScheduler(providers={"fireworksai": {"concurrency": 1}}, max_queue_size=1)
+    admitted, release = [], threading.Event()
+    blocker = scheduler.slot(MODEL)
+    blocker.__enter__()
+    thread = queue_call(scheduler, 0, admitted, release)
+    wait_for_queue_depth(scheduler, 1)
+
+    # Act
+    with pytest.raises(LLMQueueFullException):
+        with scheduler.slot(MODEL):
+            pass
+
+    # Assert
+    assert scheduler.stats()["rejected"] == 1
+    blocker.__exit__(None, None, None)
+    release.set()
+    thread.join(2)
+    assert admitted == [0]
+
+
+def test_tokens_per_minute_are_settled_to_the_actual_usage():
+    # Arrange
+    scheduler = LLMScheduler(providers={"fireworksai": {"tokens_per_minute": 1000}})
+
+    # Act
+    with scheduler.slot(MODEL, tokens=800) as ticket:
+        reserved = scheduler.stats()["limits"]["provider:fireworksai"]["tokens_last_minute"]
+        ticket.settle(300)
+
+    # Assert
+    assert reserved == 800
+    assert scheduler.stats()["limits"]["provider:fireworksai"]["tokens_last_minute"] == 300
+    # 700 tokens are left in the window, so a call of that size runs right away
+    with scheduler.slot(MODEL, tokens=700) as ticket:
+        assert ticket.waited == 0
+
+
+def test_calls_of_other_providers_are_not_held_up_by_a_full_provider():
+    # Arrange
+    scheduler = LLMScheduler(providers={"fireworksai": {"concurrency": 1}, "openai": {"concurrency": 1}})
+    other = ModelConfig(provider="openai", model_name="other")
+    admitted, release = [], threading.Event()
+    blocker = scheduler.slot(MODEL)
+    blocker.__enter__()
+    thread = queue_call(scheduler, 0, admitted, release)
+    wait_for_queue_depth(scheduler, 1)
+
+    # Act
+    with scheduler.slot(other) as ticket:
+        waited = ticket.waited
+
+    # Assert
+    assert waited == 0
+    blocker.__exit__(None, None, None)
+    release.set()
+    thread.join(2)
+
+
+def test_cancelled_call_leaves_the_queue_without_waiting_for_its_turn():
+    # Arrange
+    scheduler = LLMScheduler(providers={"fireworksai": {"concurrency": 1}})
+    blocker = scheduler.slot(MODEL)
+    blocker.__enter__()
+    cancelled, errors = threading.Event(), []
+
+    def run():
+        try:
+            with scheduler.slot(MODEL, cancelled=cancelled):
+                pass
+        except LLMCallCancelledException as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    wait_for_queue_depth(scheduler, 1)
+
+    # Act
+    cancelled.set()
+    thread.join(2)
+
+    # Assert
+    assert len(errors) == 1
+    assert scheduler.stats()["queue_depth"] == 0
+    assert scheduler.stats()["admitted"] == 1
+    blocker.__exit__(None, None, None)
@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from telegram_llm_chatbot.db import crud
+from telegram_llm_chatbot.db.models import Chat, Message, User
+
+
+@pytest.fixture
+def chat_id(db):
+    """A chat with five messages of 100, 200, 300, 400 and 500 tokens, oldest first."""
+    db.add(User(id=1, name="alice"))
+    chat = Chat(user_id=1, name="chat", timestamp=datetime(2024, 1, 1))
+    db.add(chat)
+    db.flush()
+    for i, tokens in enumerate([100, 200, 300, 400, 500]):
+        db.add(
+            Message(
+                chat_id=chat.id,
+                role="user" if i % 2 == 0 else "assistant",
+                content=f"message {i}",
+                timestamp=datetime(2024, 1, 1) + timedelta(minutes=i),
+                token_count=tokens,
+            )
+        )
+    db.commit()
+    return chat.id
+
+
+def contents(rows):
+    return [row.content for row in rows]
+
+
+def test_without_budget_returns_the_newest_messages_oldest_first(chat_id):
+    # Act
+    rows = crud.get_chat_history(chat_id, limit=3)
+
+    # Assert
+    assert contents(rows) == ["message 2", "message 3", "message 4"]
+
+
+def test_budget_keeps_the_newest_messages_that_fit(chat_id):
+    # Act
+    rows = crud.get_chat_history(chat_id, token_budget=1000)
+
+    # Assert
+    # 500 + 400 fit, adding the 300 tokens of message 2 would exceed the budget
+    assert contents(rows) == ["message 3", "message 4"]
+
+
+def test_budget_includes_a_message_that_fits_exactly(chat_id):
+    # Act
+    rows = crud.get_chat_history(chat_id, token_budget=1200)
+
+    # Assert
+    assert contents(rows) == ["message 2", "message 3", "message 4"]
+
+
+def test_budget_always_keeps_the_newest_message(chat_id):
+    # Act
+    rows = crud.get_chat_history(chat_id, token_budget=10)
+
+    # Assert
+    assert contents(rows) == ["message 4"]
+
+
+def test_limit_applies_before_the_budget(chat_id):
+    # Act
+    rows = crud.get_chat_history(chat_id, limit=2, token_budget=10_000)
+
+    # Assert
+    assert contents(rows) == ["message 3", "message 4"]
+
+
+def test_messages_without_token_count_are_estimated_from_their_length(db, chat_id):
+    # Arrange
+    db.add(
+        Message(
+            chat_id=chat_id,
+            role="user",
+            content="x" * 396,
+            timestamp=datetime(2024, 1, 2),
+            token_count=None,
+        )
+    )
+    db.commit()
+
+    # Act
+    rows = crud.get_chat_history(chat_id, token_budget=600)
+
+    # Assert
+    # The new message counts as 396 / 4 + 1 = 100 tokens, leaving room for the 500 of message 4
+    assert contents(rows) == ["message 4", "x" * 396]
+
+
+def test_budget_returns_nothing_for_an_empty_chat(engine):
+    # Act
+    rows = crud.get_chat_history(12345, limit=10, token_budget=1000)
+
+    # Assert
+    assert rows == []
@@ -0,0 +1,79 @@
+import pytest
+from sqlalchemy import text
+
+from telegram_llm_chatbot.db import crud
+from telegram_llm_chatbot.db.models import Chat
+
+
+@pytest.fixture
+def user_updates(engine):
+    """Count the rows actually rewritten in the users table."""
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE user_updates (id INTEGER PRIMARY KEY)"))
+        connection.execute(
+            text(
+                "CREATE TRIGGER count_user_updates AFTER UPDATE ON users "
+                "BEGIN INSERT INTO user_updates (id) VALUES (NULL); END"
+            )
+        )
+
+    def count():
+        with engine.connect() as connection:
+            return connection.execute(text("SELECT count(*) FROM user_updates")).scalar_one()
+
+    return count
+
+
+def test_upsert_user_inserts_a_new_user(engine):
+    # Act
+    user = crud.upsert_user(1, "alice", last_chat_id=7)
+
+    # Assert
+    assert (user.id, user.name, user.current_chat_id) == (1, "alice", 7)
+    assert crud.get_user(1).name == "alice"
+
+
+def test_upsert_user_updates_changed_columns_only(engine, user_updates):
+    # Arrange
+    crud.upsert_user(1, "alice", last_chat_id=7)
+
+    # Act
+    user = crud.upsert_user(1, "alice_renamed")
+
+    # Assert
+    assert (user.name, user.current_chat_id) == ("alice_renamed", 7)
+    assert user_updates() == 1
+
+
+def test_upsert_user_does_not_rewrite_an_unchanged_row(engine, user_updates):
+    # Arrange
+    crud.upsert_user(1, "alice", last_chat_id=7)
+
+    # Act
+    user = crud.upsert_user(1, "alice", last_chat_id=7)
+
+    # Assert
+    assert (user.id, user.name, user.current_chat_id) == (1, "alice", 7)
+    assert user_updates() == 0
+
+
+def test_upsert_user_failure_keeps_the_callers_transaction(engine, db):
+    # Arrange
+    crud.upsert_user(1, "alice")
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TRIGGER reject_name BEFORE UPDATE ON users WHEN NEW.name = 'rejected' "
+                "BEGIN SELECT RAISE(ABORT, 'name rejected'); END"
+            )
+        )
+    chat = crud.create_chat(1, "first chat", db=db)
+
+    # Act
+    user = crud.upsert_user(1, "rejected", db=db)
+    db.commit()
+
+    # Assert
+    assert user is None
+    assert db.get(Chat, chat.id) is not None
+    assert crud.get_user(1).name == "alice"